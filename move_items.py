@@ -1,5 +1,5 @@
 from pathlib import Path
-from p115client import P115Client
+from p115client import P115Client, normalize_attr
 from p115client.tool.iterdir import iter_files, iter_dirs
 from blacksheep import json, redirect, Application, Request
 import time
@@ -8,6 +8,7 @@ from datetime import datetime
 import re
 import os
 from logging.handlers import TimedRotatingFileHandler
+from collections import OrderedDict
 from typing import Dict
 
 
@@ -16,6 +17,10 @@ client = None
 logger = None
 COOKIE_FILE = "115-cookies.txt"
 LOG_DIR = "logs"
+DIR_CACHE_SIZE = 1024  # 目录列表缓存的最大条目数
+DIR_CACHE_TTL = 300  # 目录列表缓存的有效期（秒）
+DEFAULT_SCAN_WORKERS = 4  # 默认遍历目录树时并发列举的子目录数
+SCAN_WORKERS = DEFAULT_SCAN_WORKERS  # 遍历目录树时并发列举的子目录数（启动时从环境变量 SCAN_WORKERS 读取）
 
 # iOS UA 配置
 IOS_UA = (
@@ -24,6 +29,30 @@ IOS_UA = (
 )
 
 
+def parse_scan_workers(value):
+    """
+    解析 SCAN_WORKERS 环境变量（1-32），无效时提示并使用默认值
+    
+    参数:
+        value: 环境变量的值
+    
+    返回:
+        int: 并发列举的子目录数
+    """
+    try:
+        workers = int(value)
+    except (TypeError, ValueError):
+        print(f"警告：SCAN_WORKERS 值无效: {value}，使用默认值 {DEFAULT_SCAN_WORKERS}")
+        return DEFAULT_SCAN_WORKERS
+    if workers < 1:
+        print(f"警告：SCAN_WORKERS 值 {workers} 过小，已调整为最小值 1")
+        return 1
+    if workers > 32:
+        print(f"警告：SCAN_WORKERS 值 {workers} 过大，已调整为最大值 32")
+        return 32
+    return workers
+
+
 def get_ios_ua_app() -> Dict[str, str]:
     """
     获取 IOS 设备的 header（UA）和 APP
@@ -34,6 +63,99 @@ def get_ios_ua_app() -> Dict[str, str]:
     }
 
 
+class DirListingCache:
+    """
+    目录列表缓存（LRU + TTL）
+    
+    按目录ID缓存直属子目录的 名称→ID 映射
+    """
+    
+    def __init__(self, max_size=DIR_CACHE_SIZE, ttl=DIR_CACHE_TTL):
+        """
+        参数:
+            max_size: 最大条目数，超出时淘汰最久未使用的条目
+            ttl: 有效期（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, cid):
+        """
+        读取缓存
+        
+        返回:
+            dict: {子目录名称: 子目录ID}，未命中或已过期时返回 None
+        """
+        entry = self.entries.get(cid)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            self.entries.pop(cid, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(cid)
+        self.hits += 1
+        return dict(entry[1])
+    
+    def put(self, cid, children):
+        """写入缓存"""
+        self.entries[cid] = (time.monotonic(), dict(children))
+        self.entries.move_to_end(cid)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def invalidate(self, cid):
+        """使某个目录的缓存失效"""
+        self.entries.pop(cid, None)
+
+
+dir_cache = DirListingCache()
+
+
+def list_child_dirs(cid=0, api_client=None, app='ios'):
+    """
+    列举目录下的直属子目录（优先使用目录列表缓存）
+    
+    参数:
+        cid: 目录 id，默认为 0（根目录）
+        api_client: 使用的客户端，None 表示使用全局客户端
+        app: 使用指定 app（设备）的接口，默认为 'ios'
+    
+    返回:
+        dict: {子目录名称: 子目录ID}
+    """
+    cached = dir_cache.get(cid)
+    if cached is not None:
+        return cached
+    
+    api_client = api_client or client
+    request_kwargs = get_ios_ua_app() if app == 'ios' else {'app': app}
+    children = {}
+    offset = 0
+    
+    while True:
+        payload = {'cid': cid, 'show_dir': 1, 'nf': 1, 'offset': offset, 'limit': 1000}
+        response = api_client.fs_files_app(payload, **request_kwargs)
+        if not response.get('state'):
+            raise Exception(f"列举目录失败 (cid={cid}): {response.get('error', response.get('error_msg', '未知错误'))}")
+        
+        items = [normalize_attr(item) for item in response.get('data') or []]
+        for info in items:
+            if info.get('is_dir'):
+                children[info.get('name', '')] = info['id']
+        
+        offset += len(items)
+        if not items or offset >= int(response.get('count') or 0):
+            dir_cache.put(cid, children)
+            return children
+
+
+def print_dir_cache_stats():
+    """打印目录列表缓存的命中情况"""
+    print(f"目录缓存: 命中 {dir_cache.hits} 次，未命中 {dir_cache.misses} 次，已缓存 {len(dir_cache.entries)} 个目录")
+
+
 def setup_logger(log_retention_days=7):
     """
     设置日志记录器，按天分割，自动清理旧日志
@@ -123,15 +245,10 @@ def test_cookie(cookie_str):
         print("\n正在验证cookie...")
         test_client = P115Client(cookie_str)
         
-        # 尝试遍历根目录的文件夹
+        # 尝试列举根目录的文件夹（结果会进入目录缓存，后续查找路径可直接使用）
         print("正在获取根目录信息...")
-        dir_count = 0
-        for dir_info in iter_dirs(
-            client=test_client, cid=0, max_workers=0, **get_ios_ua_app()
-        ):
-            dir_count += 1
-            if dir_count >= 3:  # 只获取前3个就够了
-                break
+        dir_cache.invalidate(0)
+        dir_count = len(list_child_dirs(0, api_client=test_client))
         
         print(f"✓ Cookie验证成功！在根目录找到 {dir_count} 个文件夹")
         return test_client
@@ -257,6 +374,7 @@ def list_directory_tree(cid=0, cur=0, order="user_ptime", asc=1, file_type=99):
         asc=asc,
         cur=cur,
         page_size=1000,  # 每页获取1000个文件
+        max_workers=SCAN_WORKERS,
         **get_ios_ua_app(),
     ):
         file_count += 1
@@ -301,7 +419,7 @@ def list_directories(cid=0, app='ios', max_dirs=0):
     参数:
         cid: 目录 id，默认为 0（根目录）
         app: 使用指定 app（设备）的接口，默认为 'ios'
-        max_dirs: 估计最大存在的目录数，<= 0 时则无限，默认为 0
+        max_dirs: 最多列举的目录数，<= 0 时则无限，默认为 0
     
     返回:
         list: 包含所有目录信息的列表
@@ -312,31 +430,31 @@ def list_directories(cid=0, app='ios', max_dirs=0):
     dirs_list = []
     dir_count = 0
     
-    for dir_info in iter_dirs(
-        client=client,
-        cid=cid,
-        app=app,
-        max_dirs=max_dirs,
-        max_workers=0,  # 单工作者惰性执行
-        **get_ios_ua_app() if app == 'ios' else {},
-    ):
-        dir_count += 1
-        dirs_list.append(dir_info)
-        
-        # 打印目录信息
-        name = dir_info.get('name', '')
-        dir_id = dir_info.get('id', '')
-        parent_id = dir_info.get('parent_id', '')
-        path = dir_info.get('path', '')
-        
-        print(f"{dir_count}. [目录] {name}")
-        print(f"   ID: {dir_id}")
-        print(f"   父目录ID: {parent_id}")
-        print(f"   路径: {path}")
-        print()
+    # 逐层列举（每个目录的子目录列表都经过目录缓存）
+    pending = [(cid, '')]
+    while pending:
+        parent_id, parent_path = pending.pop(0)
+        for name, dir_id in list_child_dirs(parent_id, app=app).items():
+            path = f"{parent_path}/{name}"
+            dir_info = {'id': dir_id, 'name': name, 'parent_id': parent_id, 'path': path}
+            dir_count += 1
+            dirs_list.append(dir_info)
+            pending.append((dir_id, path))
+            
+            # 打印目录信息
+            print(f"{dir_count}. [目录] {name}")
+            print(f"   ID: {dir_id}")
+            print(f"   父目录ID: {parent_id}")
+            print(f"   路径: {path}")
+            print()
+            
+            if 0 < max_dirs <= dir_count:
+                pending = []
+                break
     
     print("-" * 80)
     print(f"共找到 {dir_count} 个子目录")
+    print_dir_cache_stats()
     return dirs_list
 
 
@@ -361,7 +479,7 @@ def list_directories_tree(cid=0, app='ios', max_depth=None):
         client=client,
         cid=cid,
         app=app,
-        max_workers=0,
+        max_workers=SCAN_WORKERS,
         **get_ios_ua_app() if app == 'ios' else {},
     ):
         all_dirs.append(dir_info)
@@ -455,6 +573,10 @@ def move_files(file_ids, target_pid=0, use_app_api=False):
             # payload 可以是单个ID、ID列表或字典
             result = client.fs_move(file_ids, pid=target_pid)
         
+        # 目标目录的列表已变化，使其缓存失效
+        if result.get('state'):
+            dir_cache.invalidate(target_pid)
+        
         return result
     
     except Exception as e:
@@ -538,16 +660,13 @@ def find_directory_by_path(path, start_cid=0):
     for i, folder_name in enumerate(path_parts):
         print(f"正在查找: {folder_name} (当前目录ID: {current_cid})")
         
-        # 获取当前目录下的所有子目录
+        # 获取当前目录下的直属子目录（优先使用目录缓存）
         found = False
-        for dir_info in iter_dirs(
-            client=client, cid=current_cid, max_workers=0, **get_ios_ua_app()
-        ):
-            if dir_info.get('name') == folder_name:
-                current_cid = dir_info.get('id')
-                found = True
-                print(f"  ✓ 找到: {folder_name} (ID: {current_cid})")
-                break
+        child_cid = list_child_dirs(current_cid).get(folder_name)
+        if child_cid is not None:
+            current_cid = child_cid
+            found = True
+            print(f"  ✓ 找到: {folder_name} (ID: {current_cid})")
         
         if not found:
             print(f"  ✗ 未找到目录: {folder_name}")
@@ -589,6 +708,7 @@ def get_directory_input(prompt_text="目录"):
         # 是路径
         print(f"\n正在解析路径: {user_input}")
         cid = find_directory_by_path(user_input)
+        print_dir_cache_stats()
         
         if cid is None:
             print("\n路径解析失败，是否使用根目录？(y/n): ", end='')
@@ -772,6 +892,7 @@ def auto_move_files_task(source_path, target_path, interval_minutes, min_size_by
                     cid=source_cid,
                     cur=0,  # 遍历子目录树
                     page_size=1000,
+                    max_workers=SCAN_WORKERS,
                     **get_ios_ua_app(),
                 ):
                     total_files += 1
@@ -1003,6 +1124,7 @@ def run_manual_mode():
                     result = move_files(file_id, target_pid)
                     
                     if result.get('state'):
+                        dir_cache.invalidate(selected_file.get('parent_id'))
                         print(f"✓ 移动成功！")
                     else:
                         error_msg = result.get('error', result.get('error_msg', '未知错误'))
@@ -1028,6 +1150,8 @@ if __name__ == "__main__":
     print("115网盘文件移动工具")
     print("=" * 80)
     
+    SCAN_WORKERS = parse_scan_workers(os.environ.get('SCAN_WORKERS', str(DEFAULT_SCAN_WORKERS)).strip())
+    
     # 初始化客户端
     if not init_client():
         print("\n客户端初始化失败，程序退出")
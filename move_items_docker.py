@@ -5,18 +5,30 @@
 """
 
 from pathlib import Path
-from p115client import P115Client
-from p115client.tool.iterdir import iter_files, iter_dirs
+from p115client import P115Client, normalize_attr
 import time
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
 import os
 from logging.handlers import TimedRotatingFileHandler
 from functools import wraps
-import signal
 from contextlib import contextmanager
 import requests
+import random
+import threading
+import json
+import queue
+import sqlite3
+import asyncio
+import inspect
+import contextvars
+import httpx
+import sys
+import argparse
+import heapq
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Dict
 
 
@@ -26,6 +38,8 @@ logger = None
 LOG_DIR = "/app/logs"
 DATA_DIR = "/app/data"
 COOKIE_FILE = os.path.join(DATA_DIR, "115-cookies.txt")
+STATE_DB_FILE = os.path.join(DATA_DIR, "state.db")
+MOVE_JOURNAL_FILE = os.path.join(DATA_DIR, "move_journal.jsonl")
 
 # iOS UA 配置
 IOS_UA = (
@@ -44,10 +58,161 @@ def get_ios_ua_app() -> Dict[str, str]:
     }
 
 # 默认超时和重试配置
-DEFAULT_API_TIMEOUT = 120  # 默认120秒超时
+DEFAULT_API_TIMEOUT = 120  # 默认120秒超时（单次尝试的总截止时间）
+DEFAULT_API_CONNECT_TIMEOUT = 10  # 默认建立连接超时（秒）
+DEFAULT_API_READ_TIMEOUT = 60  # 默认读取响应超时（秒）
+API_CONNECT_TIMEOUT = DEFAULT_API_CONNECT_TIMEOUT
+API_READ_TIMEOUT = DEFAULT_API_READ_TIMEOUT
 DEFAULT_API_RETRY_TIMES = 3  # 默认重试3次
 BARK_URL = None  # Bark通知URL
 CALLBACK_URL = None  # 文件移动后的回调URL
+DEFAULT_NOTIFY_QUEUE_SIZE = 100  # 默认通知队列容量，满了之后丢弃新通知
+DEFAULT_NOTIFY_COALESCE_WINDOW = 300  # 默认相同通知的合并窗口（秒）
+NOTIFY_RETRIES = 3  # 通知发送失败时的最多尝试次数
+NOTIFY_FLUSH_TIMEOUT = 10  # 程序退出前等待通知发送完成的最长时间（秒）
+DEFAULT_MOVE_BATCH_SIZE = 500  # 默认每批移动500个文件
+MOVE_BATCH_SIZE = DEFAULT_MOVE_BATCH_SIZE  # 每次 fs_move 请求携带的文件数量
+MOVE_BISECT = True  # 批量移动失败时是否二分定位失败的文件
+DEFAULT_API_RATE = 2.0  # 默认初始请求速率（次/秒）
+DEFAULT_API_RATE_MIN = 0.2  # 默认最低请求速率（次/秒）
+DEFAULT_API_RATE_MAX = 10.0  # 默认最高请求速率（次/秒）
+INCREMENTAL_SCAN = True  # 是否启用基于快照的增量扫描
+SCAN_PAGE_SIZE = 1000  # 列举目录时每页获取的数量
+SIZE_ORDERED_SCAN = False  # 是否按文件大小降序列举，遇到小文件即停止翻页
+SCAN_FILE_TYPE = None  # 交给接口过滤的文件类型（1-7），None 表示不过滤
+DEFAULT_SCAN_QUEUE_SIZE = 2000  # 默认扫描与移动之间的队列容量
+SCAN_QUEUE_SIZE = DEFAULT_SCAN_QUEUE_SIZE
+MOVE_FLUSH_SECONDS = 2  # 队列空闲多久后提交未凑满的批次（秒）
+SCAN_CURSOR_MAX_AGE = 24 * 3600  # 扫描断点的最长保留时间（秒），过期后重新完整扫描
+SCAN_CHECKPOINT_INTERVAL = 5  # 扫描断点的最短记录间隔（秒），断点需序列化全部剩余任务，不宜每页记录
+SNAPSHOT_MAX_AGE = 3600  # 目录快照的最长使用时间（秒），过期后即使签名未变也重新列举
+FILE_INFO_BATCH_SIZE = 100  # 确认快照文件位置时每次 fs_file 请求携带的文件数量
+RESOLVE_WORKERS = 4  # 解析路径映射时并发列举目录的线程数
+DEFAULT_SCAN_WORKERS = 4  # 默认扫描源目录时并发列举的子目录数
+SCAN_WORKERS = DEFAULT_SCAN_WORKERS
+DEFAULT_DIR_CACHE_SIZE = 1024  # 默认目录列表缓存的最大条目数
+DEFAULT_DIR_CACHE_TTL = 300  # 默认目录列表缓存的有效期（秒）
+ENGINE = 'sync'  # 执行引擎：sync 在线程池中扫描映射，async 在事件循环中扫描映射
+DEFAULT_MAPPING_CONCURRENCY = 4  # 默认同时扫描的映射数
+MAPPING_CONCURRENCY = DEFAULT_MAPPING_CONCURRENCY
+MOVE_ROUND_BUDGET = 0  # 每轮最多移动的文件数量，0 表示不限制
+ADAPTIVE_INTERVAL_RANGE = None  # 自适应检查间隔的 (下限, 上限) 秒数，None 表示固定间隔
+CONTROL_HOST = '0.0.0.0'  # 控制接口监听地址
+CONTROL_PORT = None  # 控制接口端口，None 表示不启动
+CONTROL_TOKEN = None  # 控制接口令牌，None 表示不校验
+DEFAULT_SCAN_DEBOUNCE = 10  # 默认立即扫描请求的防抖时间（秒）
+DEFAULT_STABLE_SCANS = 0  # 默认文件大小和修改时间需连续保持不变的扫描次数（0 表示不按次数判断）
+DEFAULT_STABLE_SECONDS = 0  # 默认文件保持不变多久（秒）后视为稳定（0 表示不按时间判断）
+STABILITY_MAX_AGE = 7 * 24 * 3600  # 稳定性记录多久未再扫描到后删除（秒）
+
+
+class Metric:
+    """
+    单个监控指标（counter / gauge / histogram），按标签值分别计数
+    """
+    
+    def __init__(self, name, help_text, kind, label_names=(), buckets=None, fn=None):
+        """
+        参数:
+            name: 指标名称
+            help_text: 说明
+            kind: 'counter'、'gauge' 或 'histogram'
+            label_names: 标签名称
+            buckets: histogram 的桶上限（秒）
+            fn: gauge 的取值函数，输出时调用，返回数值或 {标签值元组: 数值}
+        """
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets or ())
+        self.fn = fn
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+    
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+    
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (value <= bound) for c, bound in zip(counts, self.buckets)]
+            self.values[key] = (counts, total + value, count + 1)
+    
+    @staticmethod
+    def _format_labels(names, values, extra=()):
+        pairs = list(zip(names, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        if self.fn is not None:
+            value = self.fn()
+            values = value if isinstance(value, dict) else {(): value}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        for key, value in sorted(values.items()):
+            if self.kind != 'histogram':
+                lines.append(f"{self.name}{self._format_labels(self.label_names, key)} {value:g}")
+                continue
+            counts, total, count = value
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = self._format_labels(self.label_names, key, [('le', f"{bound:g}")])
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = self._format_labels(self.label_names, key, [('le', '+Inf')])
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(self.label_names, key)} {total:g}")
+            lines.append(f"{self.name}_count{self._format_labels(self.label_names, key)} {count}")
+        return '\n'.join(lines)
+
+
+class MetricsRegistry:
+    """监控指标注册表，以 Prometheus 文本格式输出"""
+    
+    def __init__(self):
+        self.metrics = []
+    
+    def add(self, *args, **kwargs):
+        metric = Metric(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+ROUND_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+metrics = MetricsRegistry()
+API_REQUESTS = metrics.add('p115_api_requests_total', '115 API requests by endpoint and outcome',
+                           'counter', ('endpoint', 'outcome'))
+API_LATENCY = metrics.add('p115_api_request_duration_seconds', '115 API request latency',
+                          'histogram', ('endpoint',), buckets=LATENCY_BUCKETS)
+API_RETRIES = metrics.add('p115_api_retries_total', 'Retries scheduled by with_retry_and_timeout',
+                          'counter', ('reason',))
+API_TIMEOUTS = metrics.add('p115_api_timeouts_total', 'Attempts that ended in a timeout', 'counter')
+FILES_MOVED = metrics.add('p115_files_moved_total', 'Files moved successfully', 'counter')
+BYTES_MOVED = metrics.add('p115_bytes_moved_total', 'Bytes of files moved successfully', 'counter')
+FILES_FAILED = metrics.add('p115_files_failed_total', 'Files that failed to move', 'counter')
+ROUNDS = metrics.add('p115_rounds_total', 'Completed check rounds by trigger', 'counter', ('reason',))
+ROUND_DURATION = metrics.add('p115_round_duration_seconds', 'Duration of check rounds',
+                             'histogram', buckets=ROUND_BUCKETS)
 
 
 class TimeoutError(Exception):
@@ -55,43 +220,140 @@ class TimeoutError(Exception):
     pass
 
 
+# 当前线程/协程所处请求的截止时间（time.monotonic），由 with_retry_and_timeout 设置
+_request_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
 @contextmanager
-def timeout_handler(seconds):
+def request_deadline(seconds):
     """
-    超时上下文管理器（仅限Unix/Linux系统）
+    为当前线程或协程内发出的接口请求设置总截止时间
+    
+    基于 contextvars 实现，不依赖信号，可在任意线程和 asyncio 任务中使用。
     
     参数:
-        seconds: 超时秒数
+        seconds: 从现在起的总超时秒数
     """
-    def timeout_signal_handler(signum, frame):
-        raise TimeoutError(f"操作超时 ({seconds}秒)")
-    
-    # Windows系统不支持signal.alarm，直接返回
-    if os.name == 'nt':
-        yield
-        return
-    
-    # 设置信号处理器
-    old_handler = signal.signal(signal.SIGALRM, timeout_signal_handler)
-    signal.alarm(seconds)
-    
+    token = _request_deadline.set(time.monotonic() + seconds)
     try:
         yield
     finally:
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, old_handler)
+        _request_deadline.reset(token)
+
+
+def request_timeout():
+    """
+    计算下一次HTTP请求使用的超时设置
+    
+    连接和读取超时取各自配置与剩余总时间中的较小值。
+    
+    返回:
+        httpx.Timeout: 超时设置
+    
+    异常:
+        TimeoutError: 总截止时间已过
+    """
+    connect = API_CONNECT_TIMEOUT
+    read = API_READ_TIMEOUT
+    deadline = _request_deadline.get()
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("操作超时 (已超过总截止时间)")
+        connect = min(connect, remaining)
+        read = min(read, remaining)
+    return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+
+def _retry_wait(error, attempt, retries, operation_name):
+    """
+    处理一次失败的尝试，返回重试前的等待秒数
+    
+    参数:
+        error: 本次尝试抛出的异常
+        attempt: 当前尝试序号（从0开始）
+        retries: 最大尝试次数
+        operation_name: 操作名称，用于日志输出
+    
+    返回:
+        float: 等待秒数；None 表示不再重试
+    """
+    if isinstance(error, TimeoutError):
+        API_TIMEOUTS.inc()
+        if attempt < retries - 1:
+            API_RETRIES.inc(reason='timeout')
+            wait_time = rate_limiter.retry_delay(attempt)
+            logger.warning(f"⚠️  {operation_name}超时 (尝试 {attempt + 1}/{retries})，{wait_time:.1f}秒后重试...")
+            return wait_time
+        logger.error(f"❌ {operation_name}在 {retries} 次尝试后仍然超时")
+        logger.error("💡 建议: 如果持续超时，可能是网络问题或Cookie已失效")
+        logger.error("   1. 检查网络连接和代理设置")
+        logger.error("   2. 尝试重新获取Cookie并更新配置")
+        send_bark_notification(
+            f"115自动移动失败: {operation_name}",
+            f"操作超时({retries}次重试后仍失败)，请检查网络或Cookie",
+            "timeSensitive"
+        )
+        return None
+    
+    error_str = str(error).lower()
+    
+    # 检查是否是认证错误（不重试）
+    if 'login' in error_str or 'auth' in error_str or 'cookie' in error_str:
+        logger.error(f"❌ {operation_name}失败: 认证错误，不进行重试")
+        raise error
+    
+    # 其他错误进行重试
+    if attempt < retries - 1:
+        API_RETRIES.inc(reason='error')
+        wait_time = rate_limiter.retry_delay(attempt)
+        logger.warning(f"⚠️  {operation_name}失败 (尝试 {attempt + 1}/{retries}): {error}")
+        logger.warning(f"   {wait_time:.1f}秒后重试...")
+        return wait_time
+    logger.error(f"❌ {operation_name}在 {retries} 次尝试后仍然失败: {error}")
+    logger.error("💡 建议: 如果持续失败，可能是Cookie已失效")
+    logger.error("   请尝试重新获取Cookie并更新配置")
+    send_bark_notification(
+        f"115自动移动失败: {operation_name}",
+        f"操作失败({retries}次重试后): {str(error)[:100]}",
+        "timeSensitive"
+    )
+    return None
 
 
 def with_retry_and_timeout(max_retries=None, timeout_seconds=None, operation_name="操作"):
     """
     为函数添加超时和重试机制的装饰器
     
+    超时在HTTP请求层面生效（见 request_timeout），支持普通函数和协程函数，
+    可在工作线程和 asyncio 任务中使用。
+    
     参数:
         max_retries: 最大重试次数，None表示使用全局配置
-        timeout_seconds: 超时秒数，None表示使用全局配置
+        timeout_seconds: 每次尝试的总超时秒数，None表示使用全局配置
         operation_name: 操作名称，用于日志输出
     """
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                retries = max_retries if max_retries is not None else DEFAULT_API_RETRY_TIMES
+                timeout = timeout_seconds if timeout_seconds is not None else DEFAULT_API_TIMEOUT
+                last_error = None
+                for attempt in range(retries):
+                    try:
+                        with request_deadline(timeout):
+                            return await asyncio.wait_for(func(*args, **kwargs), timeout)
+                    except asyncio.TimeoutError:
+                        last_error = TimeoutError(f"操作超时 ({timeout}秒)")
+                    except Exception as e:
+                        last_error = e
+                    wait_time = _retry_wait(last_error, attempt, retries, operation_name)
+                    if wait_time is not None:
+                        await asyncio.sleep(wait_time)
+                raise last_error
+            return async_wrapper
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
             # 获取全局配置
@@ -102,63 +364,321 @@ def with_retry_and_timeout(max_retries=None, timeout_seconds=None, operation_nam
             
             for attempt in range(retries):
                 try:
-                    # Windows系统直接执行，不使用信号超时
-                    if os.name == 'nt':
-                        return func(*args, **kwargs)
-                    
-                    # Unix/Linux系统使用信号超时
-                    with timeout_handler(timeout):
+                    with request_deadline(timeout):
                         return func(*args, **kwargs)
-                        
-                except TimeoutError as e:
-                    last_error = e
-                    if attempt < retries - 1:
-                        wait_time = (attempt + 1) * 2  # 递增等待时间
-                        logger.warning(f"⚠️  {operation_name}超时 (尝试 {attempt + 1}/{retries})，{wait_time}秒后重试...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error(f"❌ {operation_name}在 {retries} 次尝试后仍然超时")
-                        logger.error("💡 建议: 如果持续超时，可能是网络问题或Cookie已失效")
-                        logger.error("   1. 检查网络连接和代理设置")
-                        logger.error("   2. 尝试重新获取Cookie并更新配置")
-                        send_bark_notification(
-                            f"115自动移动失败: {operation_name}",
-                            f"操作超时({retries}次重试后仍失败)，请检查网络或Cookie",
-                            "timeSensitive"
-                        )
-                        
                 except Exception as e:
                     last_error = e
-                    error_str = str(e).lower()
-                    
-                    # 检查是否是认证错误（不重试）
-                    if 'login' in error_str or 'auth' in error_str or 'cookie' in error_str:
-                        logger.error(f"❌ {operation_name}失败: 认证错误，不进行重试")
-                        raise
-                    
-                    # 其他错误进行重试
-                    if attempt < retries - 1:
-                        wait_time = (attempt + 1) * 2
-                        logger.warning(f"⚠️  {operation_name}失败 (尝试 {attempt + 1}/{retries}): {e}")
-                        logger.warning(f"   {wait_time}秒后重试...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error(f"❌ {operation_name}在 {retries} 次尝试后仍然失败: {e}")
-                        logger.error("💡 建议: 如果持续失败，可能是Cookie已失效")
-                        logger.error("   请尝试重新获取Cookie并更新配置")
-                        send_bark_notification(
-                            f"115自动移动失败: {operation_name}",
-                            f"操作失败({retries}次重试后): {str(e)[:100]}",
-                            "timeSensitive"
-                        )
+                wait_time = _retry_wait(last_error, attempt, retries, operation_name)
+                if wait_time is not None:
+                    time.sleep(wait_time)
             
             # 所有重试都失败
             raise last_error
-        
         return wrapper
     return decorator
 
 
+class AdaptiveRateLimiter:
+    """
+    自适应令牌桶限流器（进程内所有115 API调用共享）
+    
+    请求成功时速率加性增加，被限流、超时或连接失败时速率乘性降低（AIMD），
+    其他错误响应（如文件不存在）不改变速率
+    """
+    
+    def __init__(self, rate=DEFAULT_API_RATE, min_rate=DEFAULT_API_RATE_MIN, max_rate=DEFAULT_API_RATE_MAX,
+                 increase=0.1, decrease=0.5):
+        """
+        参数:
+            rate: 初始速率（次/秒）
+            min_rate: 最低速率（次/秒）
+            max_rate: 最高速率（次/秒）
+            increase: 每次成功后增加的速率
+            decrease: 每次限流后速率乘以的系数
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.throttle_events = 0
+        self.round_throttle_events = 0
+        self.priority_waiters = 0
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        # 桶容量为1秒的请求量，避免长时间空闲后瞬间突发
+        capacity = max(1.0, self.rate)
+        self.tokens = min(capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+    
+    def _take(self, priority=False):
+        """尝试取出一个令牌，返回还需等待的秒数（0 表示已取得）"""
+        with self.lock:
+            self._refill()
+            # 有优先请求在等待时，普通请求让出令牌
+            if self.tokens >= 1 and (priority or not self.priority_waiters):
+                self.tokens -= 1
+                return 0
+            return max(1 - self.tokens, 0.1) / self.rate
+    
+    def _wait_priority(self, delta):
+        with self.lock:
+            self.priority_waiters += delta
+    
+    def acquire(self, priority=False):
+        """
+        获取一个令牌，令牌不足时阻塞等待
+        
+        参数:
+            priority: 是否优先获取（移动请求优先于并发的列举请求，避免移动阶段被饿死）
+        """
+        if priority:
+            self._wait_priority(1)
+        try:
+            while True:
+                wait_time = self._take(priority)
+                if not wait_time:
+                    return
+                time.sleep(wait_time)
+        finally:
+            if priority:
+                self._wait_priority(-1)
+    
+    async def acquire_async(self, priority=False):
+        """获取一个令牌（协程版本），令牌不足时让出事件循环等待"""
+        if priority:
+            self._wait_priority(1)
+        try:
+            while True:
+                wait_time = self._take(priority)
+                if not wait_time:
+                    return
+                await asyncio.sleep(wait_time)
+        finally:
+            if priority:
+                self._wait_priority(-1)
+    
+    def on_success(self):
+        """请求成功，加性增加速率"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+    
+    def on_throttle(self):
+        """请求被限流、超时或连接失败，乘性降低速率并清空令牌"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            self.throttle_events += 1
+            self.round_throttle_events += 1
+    
+    def retry_delay(self, attempt):
+        """
+        计算重试前的等待时间：以当前速率为基准指数退避，并加入随机抖动
+        
+        参数:
+            attempt: 已失败的次数（从0开始）
+        
+        返回:
+            float: 等待秒数
+        """
+        with self.lock:
+            base = 1.0 / self.rate
+        delay = min(60.0, base * (2 ** (attempt + 1)))
+        return delay + random.uniform(0, delay / 2)
+    
+    def pop_round_stats(self):
+        """
+        获取当前速率和本轮限流次数，并重置本轮计数
+        
+        返回:
+            tuple: (当前速率, 本轮限流次数, 累计限流次数)
+        """
+        with self.lock:
+            events = self.round_throttle_events
+            self.round_throttle_events = 0
+            return self.rate, events, self.throttle_events
+
+
+rate_limiter = AdaptiveRateLimiter()
+
+# 需要经过限流器的客户端方法（目录列举、移动和用户信息接口）
+RATE_LIMITED_METHODS = (
+    'fs_files', 'fs_files_app', 'fs_files_aps',
+    'fs_move', 'fs_move_app',
+    'user_info',
+    'fs_search', 'fs_shasearch', 'fs_file',
+)
+
+# 优先获取令牌的客户端方法（移动接口）
+PRIORITY_METHODS = ('fs_move', 'fs_move_app')
+
+
+def is_error_response(result):
+    """
+    判断API返回结果是否为错误响应（state为假或带有errno）
+    
+    参数:
+        result: API 返回的结果
+    
+    返回:
+        bool: True 表示错误响应
+    """
+    if not isinstance(result, dict):
+        return False
+    if 'state' in result:
+        return not result.get('state')
+    return bool(result.get('errno'))
+
+
+# 表示请求过于频繁的错误码和错误信息
+RATE_LIMIT_ERRNOS = (990009,)
+RATE_LIMIT_KEYWORDS = ('频繁', '稍后再试', 'too many', 'rate limit')
+# 与具体文件无关、整批都会失败的错误（登录失效、无权限、空间不足等）
+BATCH_WIDE_ERRNOS = (99, 990001)
+BATCH_WIDE_KEYWORDS = ('login', 'auth', '登录', '权限', 'permission', '空间不足', '容量不足', 'quota')
+
+
+def response_errno(result):
+    """读取错误响应中的错误码，没有或无法解析时返回 0"""
+    try:
+        return int(result.get('errno') or result.get('code') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def response_error_msg(result):
+    """读取错误响应中的错误信息"""
+    return str(result.get('error') or result.get('error_msg') or result.get('msg') or '')
+
+
+def is_rate_limited_response(result):
+    """
+    判断错误响应是否表示请求过于频繁
+    
+    参数:
+        result: API 返回的结果
+    
+    返回:
+        bool: True 表示被限流
+    """
+    if not isinstance(result, dict):
+        return False
+    error_msg = response_error_msg(result).lower()
+    return (response_errno(result) in RATE_LIMIT_ERRNOS
+            or any(keyword in error_msg for keyword in RATE_LIMIT_KEYWORDS))
+
+
+def is_batch_wide_error(result):
+    """
+    判断错误响应是否与具体文件无关（限流、登录失效、无权限、空间不足等），
+    这类错误拆分批次后仍会失败
+    
+    参数:
+        result: API 返回的结果
+    
+    返回:
+        bool: True 表示整批错误
+    """
+    if is_rate_limited_response(result):
+        return True
+    error_msg = response_error_msg(result).lower()
+    return (response_errno(result) in BATCH_WIDE_ERRNOS
+            or any(keyword in error_msg for keyword in BATCH_WIDE_KEYWORDS))
+
+
+def is_throttle_exception(error):
+    """
+    判断请求异常是否说明服务器过载或在限流（超时、连接失败、HTTP 429/5xx）
+    
+    参数:
+        error: 异常对象
+    
+    返回:
+        bool: True 表示应降低请求速率
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError))
+
+
+def instrument_client(api_client):
+    """
+    为客户端的接口方法套上全局限流器，并为每次请求设置连接/读取超时、记录监控指标
+    
+    同步调用和 async_=True 的协程调用共享同一个限流器
+    
+    参数:
+        api_client: P115Client 对象
+    
+    返回:
+        P115Client: 同一个客户端对象
+    """
+    def record(name, started, result):
+        API_LATENCY.observe(time.monotonic() - started, endpoint=name)
+        if is_rate_limited_response(result):
+            API_REQUESTS.inc(endpoint=name, outcome='throttled')
+            rate_limiter.on_throttle()
+        elif is_error_response(result):
+            # 文件不存在、目标目录不存在等业务错误与请求速率无关，不影响限流器
+            API_REQUESTS.inc(endpoint=name, outcome='error')
+        else:
+            API_REQUESTS.inc(endpoint=name, outcome='ok')
+            rate_limiter.on_success()
+        return result
+    
+    def record_exception(name, started, error):
+        API_LATENCY.observe(time.monotonic() - started, endpoint=name)
+        if isinstance(error, httpx.TimeoutException):
+            API_REQUESTS.inc(endpoint=name, outcome='timeout')
+            rate_limiter.on_throttle()
+            raise TimeoutError(f"请求超时: {error}") from error
+        API_REQUESTS.inc(endpoint=name, outcome='exception')
+        if is_throttle_exception(error):
+            rate_limiter.on_throttle()
+        raise error
+    
+    def wrap(name, method, priority):
+        async def call_async(args, kwargs):
+            await rate_limiter.acquire_async(priority)
+            # 超时在拿到令牌后计算，排队等待令牌的时间要从剩余总时间中扣除
+            if 'timeout' not in kwargs:
+                kwargs['timeout'] = request_timeout()
+            started = time.monotonic()
+            try:
+                result = await method(*args, **kwargs)
+            except Exception as e:
+                record_exception(name, started, e)
+            return record(name, started, result)
+        
+        @wraps(method)
+        def limited(*args, **kwargs):
+            # async_=True 时返回协程，在事件循环中等待令牌
+            if kwargs.get('async_'):
+                return call_async(args, kwargs)
+            rate_limiter.acquire(priority)
+            # 同上，超时在拿到令牌后计算
+            if 'timeout' not in kwargs:
+                kwargs['timeout'] = request_timeout()
+            started = time.monotonic()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                record_exception(name, started, e)
+            return record(name, started, result)
+        return limited
+    
+    for name in RATE_LIMITED_METHODS:
+        method = getattr(api_client, name, None)
+        if method is not None:
+            setattr(api_client, name, wrap(name, method, name in PRIORITY_METHODS))
+    
+    return api_client
+
+
 def setup_logger(log_retention_days=7):
     """
     设置日志记录器，按天分割，自动清理旧日志
@@ -200,9 +720,145 @@ def setup_logger(log_retention_days=7):
     return logger
 
 
+class NotificationDispatcher:
+    """
+    后台通知发送器
+    
+    Bark 通知和回调都放入有界队列，由一个后台线程通过复用连接的 Session 发送，
+    失败时按指数退避重试。调用方只负责入队，不会被慢速或不可用的通知服务拖住。
+    
+    合并规则:
+        - Bark: 同一标题和级别的通知在合并窗口内只发送一次，
+          窗口结束后的下一条通知会附带期间被合并的条数
+        - 回调: 队列中已有一个尚未发送的回调时不再重复入队
+    """
+    
+    def __init__(self, capacity=DEFAULT_NOTIFY_QUEUE_SIZE, coalesce_window=DEFAULT_NOTIFY_COALESCE_WINDOW):
+        """
+        参数:
+            capacity: 队列容量
+            coalesce_window: 相同 Bark 通知的合并窗口（秒）
+        """
+        self.queue = queue.Queue(maxsize=max(1, capacity))
+        self.coalesce_window = coalesce_window
+        self.lock = threading.Lock()
+        self.pending = set()  # 已入队尚未发送的通知键
+        self.last_sent = {}  # 通知键 -> 上次发送时间
+        self.suppressed = {}  # 通知键 -> 窗口内被合并的条数
+        self.dropped = 0
+        self.session = None
+        self.thread = None
+    
+    def _ensure_worker(self):
+        if self.thread is None:
+            self.session = requests.Session()
+            self.session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=2))
+            self.session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=2))
+            self.thread = threading.Thread(target=self._worker, name='notifier', daemon=True)
+            self.thread.start()
+    
+    def submit(self, key, job, coalesce=True):
+        """
+        放入一条通知，立即返回
+        
+        参数:
+            key: 合并用的通知键
+            job: {'kind', 'url', 'timeout', 'label'}
+            coalesce: 是否在合并窗口内合并相同通知
+        
+        返回:
+            bool: 是否已入队
+        """
+        now = time.monotonic()
+        with self.lock:
+            self._ensure_worker()
+            if key in self.pending:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return False
+            if coalesce and now - self.last_sent.get(key, float('-inf')) < self.coalesce_window:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return False
+            try:
+                self.queue.put_nowait((key, job))
+            except queue.Full:
+                self.dropped += 1
+                logger.warning(f"⚠️  通知队列已满，丢弃通知: {job['label']}（累计丢弃 {self.dropped} 条）")
+                return False
+            self.pending.add(key)
+            self.last_sent[key] = now
+            return True
+    
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                key, job = item
+                with self.lock:
+                    self.pending.discard(key)
+                    merged = self.suppressed.pop(key, 0)
+                self._deliver(job, merged)
+            except Exception as e:
+                logger.warning(f"⚠️  通知发送异常: {e}")
+            finally:
+                self.queue.task_done()
+    
+    def _deliver(self, job, merged):
+        url = job['url']
+        if merged and job['kind'] == 'bark':
+            # 合并的条数附加在 Bark 通知正文末尾
+            path, _, query = url.partition('?')
+            url = f"{path}{requests.utils.quote(f'（期间另有 {merged} 条相同通知）')}?{query}"
+        for attempt in range(NOTIFY_RETRIES):
+            try:
+                response = self.session.get(url, timeout=job['timeout'])
+                if response.status_code == 200:
+                    if job['kind'] == 'bark':
+                        logger.info(f"📱 Bark通知已发送: {job['label']}")
+                    else:
+                        logger.info(f"✅ 回调成功: HTTP {response.status_code}")
+                    return True
+                # 4xx 为配置问题，重试无意义
+                if response.status_code < 500 and response.status_code != 429:
+                    logger.warning(f"⚠️  {job['label']}返回非200: HTTP {response.status_code}")
+                    return False
+                error = f"HTTP {response.status_code}"
+            except requests.exceptions.Timeout:
+                error = "超时"
+            except Exception as e:
+                error = str(e)
+            if attempt < NOTIFY_RETRIES - 1:
+                wait_time = min(30, 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"⚠️  {job['label']}发送失败: {error}，{wait_time:.1f}秒后重试 "
+                               f"(尝试 {attempt + 1}/{NOTIFY_RETRIES})")
+                time.sleep(wait_time)
+            else:
+                logger.warning(f"⚠️  {job['label']}发送失败: {error}，已放弃")
+        return False
+    
+    def close(self, timeout=NOTIFY_FLUSH_TIMEOUT):
+        """
+        等待队列中的通知发送完成（最多 timeout 秒），然后停止后台线程
+        """
+        if self.thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if self.queue.unfinished_tasks:
+            logger.warning(f"⚠️  仍有 {self.queue.unfinished_tasks} 条通知未发送，程序退出")
+            return
+        self.queue.put(None)
+        self.thread.join(timeout=1)
+
+
+notifier = NotificationDispatcher()
+
+
 def send_bark_notification(title, content, level="passive"):
     """
-    发送Bark通知
+    发送Bark通知（放入后台队列，不阻塞调用方）
     
     参数:
         title: 通知标题
@@ -212,36 +868,22 @@ def send_bark_notification(title, content, level="passive"):
     if not BARK_URL:
         return
     
-    try:
-        # 组合完整的Bark URL
-        url = f"{BARK_URL.rstrip('/')}/{requests.utils.quote(title)}/{requests.utils.quote(content)}?level={level}"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            logger.info(f"📱 Bark通知已发送: {title}")
-        else:
-            logger.warning(f"⚠️  Bark通知发送失败: HTTP {response.status_code}")
-    except Exception as e:
-        logger.warning(f"⚠️  Bark通知发送异常: {e}")
+    # 组合完整的Bark URL
+    url = f"{BARK_URL.rstrip('/')}/{requests.utils.quote(title)}/{requests.utils.quote(content)}?level={level}"
+    notifier.submit(('bark', title, level), {'kind': 'bark', 'url': url, 'timeout': 5, 'label': title})
 
 
 def trigger_callback():
     """
-    触发回调URL，用于通知外部系统文件已移动
+    触发回调URL，用于通知外部系统文件已移动（放入后台队列，不阻塞调用方）
     """
     if not CALLBACK_URL:
         return
     
-    try:
+    if notifier.submit(('callback', CALLBACK_URL),
+                       {'kind': 'callback', 'url': CALLBACK_URL, 'timeout': 10, 'label': '回调'},
+                       coalesce=False):
         logger.info(f"🔔 正在触发回调: {CALLBACK_URL}")
-        response = requests.get(CALLBACK_URL, timeout=10)
-        if response.status_code == 200:
-            logger.info(f"✅ 回调成功: HTTP {response.status_code}")
-        else:
-            logger.warning(f"⚠️  回调返回非200: HTTP {response.status_code}")
-    except requests.exceptions.Timeout:
-        logger.warning(f"⚠️  回调超时: {CALLBACK_URL}")
-    except Exception as e:
-        logger.warning(f"⚠️  回调失败: {e}")
 
 
 def parse_path_mappings(mappings_str):
@@ -250,17 +892,20 @@ def parse_path_mappings(mappings_str):
     
     参数:
         mappings_str: 映射字符串，格式: "源路径1->目标路径1,源路径2->目标路径2"
+                      每组映射可以用 '|' 附加选项，如 "/下载->/视频|priority=3;interval=2m"
     
     返回:
-        list: [(源路径, 目标路径), ...] 或空列表
+        list: [(源路径, 目标路径, 选项字典), ...] 或空列表
     """
     if not mappings_str or not mappings_str.strip():
         return []
     
     mappings = []
-    pairs = mappings_str.split(',')
+    # 逗号后的片段含 '->' 时才是新的映射，cron 表达式中的逗号列表不会被拆开
+    pairs = re.split(r',(?=[^,]*->)', mappings_str)
     
     for idx, pair in enumerate(pairs, 1):
+        pair, _, options_str = pair.partition('|')
         pair = pair.strip()
         if not pair:
             continue
@@ -292,12 +937,256 @@ def parse_path_mappings(mappings_str):
             logger.warning(f"    已自动修正为: /{target}")
             target = '/' + target
         
-        mappings.append((source, target))
-        logger.info(f"✓ 映射 {idx}: {source} -> {target}")
+        options = parse_mapping_options(options_str, idx)
+        mappings.append((source, target, options))
+        if options:
+            options_desc = ', '.join(f"{key}={value}" for key, value in options.items())
+            logger.info(f"✓ 映射 {idx}: {source} -> {target} ({options_desc})")
+        else:
+            logger.info(f"✓ 映射 {idx}: {source} -> {target}")
     
     return mappings
 
 
+def parse_mapping_options(options_str, idx):
+    """
+    解析单组映射的选项
+    
+    参数:
+        options_str: 选项字符串，格式: "key1=value1;key2=value2"
+        idx: 映射序号，用于日志输出
+    
+    返回:
+        dict: 选项字典，支持的选项:
+              - priority: 移动优先级（1-100），公平队列中按比例分配移动份额
+              - interval: 检查间隔（秒），如 "90s"、"2m"、"1h"，不带单位时为分钟
+              - cron: cron 表达式（分 时 日 月 周），与 interval 二选一
+              - jitter: 每次检查时间随机推迟的最大秒数，如 "30s"
+              - rules: 过滤规则名称，使用环境变量 FILTER_RULES_<名称> 中的规则
+              - routes: 分流规则名称，使用环境变量 ROUTES_<名称> 按规则把文件分到不同目标目录
+    """
+    options = {}
+    for item in options_str.split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, value = item.partition('=')
+        key = key.strip().lower()
+        value = value.strip()
+        if not sep or not value:
+            logger.warning(f"⚠️  映射 {idx}: 选项格式错误（应为 key=value）: {item}")
+            continue
+        
+        if key == 'priority':
+            try:
+                priority = int(value)
+            except ValueError:
+                logger.warning(f"⚠️  映射 {idx}: priority 值无效: {value}，使用默认值 1")
+                continue
+            options['priority'] = min(max(priority, 1), 100)
+        elif key == 'interval':
+            seconds = parse_duration(value, default_unit=60)
+            if seconds is None:
+                logger.warning(f"⚠️  映射 {idx}: interval 值无效: {value}")
+                continue
+            if seconds < 60:
+                logger.warning(f"⚠️  映射 {idx}: interval {value} 过短，已调整为最小值 60 秒")
+                seconds = 60
+            options['interval'] = seconds
+        elif key == 'cron':
+            try:
+                # 同时确认表达式有可触发的时间（如 2 月 31 日永远不会到来）
+                CronSchedule(value).next_after(time.time())
+            except ValueError as e:
+                logger.warning(f"⚠️  映射 {idx}: cron 表达式无效: {value} ({e})")
+                continue
+            options['cron'] = value
+        elif key == 'jitter':
+            seconds = parse_duration(value, default_unit=1)
+            if seconds is None:
+                logger.warning(f"⚠️  映射 {idx}: jitter 值无效: {value}")
+                continue
+            options['jitter'] = seconds
+        elif key == 'rules':
+            options['rules'] = value.lower()
+        elif key == 'routes':
+            options['routes'] = value.lower()
+        else:
+            logger.warning(f"⚠️  映射 {idx}: 未知选项: {key}")
+    
+    return options
+
+
+def parse_duration(value, default_unit=1):
+    """
+    解析时长字符串
+    
+    参数:
+        value: 时长字符串，如 "30s"、"2m"、"1.5h"、"1d"
+        default_unit: 不带单位时每单位的秒数
+    
+    返回:
+        float: 秒数，格式无效时返回 None
+    """
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([smhd]?)$', value.strip().lower())
+    if not match:
+        return None
+    number, unit = match.groups()
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    return float(number) * units.get(unit, default_unit)
+
+
+class CronSchedule:
+    """
+    简化的 cron 表达式（分 时 日 月 周）
+    
+    每个字段支持 *、数字、a-b、*/n、a-b/n 和逗号列表；周日为 0（也可写 7）。
+    日和周都不是 * 时，满足其一即可（与标准 cron 一致）
+    """
+    
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    
+    def __init__(self, expr):
+        """
+        参数:
+            expr: cron 表达式
+        
+        异常:
+            ValueError: 表达式格式无效
+        """
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError("需要 5 个字段（分 时 日 月 周）")
+        self.expr = expr
+        parsed = [self._parse_field(field, lo, hi) for field, (lo, hi) in zip(fields, self.FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+    
+    @staticmethod
+    def _parse_field(field, lo, hi):
+        values = set()
+        for part in field.split(','):
+            part, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if part == '*':
+                start, end = lo, hi
+            elif '-' in part:
+                start, end = (int(x) for x in part.split('-', 1))
+            else:
+                start = int(part)
+                end = hi if step > 1 else start
+            if step < 1 or start < lo or end > hi or start > end:
+                raise ValueError(f"字段超出范围: {field}")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def _day_matches(self, t):
+        day_ok = t.day in self.days
+        weekday_ok = (t.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+    
+    def next_after(self, timestamp):
+        """
+        计算指定时间之后的下一个触发时间
+        
+        参数:
+            timestamp: 起始时间戳
+        
+        返回:
+            float: 下一个触发时间戳
+        """
+        t = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = datetime(t.year + (t.month == 12), t.month % 12 + 1, 1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t.timestamp()
+        raise ValueError(f"cron 表达式没有可触发的时间: {self.expr}")
+
+
+class MappingSchedule:
+    """
+    单个映射的检查计划（固定间隔或 cron 表达式，可加随机抖动）
+    
+    固定间隔按开始时间计算（start-to-start），本次检查耗时不会推迟下一次检查；
+    耗时超过间隔时下一次立即开始。开启自适应间隔时，移动了文件的检查之后
+    间隔缩短到下限，没有文件的检查之后间隔加倍，直到上限
+    """
+    
+    def __init__(self, interval=None, cron=None, jitter=0, adaptive_range=None):
+        """
+        参数:
+            interval: 检查间隔（秒）
+            cron: cron 表达式，设置后忽略 interval
+            jitter: 随机推迟的最大秒数
+            adaptive_range: 自适应间隔的 (下限, 上限) 秒数，None 表示固定间隔
+        """
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron else None
+        self.jitter = jitter
+        self.adaptive_range = adaptive_range if self.cron is None else None
+    
+    def observe(self, moved):
+        """
+        根据本次检查的移动数量调整自适应间隔
+        
+        参数:
+            moved: 本次检查成功移动的文件数量
+        
+        返回:
+            bool: 间隔是否被调整（未开启自适应时返回 False）
+        """
+        if self.adaptive_range is None:
+            return False
+        low, high = self.adaptive_range
+        if moved:
+            self.interval = low
+        else:
+            self.interval = min(max(self.interval * 2, low), high)
+        return True
+    
+    def next_base(self, prev_base, now):
+        """
+        计算下一次计划检查时间（不含抖动）
+        
+        参数:
+            prev_base: 上一次计划检查时间
+            now: 当前时间
+        
+        返回:
+            float: 时间戳
+        """
+        if self.cron is not None:
+            return self.cron.next_after(max(prev_base, now))
+        return max(prev_base + self.interval, now)
+    
+    def jittered(self, base):
+        """在计划时间上加入随机抖动"""
+        return base + random.uniform(0, self.jitter) if self.jitter else base
+    
+    def describe(self):
+        if self.cron is not None:
+            text = f"cron {self.cron.expr}"
+        elif self.interval % 60:
+            text = f"每 {self.interval:g} 秒"
+        else:
+            text = f"每 {self.interval / 60:g} 分钟"
+        if self.jitter:
+            text += f"，随机推迟至多 {self.jitter:g} 秒"
+        return text
+
+
 def parse_exclude_extensions(extensions_str):
     """
     解析排除的文件后缀
@@ -331,28 +1220,416 @@ def parse_exclude_extensions(extensions_str):
     return extensions
 
 
-def should_exclude_file(filename, exclude_extensions):
+# type: 规则可用的文件类型（按后缀判断）
+FILE_TYPE_EXTENSIONS = {
+    'video': ('mkv', 'mp4', 'avi', 'mov', 'wmv', 'flv', 'ts', 'm2ts', 'rmvb', 'webm', 'iso', 'm4v', 'mpg', 'mpeg', 'vob'),
+    'audio': ('mp3', 'flac', 'ape', 'wav', 'aac', 'm4a', 'ogg', 'dts', 'dsf'),
+    'image': ('jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'heic'),
+    'subtitle': ('srt', 'ass', 'ssa', 'sub', 'idx', 'sup', 'vtt'),
+    'archive': ('zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'xz'),
+    'document': ('txt', 'pdf', 'doc', 'docx', 'nfo', 'epub', 'md'),
+}
+
+
+def isolate_regex_groups(pattern, prefix):
     """
-    判断文件是否应该被排除
+    给正则中的捕获组加上前缀命名，反向引用随之改写
+    
+    多条正则并入一个组合正则后，组号会按整体重新编号，\\1 等反向引用会指向
+    其他子句的组。改写为带前缀的命名组后，每个子句只引用自己的组。
     
     参数:
-        filename: 文件名
-        exclude_extensions: 排除的后缀集合
+        pattern: 正则表达式
+        prefix: 组名前缀（如 "r2_"），需为合法标识符开头
     
     返回:
-        bool: True表示应该排除，False表示不排除
+        str: 改写后的正则
     """
-    if not exclude_extensions:
-        return False
-    
-    # 获取文件后缀（小写）
-    file_ext = os.path.splitext(filename)[1].lower()
-    
-    return file_ext in exclude_extensions
+    names = {}  # 组号或原组名 -> 新组名
+    count = 0
+    parts = []
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            backref = None if in_class else re.match(r'\\([1-9][0-9]?)', pattern[i:])
+            if backref and not re.match(r'\\[0-7]{3}', pattern[i:]):
+                # 三位八进制数是字符转义，不是反向引用
+                parts.append(f"(?P={names.get(backref.group(1), prefix + backref.group(1))})")
+                i += backref.end()
+            else:
+                parts.append(pattern[i:i + 2])
+                i += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+            parts.append(char)
+            i += 1
+            continue
+        if char == '[':
+            # 紧跟在 [ 或 [^ 之后的 ] 是普通字符
+            start = i + 1 + (pattern[i + 1:i + 2] == '^')
+            start += pattern[start:start + 1] == ']'
+            parts.append(pattern[i:start])
+            in_class = True
+            i = start
+            continue
+        if char == '(':
+            named = re.match(r'\(\?P<(\w+)>', pattern[i:])
+            ref = re.match(r'\(\?P=(\w+)\)', pattern[i:])
+            cond = re.match(r'\(\?\((\w+)\)', pattern[i:])
+            if named or not pattern.startswith('(?', i):
+                count += 1
+                new_name = prefix + (named.group(1) if named else str(count))
+                names[str(count)] = new_name
+                if named:
+                    # 命名组同时占用一个组号，可按名称或组号引用
+                    names[named.group(1)] = new_name
+                parts.append(f"(?P<{new_name}>")
+                i += named.end() if named else 1
+                continue
+            if ref or cond:
+                match = ref or cond
+                target = names.get(match.group(1), prefix + match.group(1))
+                parts.append(f"(?P={target})" if ref else f"(?({target})")
+                i += match.end()
+                continue
+            if pattern.startswith('(?#', i):
+                end = pattern.find(')', i)
+                end = len(pattern) if end < 0 else end + 1
+                parts.append(pattern[i:end])
+                i = end
+                continue
+        parts.append(char)
+        i += 1
+    return ''.join(parts)
 
 
-def format_file_size(size):
-    """格式化文件大小显示"""
+def glob_to_regex(pattern):
+    """
+    把通配符转换为正则（* 和 ? 不跨越目录，** 可跨越目录，不区分大小写）
+    
+    不含 / 的通配符匹配文件名，含 / 的匹配源目录下的完整相对路径
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    body = ''.join(parts)
+    if '/' in pattern:
+        return f"(?i:{body.lstrip('/')})$"
+    return f"(?i:(?:.*/)?{body})$"
+
+
+def parse_range(value, parse_value):
+    """
+    解析 ">=下限"、"<=上限" 或 "下限-上限" 形式的范围
+    
+    返回:
+        tuple: (下限, 上限)，缺省的一端为 None
+    
+    异常:
+        ValueError: 格式无效
+    """
+    value = value.strip()
+    if value.startswith('>='):
+        low, high = value[2:], None
+    elif value.startswith('<='):
+        low, high = None, value[2:]
+    elif '-' in value:
+        low, high = value.split('-', 1)
+    else:
+        raise ValueError(f"范围格式无效: {value}（应为 >=值、<=值 或 下限-上限）")
+    result = []
+    for part in (low, high):
+        if part is None:
+            result.append(None)
+            continue
+        parsed = parse_value(part.strip())
+        if parsed is None:
+            raise ValueError(f"数值无效: {part}")
+        result.append(parsed)
+    return tuple(result)
+
+
+class FileFilter:
+    """
+    编译后的文件过滤规则
+    
+    规则由 ";" 或换行分隔的子句组成，每个子句为 "类型:值"，前面加 "!" 表示排除:
+        - glob:*.mkv          通配符（不含 / 时匹配文件名，含 / 时匹配相对路径）
+        - regex:表达式        正则，在源目录下的相对路径中搜索
+        - type:video,subtitle 文件类型（见 FILE_TYPE_EXTENSIONS）
+        - ext:.mkv,.mp4       文件后缀
+        - path:电影/2024      源目录下的路径前缀
+        - size:>=1GB          文件大小范围（>=值、<=值 或 下限-上限）
+        - age:>=10m           距修改时间的时长范围（不带单位为秒）
+    
+    任一排除子句命中即排除；同类包含子句满足其一即可，不同类之间需同时满足。
+    所有名称和路径条件编译为一个正则（排除条件为否定前瞻，每类包含条件为一个前瞻），
+    大小和时长只做两次数值比较。
+    """
+    
+    def __init__(self, rules='', exclude_extensions=(), name='default'):
+        """
+        参数:
+            rules: 规则字符串
+            exclude_extensions: 额外排除的后缀集合（EXCLUDE_EXTENSIONS），作为 !ext 子句加在规则前
+            name: 规则名称，用于日志输出
+        
+        异常:
+            ValueError: 规则无效
+        """
+        self.name = name
+        self.clauses = []
+        includes = {}
+        excludes = []
+        size_low, size_high = 0, float('inf')
+        age_low, age_high = None, None
+        
+        if exclude_extensions:
+            rules = f"!ext:{','.join(sorted(exclude_extensions))};{rules or ''}"
+        
+        for clause in re.split(r'[;\n]', rules or ''):
+            clause = clause.strip()
+            if not clause:
+                continue
+            negate = clause.startswith('!')
+            kind, sep, value = clause.lstrip('!').partition(':')
+            kind = kind.strip().lower()
+            value = value.strip()
+            if not sep or not value:
+                raise ValueError(f"子句格式错误（应为 类型:值）: {clause}")
+            
+            if kind == 'size':
+                if negate:
+                    raise ValueError(f"size 不支持排除: {clause}")
+                low, high = parse_range(value, parse_file_size)
+                size_low = max(size_low, low if low is not None else 0)
+                size_high = min(size_high, high if high is not None else float('inf'))
+            elif kind == 'age':
+                if negate:
+                    raise ValueError(f"age 不支持排除: {clause}")
+                low, high = parse_range(value, parse_duration)
+                if low is not None:
+                    age_low = max(age_low or 0, low)
+                if high is not None:
+                    age_high = min(age_high, high) if age_high is not None else high
+            else:
+                if kind == 'glob':
+                    pattern = glob_to_regex(value)
+                elif kind == 'regex':
+                    # 开头的全局标志（如 (?i)）改写为局部标志，才能并入组合正则
+                    flags = re.match(r'^\(\?([aiLmsux]+)\)', value)
+                    body = isolate_regex_groups(value[flags.end():] if flags else value, f"r{len(self.clauses)}_")
+                    body = f"(?{flags.group(1)}:{body})" if flags else f"(?:{body})"
+                    try:
+                        re.compile(body)
+                    except re.error as e:
+                        raise ValueError(f"正则无效: {value} ({e})")
+                    pattern = f".*?{body}"
+                elif kind == 'type':
+                    exts = []
+                    for file_type in value.lower().split(','):
+                        file_type = file_type.strip()
+                        if file_type not in FILE_TYPE_EXTENSIONS:
+                            raise ValueError(f"未知文件类型: {file_type}（可用: {', '.join(FILE_TYPE_EXTENSIONS)}）")
+                        exts.extend(FILE_TYPE_EXTENSIONS[file_type])
+                    pattern = f"(?i:.*\\.(?:{'|'.join(exts)}))$"
+                elif kind == 'ext':
+                    exts = '|'.join(re.escape(ext.strip().lstrip('.')) for ext in value.split(',') if ext.strip())
+                    pattern = f"(?i:.*\\.(?:{exts}))$"
+                elif kind == 'path':
+                    pattern = re.escape(value.strip('/')) + '/'
+                else:
+                    raise ValueError(f"未知子句类型: {kind}")
+                if negate:
+                    excludes.append(pattern)
+                else:
+                    includes.setdefault(kind, []).append(pattern)
+            self.clauses.append(clause)
+        
+        if size_low > size_high or (age_low is not None and age_high is not None and age_low > age_high):
+            raise ValueError("size 或 age 范围为空")
+        
+        regex = ''
+        if excludes:
+            regex += f"(?!{'|'.join(f'(?:{p})' for p in excludes)})"
+        for patterns in includes.values():
+            regex += f"(?={'|'.join(f'(?:{p})' for p in patterns)})"
+        self.regex = re.compile(regex) if regex else None
+        self.size_range = (size_low, size_high)
+        self.age_range = (age_low, age_high)
+    
+    def matches(self, path, size, mtime, now=None):
+        """
+        判断文件是否通过过滤
+        
+        参数:
+            path: 源目录下的相对路径
+            size: 文件大小（字节）
+            mtime: 修改时间戳
+            now: 当前时间戳，None 表示取当前时间
+        
+        返回:
+            bool: True 表示通过（可以移动）
+        """
+        if not self.size_range[0] <= size <= self.size_range[1]:
+            return False
+        age_low, age_high = self.age_range
+        if age_low is not None or age_high is not None:
+            age = (now if now is not None else time.time()) - (mtime or 0)
+            if (age_low is not None and age < age_low) or (age_high is not None and age > age_high):
+                return False
+        return self.regex is None or self.regex.match(path) is not None
+    
+    def describe(self):
+        """返回规则说明"""
+        return '; '.join(self.clauses) if self.clauses else '无'
+
+
+def load_filter_rules(exclude_extensions):
+    """
+    读取并编译过滤规则
+    
+    - FILTER_RULES: 默认规则，用于未指定 rules 选项的映射
+    - FILTER_RULES_<名称>: 命名规则，映射选项 rules=<名称> 时使用（名称不区分大小写）
+    
+    EXCLUDE_EXTENSIONS 会并入每一组规则
+    
+    参数:
+        exclude_extensions: 排除的后缀集合
+    
+    返回:
+        dict: {规则名称: FileFilter}，默认规则的名称为 'default'；规则无效时返回 None
+    """
+    sources = {'default': os.environ.get('FILTER_RULES', '')}
+    for key, value in os.environ.items():
+        if key.startswith('FILTER_RULES_') and key != 'FILTER_RULES_':
+            sources[key[len('FILTER_RULES_'):].lower()] = value
+    
+    filters = {}
+    for name, rules in sources.items():
+        try:
+            filters[name] = FileFilter(rules, exclude_extensions, name)
+        except ValueError as e:
+            logger.error(f"❌ 错误: 过滤规则 {name} 无效: {e}")
+            return None
+        if rules.strip():
+            logger.info(f"🧮 过滤规则 [{name}]: {filters[name].describe()}")
+    return filters
+
+
+def load_route_tables(file_filters):
+    """
+    读取分流规则 ROUTES_<名称>（名称不区分大小写）
+    
+    每条规则为 "规则=>目标路径"，用 ";" 或换行分隔，按顺序匹配，第一个命中的规则决定目标目录。
+    规则可以是命名过滤规则（FILTER_RULES_<名称>）的名称、单个过滤子句（如 type:video）或 *（匹配所有文件）。
+    没有命中任何规则的文件移动到映射自身的目标目录。
+    
+    参数:
+        file_filters: 过滤规则 {规则名称: FileFilter}
+    
+    返回:
+        dict: {分流规则名称: [{'rule', 'filter', 'target_path'}, ...]}，规则无效时返回 None
+    """
+    tables = {}
+    for key, value in os.environ.items():
+        if not key.startswith('ROUTES_') or key == 'ROUTES_':
+            continue
+        name = key[len('ROUTES_'):].lower()
+        routes = []
+        for entry in re.split(r'[;\n]', value):
+            entry = entry.strip()
+            if not entry:
+                continue
+            rule, sep, target = entry.partition('=>')
+            rule, target = rule.strip(), target.strip()
+            if not sep or not rule or not target:
+                logger.error(f"❌ 错误: 分流规则 {name} 格式错误（应为 规则=>目标路径）: {entry}")
+                return None
+            if not target.startswith('/'):
+                target = '/' + target
+            if rule == '*':
+                route_filter = None
+            elif ':' in rule:
+                try:
+                    route_filter = FileFilter(rule, name=rule)
+                except ValueError as e:
+                    logger.error(f"❌ 错误: 分流规则 {name} 中的过滤子句无效: {e}")
+                    return None
+            elif rule.lower() in file_filters:
+                route_filter = file_filters[rule.lower()]
+            else:
+                logger.error(f"❌ 错误: 分流规则 {name} 引用的过滤规则 {rule} 未定义"
+                             f"（需设置环境变量 FILTER_RULES_{rule.upper()}）")
+                return None
+            routes.append({'rule': rule, 'filter': route_filter, 'target_path': target})
+        tables[name] = routes
+        routes_desc = '; '.join(f"{route['rule']} ➜ {route['target_path']}" for route in routes)
+        logger.info(f"🔀 分流规则 [{name}]: {routes_desc}")
+    return tables
+
+
+def build_mapping_routes(options, route_tables, resolved, idx):
+    """
+    解析映射使用的分流规则的目标目录ID
+    
+    参数:
+        options: 映射选项字典
+        route_tables: 分流规则，见 load_route_tables
+        resolved: 已解析的 {路径: 目录ID}
+        idx: 映射序号，用于日志输出
+    
+    返回:
+        list: [{'rule', 'filter', 'target_path', 'target_cid'}, ...]，有目标目录无法解析时返回 None
+    """
+    routes = []
+    for route in route_tables.get(options.get('routes'), []):
+        target_cid = resolved.get(route['target_path'])
+        if target_cid is None:
+            logger.error(f"❌ 映射 {idx}: 无法找到分流目标目录 {route['target_path']}")
+            return None
+        routes.append(dict(route, target_cid=target_cid))
+    return routes
+
+
+def select_route(mapping, file_info, now=None):
+    """
+    按映射的分流规则为文件选择目标目录
+    
+    返回:
+        dict: 命中的分流规则（含 'target_path'、'target_cid'），没有命中时返回映射本身
+    """
+    for route in mapping.get('routes') or ():
+        if route['filter'] is None or route['filter'].matches(
+                file_info['path'], file_info['size'], file_info.get('mtime'), now):
+            return route
+    return mapping
+
+
+def format_file_size(size):
+    """格式化文件大小显示"""
     if size < 1024:
         return f"{size} B"
     elif size < 1024 ** 2:
@@ -401,132 +1678,2679 @@ def parse_file_size(size_str):
     if unit not in units:
         return None
     
-    return int(value * units[unit])
+    return int(value * units[unit])
+
+
+class StateStore:
+    """
+    持久化状态存储（SQLite，位于数据目录，线程安全）
+    
+    保存源目录扫描快照（每个目录的签名、子目录列表及直属文件）、扫描断点和路径缓存
+    """
+    
+    def __init__(self, db_file):
+        """
+        参数:
+            db_file: 数据库文件路径
+        """
+        os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS scan_dirs (
+                    cid INTEGER PRIMARY KEY,
+                    signature TEXT NOT NULL,
+                    subdirs TEXT NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS scan_files (
+                    id INTEGER PRIMARY KEY,
+                    parent_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime INTEGER NOT NULL,
+                    sha1 TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_scan_files_parent ON scan_files (parent_id);
+                CREATE TABLE IF NOT EXISTS scan_cursors (
+                    root_cid INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS path_cache (
+                    path TEXT PRIMARY KEY,
+                    cid INTEGER NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_path_cache_cid ON path_cache (cid);
+                CREATE TABLE IF NOT EXISTS file_stability (
+                    id INTEGER PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime INTEGER NOT NULL,
+                    since REAL NOT NULL,
+                    seen INTEGER NOT NULL,
+                    last_seen REAL NOT NULL
+                );
+            """)
+            self.conn.commit()
+    
+    def has_dir(self, cid):
+        """判断目录是否已有快照"""
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM scan_dirs WHERE cid = ?", (cid,)).fetchone()
+        return row is not None
+    
+    def load_dir(self, cid, max_age=None):
+        """
+        读取目录快照
+        
+        参数:
+            cid: 目录ID
+            max_age: 最长有效时间（秒），超过则视为没有快照
+        
+        返回:
+            tuple: (签名, 子目录列表 [(id, 名称, 修改时间), ...], 文件列表 [dict, ...])，不存在时返回 None
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT signature, subdirs, updated FROM scan_dirs WHERE cid = ?", (cid,)
+            ).fetchone()
+            if row is None or (max_age is not None and time.time() - row[2] > max_age):
+                return None
+            files = self.conn.execute(
+                "SELECT id, name, size, mtime, sha1 FROM scan_files WHERE parent_id = ?", (cid,)
+            ).fetchall()
+        subdirs = [tuple(item) for item in json.loads(row[1])]
+        files = [
+            {'id': fid, 'parent_id': cid, 'name': name, 'size': size, 'mtime': mtime, 'sha1': sha1}
+            for fid, name, size, mtime, sha1 in files
+        ]
+        return row[0], subdirs, files
+    
+    def save_dir(self, cid, signature, subdirs, files):
+        """
+        保存目录快照（覆盖该目录原有的文件记录）
+        
+        参数:
+            cid: 目录ID
+            signature: 目录签名
+            subdirs: 子目录列表 [(id, 名称, 修改时间), ...]
+            files: 直属文件列表 [dict, ...]
+        """
+        with self.lock:
+            self.conn.execute("DELETE FROM scan_files WHERE parent_id = ?", (cid,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scan_files (id, parent_id, name, size, mtime, sha1) VALUES (?, ?, ?, ?, ?, ?)",
+                [(f['id'], cid, f['name'], f['size'], f['mtime'], f.get('sha1')) for f in files]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO scan_dirs (cid, signature, subdirs, updated) VALUES (?, ?, ?, ?)",
+                (cid, signature, json.dumps(subdirs, ensure_ascii=False), time.time())
+            )
+            self.conn.commit()
+    
+    def invalidate_dir(self, cid):
+        """删除目录快照，下一轮重新列举该目录"""
+        with self.lock:
+            self.conn.execute("DELETE FROM scan_files WHERE parent_id = ?", (cid,))
+            self.conn.execute("DELETE FROM scan_dirs WHERE cid = ?", (cid,))
+            self.conn.commit()
+    
+    def load_cursor(self, root_cid, max_age=None):
+        """
+        读取扫描断点
+        
+        参数:
+            root_cid: 源目录ID
+            max_age: 最长有效时间（秒），超过则视为无断点
+        
+        返回:
+            list: 未完成的目录任务列表，不存在时返回 None
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT state, updated FROM scan_cursors WHERE root_cid = ?", (root_cid,)
+            ).fetchone()
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row[1] > max_age:
+            return None
+        return json.loads(row[0])
+    
+    def save_cursor(self, root_cid, tasks):
+        """保存扫描断点"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO scan_cursors (root_cid, state, updated) VALUES (?, ?, ?)",
+                (root_cid, json.dumps(tasks, ensure_ascii=False), time.time())
+            )
+            self.conn.commit()
+    
+    def clear_cursor(self, root_cid):
+        """清除扫描断点"""
+        with self.lock:
+            self.conn.execute("DELETE FROM scan_cursors WHERE root_cid = ?", (root_cid,))
+            self.conn.commit()
+    
+    def get_path_cid(self, path):
+        """
+        读取路径缓存
+        
+        返回:
+            int: 目录ID，未缓存时返回 None
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT cid FROM path_cache WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+    
+    def save_path_cid(self, path, cid):
+        """保存路径缓存"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO path_cache (path, cid, updated) VALUES (?, ?, ?)",
+                (path, cid, time.time())
+            )
+            self.conn.commit()
+    
+    def invalidate_path(self, path):
+        """删除路径及其所有子路径的缓存"""
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM path_cache WHERE path = ? OR substr(path, 1, ?) = ?",
+                (path, len(path) + 1, path + '/')
+            )
+            self.conn.commit()
+    
+    def invalidate_cid(self, cid):
+        """
+        删除指向某个目录ID的路径缓存（连同其子路径）
+        
+        返回:
+            list: 被删除的路径列表
+        """
+        with self.lock:
+            paths = [row[0] for row in self.conn.execute("SELECT path FROM path_cache WHERE cid = ?", (cid,))]
+        for path in paths:
+            self.invalidate_path(path)
+        return paths
+    
+    def load_stability(self):
+        """
+        读取全部文件稳定性记录
+        
+        返回:
+            dict: {文件ID: (大小, 修改时间, 开始不变的时间, 连续不变的扫描次数, 最近扫描到的时间)}
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, size, mtime, since, seen, last_seen FROM file_stability"
+            ).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+    
+    def save_stability(self, entries, removed=()):
+        """
+        保存文件稳定性记录
+        
+        参数:
+            entries: {文件ID: (大小, 修改时间, 开始不变的时间, 连续不变的扫描次数, 最近扫描到的时间)}
+            removed: 需要删除记录的文件ID
+        """
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_stability (id, size, mtime, since, seen, last_seen) VALUES (?, ?, ?, ?, ?, ?)",
+                [(file_id,) + entry for file_id, entry in entries.items()]
+            )
+            self.conn.executemany("DELETE FROM file_stability WHERE id = ?", [(file_id,) for file_id in removed])
+            self.conn.commit()
+
+
+state_store = None
+
+
+class FileStabilityTracker:
+    """
+    文件稳定性判断（线程安全），避免移动仍在写入的文件（如离线下载中的文件）
+    
+    每个文件ID对应一条 (大小, 修改时间, 开始不变的时间, 连续不变的扫描次数, 最近扫描到的时间) 记录，
+    大小或修改时间变化时重新计数。满足以下任一条件即视为稳定:
+        - 连续 scans 次扫描大小和修改时间均未变化
+        - 自首次观察到当前的大小和修改时间起已过去 quiet_seconds 秒
+    
+    扫描次数达到 scans 后不再累加；最近扫描到的时间只在内存中更新，
+    距上次写入超过 STABILITY_MAX_AGE 的一半时才随记录写入状态库。
+    因此只有新增或变化的记录会在 flush 时写入，未变化的文件不产生写入。
+    """
+    
+    def __init__(self, scans, quiet_seconds, store=None):
+        """
+        参数:
+            scans: 连续不变的扫描次数，0 表示不按次数判断
+            quiet_seconds: 保持不变的秒数，0 表示不按时间判断
+            store: StateStore 实例，None 表示只保存在内存中
+        """
+        self.scans = scans
+        self.quiet_seconds = quiet_seconds
+        self.store = store
+        self.lock = threading.Lock()
+        self.entries = store.load_stability() if store is not None else {}
+        self.saved_seen = {file_id: entry[4] for file_id, entry in self.entries.items()}
+        self.dirty = set()
+        self.removed = set()
+        self.round_started = 0.0
+    
+    def begin_round(self):
+        """开始新一轮扫描，同一轮内重复扫描到的文件只计一次"""
+        self.round_started = time.time()
+    
+    def is_stable(self, file_info):
+        """
+        记录本次扫描结果，并判断文件是否已稳定
+        
+        参数:
+            file_info: 文件信息字典（需包含 'id'、'size'、'mtime'）
+        
+        返回:
+            bool: True 表示可以移动
+        """
+        now = time.time()
+        file_id = file_info['id']
+        size, mtime = file_info['size'], int(file_info.get('mtime') or 0)
+        with self.lock:
+            old = self.entries.get(file_id)
+            if old is None or old[0] != size or old[1] != mtime:
+                entry = (size, mtime, now, 1, now)
+            elif old[4] < self.round_started and old[3] < self.scans:
+                entry = (size, mtime, old[2], old[3] + 1, now)
+            else:
+                entry = old[:4] + (now,)
+            self.entries[file_id] = entry
+            if old is None or old[:4] != entry[:4] or now - self.saved_seen.get(file_id, 0) > STABILITY_MAX_AGE / 2:
+                self.dirty.add(file_id)
+                self.removed.discard(file_id)
+        
+        if self.scans and entry[3] >= self.scans:
+            return True
+        return bool(self.quiet_seconds) and now - entry[2] >= self.quiet_seconds
+    
+    def forget(self, file_id):
+        """文件已移出源目录，删除其记录"""
+        with self.lock:
+            if self.entries.pop(file_id, None) is not None:
+                self.saved_seen.pop(file_id, None)
+                self.dirty.discard(file_id)
+                self.removed.add(file_id)
+    
+    def flush(self):
+        """删除长期未扫描到的记录，并把变化写入状态库"""
+        cutoff = time.time() - STABILITY_MAX_AGE
+        with self.lock:
+            for file_id in [file_id for file_id, entry in self.entries.items() if entry[4] < cutoff]:
+                del self.entries[file_id]
+                self.saved_seen.pop(file_id, None)
+                self.dirty.discard(file_id)
+                self.removed.add(file_id)
+            dirty = {file_id: self.entries[file_id] for file_id in self.dirty}
+            for file_id, entry in dirty.items():
+                self.saved_seen[file_id] = entry[4]
+            removed = list(self.removed)
+            self.dirty.clear()
+            self.removed.clear()
+        if self.store is not None and (dirty or removed):
+            self.store.save_stability(dirty, removed)
+
+
+stability_tracker = None
+
+
+class MoveJournal:
+    """
+    移动预写日志（追加写入的 JSON Lines 文件，位于数据目录，线程安全）
+    
+    每批移动依次写入三条记录，每条写入后立即落盘:
+        - plan: 批次已生成（批次ID、目标目录ID、文件ID列表）
+        - dispatch: fs_move 请求即将发出
+        - result: 请求已完成（成功和失败的文件ID）
+    
+    程序重启后回放日志: 只有 plan 的批次从未发出，直接丢弃；
+    有 dispatch 而没有 result 的批次可能已在服务器上生效，通过列举一次目标目录确认。
+    """
+    
+    def __init__(self, path):
+        """
+        参数:
+            path: 日志文件路径
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.open_batches = {}  # 批次ID -> 未写入 result 的记录列表
+        self.settled_ids = set()  # 回放确认已在目标目录的文件ID，扫描时跳过
+        self.prefix = f"{int(time.time() * 1000):x}"
+        self.counter = 0
+        self.file = open(path, 'a', encoding='utf-8')
+    
+    def _append(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+    
+    def plan(self, target_cid, file_ids):
+        """
+        记录一个待发出的批次
+        
+        返回:
+            str: 批次ID
+        """
+        with self.lock:
+            self.counter += 1
+            batch_id = f"{self.prefix}-{self.counter}"
+            record = {'op': 'plan', 'batch': batch_id, 'target': target_cid,
+                      'ids': list(file_ids), 'ts': time.time()}
+            self._append(record)
+            self.open_batches[batch_id] = [record]
+        return batch_id
+    
+    def dispatch(self, batch_id):
+        """记录批次的 fs_move 请求即将发出"""
+        with self.lock:
+            record = {'op': 'dispatch', 'batch': batch_id, 'ts': time.time()}
+            self._append(record)
+            self.open_batches.setdefault(batch_id, []).append(record)
+    
+    def result(self, batch_id, moved, failed):
+        """
+        记录批次结果
+        
+        参数:
+            batch_id: 批次ID
+            moved: 已移动的文件ID列表
+            failed: 移动失败的文件ID列表
+        """
+        with self.lock:
+            self._append({'op': 'result', 'batch': batch_id, 'moved': list(moved),
+                          'failed': list(failed), 'ts': time.time()})
+            self.open_batches.pop(batch_id, None)
+    
+    def load(self):
+        """
+        读取日志中尚未完成的批次（忽略写了一半的末行）
+        
+        返回:
+            tuple: (未发出的批次列表, 已发出但没有结果的批次列表)，批次为 plan 记录
+        """
+        batches = {}
+        with self.lock:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get('op') == 'plan':
+                        batches[record['batch']] = dict(record, dispatched=False)
+                    elif record.get('op') == 'dispatch' and record.get('batch') in batches:
+                        batches[record['batch']]['dispatched'] = True
+                    elif record.get('op') == 'result':
+                        batches.pop(record.get('batch'), None)
+        planned = [batch for batch in batches.values() if not batch['dispatched']]
+        in_flight = [batch for batch in batches.values() if batch['dispatched']]
+        return planned, in_flight
+    
+    def compact(self):
+        """重写日志，只保留仍未完成的批次记录"""
+        with self.lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for records in self.open_batches.values():
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.file.close()
+            os.replace(tmp_path, self.path)
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+
+move_journal = None
+
+
+def path_item_cid(item):
+    """读取列表接口返回的祖先路径 path 中一项的目录ID（不同接口分别使用 cid 或 file_id）"""
+    return str(item.get('cid', item.get('file_id', '')))
+
+
+def path_item_name(item):
+    """读取列表接口返回的祖先路径 path 中一项的名称（不同接口分别使用 name 或 file_name）"""
+    return str(item.get('name', item.get('file_name', '')))
+
+
+def dir_signature(dir_mtime, count, max_child_mtime):
+    """
+    计算目录签名（目录修改时间 + 子项数量 + 子项最新修改时间）
+    
+    返回:
+        str: 签名字符串
+    """
+    return f"{dir_mtime or 0}:{count}:{max_child_mtime or 0}"
+
+
+def response_dir_mtime(response, cid):
+    """
+    从列表接口返回的 path 末项读取当前目录自身的修改时间
+    
+    参数:
+        response: 接口返回的结果
+        cid: 当前目录ID
+    
+    返回:
+        int: 修改时间戳，接口未提供时返回 None
+    """
+    path = response.get('path') or []
+    if not path:
+        return None
+    tail = path[-1]
+    if path_item_cid(tail) != str(cid):
+        return None
+    for key in ('mtime', 'utime', 'user_utime', 'te', 't'):
+        value = tail.get(key)
+        if value not in (None, ''):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+class SourceWalker:
+    """
+    源目录遍历器
+    
+    遍历器本身不发送请求：由 next_request() 给出下一次要请求的目录和参数，
+    调用方请求接口后通过 feed() 交回结果。每个目录列举完成时才一次产出其中的文件：
+    列表按偏移分页，若在翻页期间移走该目录的文件，后面的文件会前移到已读过的页中而被漏掉。
+    启用快照时，签名未变化的目录直接使用快照内容，不再分页列举。
+    设置断点存储时，每隔 SCAN_CHECKPOINT_INTERVAL 秒记录剩余任务和页偏移，中断后可从断点继续。
+    设置最小文件大小时，每个目录先列举子目录，再按文件大小降序列举文件，
+    遇到小于阈值的文件即停止翻页。
+    skip_cids 中的子目录（由其他扫描负责的子树）不进入遍历。
+    """
+    
+    def __init__(self, root_cid, page_size=None, snapshot=None, cursor_store=None,
+                 min_size=None, file_type=None, skip_cids=None):
+        """
+        参数:
+            root_cid: 源目录ID
+            page_size: 每页数量，None表示使用全局配置 SCAN_PAGE_SIZE
+            snapshot: StateStore 对象，None 表示不使用快照
+            cursor_store: StateStore 对象，None 表示不记录断点
+            min_size: 按大小降序列举时的最小文件大小（字节），None 表示列举全部文件
+            file_type: 交给接口过滤的文件类型（1-7），None 表示不过滤
+            skip_cids: 不遍历的子目录ID集合
+        """
+        self.root_cid = root_cid
+        self.page_size = page_size or SCAN_PAGE_SIZE
+        self.snapshot = snapshot
+        self.cursor_store = cursor_store
+        self.min_size = min_size
+        self.file_type = file_type
+        self.split_listing = min_size is not None or file_type is not None
+        self.skip_cids = set(skip_cids or ())
+        self.in_flight = {}
+        self.resumed = False
+        self.stats = {'dirs': 0, 'skipped_dirs': 0, 'requests': 0}
+        self.checkpointed_at = time.monotonic()
+        
+        saved_tasks = None
+        if cursor_store is not None:
+            saved_tasks = cursor_store.load_cursor(root_cid, SCAN_CURSOR_MAX_AGE)
+        if saved_tasks:
+            self.pending = deque(self._restore_task(task) for task in saved_tasks)
+            self.resumed = True
+        else:
+            self.pending = deque([self._new_task(root_cid, '', None)])
+    
+    def _new_task(self, cid, path, mtime):
+        if self.snapshot is not None and (self.split_listing or self.snapshot.has_dir(cid)):
+            # 分开列举时只能看到部分文件，目录签名一律通过探测请求获得
+            phase = 'probe'
+        else:
+            phase = 'dirs' if self.split_listing else 'list'
+        return {
+            'cid': cid,
+            'path': path,
+            'mtime': mtime,
+            'dir_mtime': None,
+            'phase': phase,
+            'offset': 0,
+            'max_mtime': 0,
+            'signature': None,
+            'subdirs': [],
+            'files': [],
+            'partial': False,
+        }
+    
+    def _restore_task(self, saved):
+        task = self._new_task(saved['cid'], saved['path'], saved['mtime'])
+        task['phase'] = saved['phase']
+        task['offset'] = saved['offset']
+        task['max_mtime'] = saved['max_mtime']
+        task['signature'] = saved.get('signature')
+        # 从中途恢复的目录缺少前几页的内容，列举完成后不写入快照
+        task['partial'] = saved['offset'] > 0 or saved['phase'] == 'files'
+        return task
+    
+    @staticmethod
+    def _dump_task(task):
+        return {
+            'cid': task['cid'],
+            'path': task['path'],
+            'mtime': task['mtime'],
+            'phase': task['phase'],
+            'offset': task['offset'],
+            'max_mtime': task['max_mtime'],
+            'signature': task['signature'],
+        }
+    
+    def checkpoint(self, force=False):
+        """
+        记录断点（进行中的任务排在最前）；遍历完成时清除断点
+        
+        参数:
+            force: 是否忽略记录间隔立即记录（遍历中止时使用）
+        """
+        if self.cursor_store is None:
+            return
+        if self.done():
+            self.cursor_store.clear_cursor(self.root_cid)
+            return
+        now = time.monotonic()
+        if not force and now - self.checkpointed_at < SCAN_CHECKPOINT_INTERVAL:
+            return
+        self.checkpointed_at = now
+        tasks = [self._dump_task(task) for task in self.in_flight.values()]
+        tasks.extend(self._dump_task(task) for task in self.pending)
+        self.cursor_store.save_cursor(self.root_cid, tasks)
+    
+    def done(self):
+        """是否已遍历完成"""
+        return not self.pending and not self.in_flight
+    
+    def has_request(self):
+        """是否有可以立即发出的请求"""
+        return bool(self.pending)
+    
+    def next_request(self):
+        """
+        获取下一次请求
+        
+        返回:
+            tuple: (任务, 请求参数)
+        """
+        task = self.pending.popleft()
+        self.in_flight[id(task)] = task
+        payload = {'cid': task['cid'], 'show_dir': 1, 'offset': task['offset'], 'limit': self.page_size}
+        if task['phase'] == 'probe':
+            # 只取修改时间最新的一项，配合总数判断目录是否变化
+            payload.update({'offset': 0, 'limit': 1, 'o': 'user_utime', 'asc': 0, 'fc_mix': 1})
+        elif task['phase'] == 'dirs':
+            payload['nf'] = 1
+        elif task['phase'] == 'files':
+            payload.update({'show_dir': 0, 'o': 'file_size', 'asc': 0})
+            if self.file_type is not None:
+                payload['type'] = self.file_type
+        return task, payload
+    
+    def _make_file(self, task, info):
+        name = info.get('name', '')
+        rel_path = f"{task['path']}/{name}" if task['path'] else name
+        return {
+            'id': info['id'],
+            'parent_id': task['cid'],
+            'name': name,
+            'size': info.get('size', 0),
+            'mtime': info.get('mtime', 0),
+            'sha1': info.get('sha1'),
+            'path': rel_path,
+            'display_path': rel_path,
+        }
+    
+    def _enqueue_subdir(self, task, subdir_id, name, mtime):
+        if subdir_id in self.skip_cids:
+            return
+        sub_path = f"{task['path']}/{name}" if task['path'] else name
+        self.pending.append(self._new_task(subdir_id, sub_path, mtime))
+    
+    def _add_subdir(self, task, info):
+        subdir = (info['id'], info.get('name', ''), info.get('mtime', 0))
+        task['subdirs'].append(subdir)
+        self._enqueue_subdir(task, *subdir)
+    
+    def _add_file(self, task, info):
+        task['files'].append(self._make_file(task, info))
+    
+    def _finish(self, task, count):
+        self.stats['dirs'] += 1
+        if self.snapshot is not None and not task['partial']:
+            signature = task['signature'] or dir_signature(task['dir_mtime'], count, task['max_mtime'])
+            self.snapshot.save_dir(task['cid'], signature, task['subdirs'], task['files'])
+    
+    def retry(self, task):
+        """请求失败时归还任务，下次从同一页重新请求"""
+        self.in_flight.pop(id(task), None)
+        self.pending.appendleft(task)
+    
+    def feed(self, task, response):
+        """
+        处理一次请求的返回结果
+        
+        参数:
+            task: next_request() 返回的任务
+            response: 接口返回的结果
+        
+        返回:
+            list: 本次产出的文件列表（目录列举完成时为该目录的全部文件，否则为空）
+        """
+        self.in_flight.pop(id(task), None)
+        self.stats['requests'] += 1
+        count = int(response.get('count') or 0)
+        items = [normalize_attr(item) for item in response.get('data') or []]
+        result = []
+        
+        if task['dir_mtime'] is None:
+            # 目录自身的修改时间取自本次返回的 path，而不是父目录（可能来自快照）中记录的旧值
+            # 接口未提供时使用本轮刚列举过的父目录中的记录
+            task['dir_mtime'] = response_dir_mtime(response, task['cid']) or task['mtime']
+        
+        if task['phase'] == 'probe':
+            top_mtime = items[0].get('mtime', 0) if items else 0
+            signature = dir_signature(task['dir_mtime'], count, top_mtime)
+            if self.split_listing:
+                # 快照内容与过滤条件相关，条件变化后需要重新列举
+                signature += f"|{self.min_size}:{self.file_type}"
+                task['signature'] = signature
+            cached = self.snapshot.load_dir(task['cid'], SNAPSHOT_MAX_AGE)
+            if cached and cached[0] == signature:
+                # 目录未变化，直接使用快照；快照中的文件移动前需确认仍在该目录
+                self.stats['dirs'] += 1
+                self.stats['skipped_dirs'] += 1
+                _, subdirs, files = cached
+                for subdir_id, name, _ in subdirs:
+                    # 快照中的子目录修改时间可能已过期，不用于子目录的签名
+                    self._enqueue_subdir(task, subdir_id, name, None)
+                return [dict(self._make_file(task, info), from_snapshot=True) for info in files]
+            task['phase'] = 'dirs' if self.split_listing else 'list'
+            task['offset'] = 0
+            self.pending.appendleft(task)
+            return result
+        
+        if task['phase'] == 'list':
+            for info in items:
+                task['max_mtime'] = max(task['max_mtime'], info.get('mtime', 0) or 0)
+                if info.get('is_dir'):
+                    self._add_subdir(task, info)
+                else:
+                    self._add_file(task, info)
+            has_more = True
+        elif task['phase'] == 'dirs':
+            for info in items:
+                if info.get('is_dir'):
+                    self._add_subdir(task, info)
+            has_more = True
+        else:
+            # 文件按大小降序返回，出现小于阈值的文件后无需继续翻页
+            has_more = True
+            for info in items:
+                if info.get('is_dir'):
+                    continue
+                if self.min_size is not None and (info.get('size') or 0) < self.min_size:
+                    has_more = False
+                    break
+                self._add_file(task, info)
+        
+        task['offset'] += len(items)
+        if has_more and items and task['offset'] < count:
+            # 还有下一页，继续列举当前目录
+            self.pending.appendleft(task)
+        elif task['phase'] == 'dirs':
+            task['phase'] = 'files'
+            task['offset'] = 0
+            self.pending.appendleft(task)
+        else:
+            self._finish(task, count)
+            result = list(task['files'])
+        return result
+
+
+def fetch_dir_page(payload):
+    """
+    请求一页目录列表
+    
+    参数:
+        payload: 请求参数（cid、offset、limit 等）
+    
+    返回:
+        dict: 接口返回的结果
+    """
+    response = client.fs_files_app(payload, **get_ios_ua_app())
+    if not response.get('state'):
+        error_msg = response.get('error', response.get('error_msg', '未知错误'))
+        raise Exception(f"列举目录失败 (cid={payload.get('cid')}): {error_msg}")
+    return response
+
+
+def walk_source_files(walker, workers=None):
+    """
+    驱动遍历器请求接口，逐个产出文件
+    
+    最多 workers 个目录同时列举（同一目录的各页仍按顺序请求），结果合并为一个文件流。
+    每一页单独超时和重试，重试从失败的那一页继续；重试仍失败时等待其余请求结束、
+    保存断点后抛出异常，下一轮从断点继续扫描
+    
+    参数:
+        walker: SourceWalker 对象
+        workers: 并发列举的目录数，None表示使用全局配置 SCAN_WORKERS
+    
+    返回:
+        generator: 文件信息字典
+    """
+    workers = workers or SCAN_WORKERS
+    
+    def fetch(task, payload):
+        @with_retry_and_timeout(operation_name=f"列举目录 {task['path'] or '/'} (第 {payload['offset']} 项起)")
+        def fetch_page():
+            return fetch_dir_page(payload)
+        return fetch_page()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        error = None
+        try:
+            while running or (error is None and walker.has_request()):
+                while error is None and walker.has_request() and len(running) < workers:
+                    task, payload = walker.next_request()
+                    running[executor.submit(fetch, task, payload)] = task
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        walker.retry(task)
+                        error = error or e
+                        continue
+                    files = walker.feed(task, response)
+                    walker.checkpoint()
+                    yield from files
+        finally:
+            # 出错或提前退出时立即记录断点，尚未完成的请求仍保留在断点中
+            walker.checkpoint(force=True)
+        
+        if error is not None:
+            raise error
+
+
+async def fetch_dir_page_async(payload):
+    """
+    请求一页目录列表（协程版本，使用 p115client 的异步接口）
+    
+    参数:
+        payload: 请求参数（cid、offset、limit 等）
+    
+    返回:
+        dict: 接口返回的结果
+    """
+    response = await client.fs_files_app(payload, async_=True, **get_ios_ua_app())
+    if not response.get('state'):
+        error_msg = response.get('error', response.get('error_msg', '未知错误'))
+        raise Exception(f"列举目录失败 (cid={payload.get('cid')}): {error_msg}")
+    return response
+
+
+async def walk_source_files_async(walker, workers=None):
+    """
+    驱动遍历器请求接口，逐个产出文件（异步生成器版本，行为同 walk_source_files）
+    
+    参数:
+        walker: SourceWalker 对象
+        workers: 并发列举的目录数，None表示使用全局配置 SCAN_WORKERS
+    
+    返回:
+        async generator: 文件信息字典
+    """
+    workers = workers or SCAN_WORKERS
+    
+    async def fetch(task, payload):
+        @with_retry_and_timeout(operation_name=f"列举目录 {task['path'] or '/'} (第 {payload['offset']} 项起)")
+        async def fetch_page():
+            return await fetch_dir_page_async(payload)
+        return await fetch_page()
+    
+    running = {}
+    error = None
+    try:
+        while running or (error is None and walker.has_request()):
+            while error is None and walker.has_request() and len(running) < workers:
+                task, payload = walker.next_request()
+                running[asyncio.ensure_future(fetch(task, payload))] = task
+            
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    walker.retry(task)
+                    error = error or e
+                    continue
+                files = walker.feed(task, response)
+                walker.checkpoint()
+                for file_info in files:
+                    yield file_info
+    finally:
+        # 提前退出时取消尚未完成的请求，断点中仍保留这些任务
+        for future in running:
+            future.cancel()
+        walker.checkpoint(force=True)
+    
+    if error is not None:
+        raise error
+
+
+class DirListingCache:
+    """
+    目录列表缓存（LRU + TTL，线程安全）
+    
+    按目录ID缓存直属子目录的 名称→ID 映射
+    """
+    
+    def __init__(self, max_size=DEFAULT_DIR_CACHE_SIZE, ttl=DEFAULT_DIR_CACHE_TTL):
+        """
+        参数:
+            max_size: 最大条目数，超出时淘汰最久未使用的条目
+            ttl: 有效期（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    def get(self, cid):
+        """
+        读取缓存
+        
+        返回:
+            dict: {子目录名称: 子目录ID}，未命中或已过期时返回 None
+        """
+        with self.lock:
+            entry = self.entries.get(cid)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.entries.pop(cid, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(cid)
+            self.hits += 1
+            return dict(entry[1])
+    
+    def put(self, cid, children):
+        """写入缓存"""
+        with self.lock:
+            self.entries[cid] = (time.monotonic(), dict(children))
+            self.entries.move_to_end(cid)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def invalidate(self, cid):
+        """使某个目录的缓存失效"""
+        with self.lock:
+            self.entries.pop(cid, None)
+    
+    def stats(self):
+        """
+        返回:
+            tuple: (命中次数, 未命中次数, 当前条目数)
+        """
+        with self.lock:
+            return self.hits, self.misses, len(self.entries)
+
+
+dir_cache = DirListingCache()
+
+
+def list_child_dirs(cid):
+    """
+    列举目录下的直属子目录（带超时和重试，优先使用目录列表缓存）
+    
+    参数:
+        cid: 目录ID
+    
+    返回:
+        dict: {子目录名称: 子目录ID}
+    """
+    cached = dir_cache.get(cid)
+    if cached is not None:
+        return cached
+    
+    children = {}
+    offset = 0
+    
+    while True:
+        payload = {'cid': cid, 'show_dir': 1, 'nf': 1, 'offset': offset, 'limit': SCAN_PAGE_SIZE}
+        
+        @with_retry_and_timeout(operation_name=f"列举子目录 (ID: {cid})")
+        def fetch_page():
+            return fetch_dir_page(payload)
+        
+        response = fetch_page()
+        items = [normalize_attr(item) for item in response.get('data') or []]
+        for info in items:
+            if info.get('is_dir') and str(info.get('parent_id', cid)) == str(cid):
+                children[info.get('name', '')] = info['id']
+        
+        offset += len(items)
+        if not items or offset >= int(response.get('count') or 0):
+            dir_cache.put(cid, children)
+            return children
+
+
+def validate_cached_cid(path, cid):
+    """
+    用一次轻量请求校验缓存的路径→目录ID是否仍然有效
+    
+    参数:
+        path: 目录路径，格式如 "/folder1/folder2"
+        cid: 缓存的目录ID
+    
+    返回:
+        bool: True 表示有效
+    """
+    @with_retry_and_timeout(operation_name=f"校验路径缓存 {path}")
+    def fetch():
+        return client.fs_files_app({'cid': cid, 'limit': 1, 'show_dir': 1}, **get_ios_ua_app())
+    
+    try:
+        response = fetch()
+    except Exception as e:
+        logger.warning(f"     ⚠️  校验路径缓存失败: {e}")
+        return False
+    
+    if not response.get('state'):
+        return False
+    
+    # 返回结果中的祖先路径应以该目录结尾，且名称与缓存路径一致
+    ancestors = response.get('path')
+    if not ancestors:
+        return True
+    last = ancestors[-1]
+    if path_item_cid(last) != str(cid):
+        return False
+    names = [path_item_name(item) for item in ancestors[1:]]
+    return '/' + '/'.join(names) == path
+
+
+def find_directory_by_path(path, start_cid=0):
+    """
+    根据路径查找目录ID（带超时和重试）
+    
+    从根目录查找时优先使用持久化的路径缓存：取缓存中最长的已知前缀，
+    用一次请求校验后，只需逐层查找剩余部分
+    
+    参数:
+        path: 目录路径，格式如 "/folder1/folder2/folder3"
+        start_cid: 起始目录ID，默认为 0（根目录）
+    
+    返回:
+        int: 目录ID，如果找不到则返回 None
+    """
+    # 处理路径
+    path = path.strip()
+    
+    # 如果是空路径或只有 /，返回根目录
+    if not path or path == '/':
+        return 0
+    
+    # 移除开头和结尾的斜杠
+    path = path.strip('/')
+    
+    # 分割路径
+    path_parts = [p for p in path.split('/') if p]
+    
+    if not path_parts:
+        return start_cid
+    
+    current_cid = start_cid
+    start_index = 0
+    use_cache = start_cid == 0 and state_store is not None
+    
+    # 查找缓存中最长的已知前缀
+    if use_cache:
+        for i in range(len(path_parts), 0, -1):
+            prefix = '/' + '/'.join(path_parts[:i])
+            cached_cid = state_store.get_path_cid(prefix)
+            if cached_cid is None:
+                continue
+            if validate_cached_cid(prefix, cached_cid):
+                current_cid = cached_cid
+                start_index = i
+                logger.info(f"  ⚡ 命中路径缓存: {prefix} (ID: {cached_cid})")
+            else:
+                logger.info(f"  ♻️  路径缓存已失效: {prefix}")
+                state_store.invalidate_path(prefix)
+            break
+    
+    # 逐层查找
+    for i, folder_name in enumerate(path_parts[start_index:], start_index):
+        current_path = '/' + '/'.join(path_parts[:i+1])
+        logger.info(f"  🔍 查找: {current_path}")
+        
+        # 获取当前目录下的所有子目录（带超时和重试）
+        found = False
+        try:
+            result_cid = list_child_dirs(current_cid).get(folder_name)
+            if result_cid:
+                current_cid = result_cid
+                found = True
+                logger.info(f"     ✓ 找到 (ID: {current_cid})")
+                if use_cache:
+                    state_store.save_path_cid(current_path, current_cid)
+                
+        except Exception as e:
+            logger.error(f"     ✗ 查询目录时出错: {e}")
+            return None
+        
+        if not found:
+            logger.error(f"     ✗ 未找到目录: {folder_name}")
+            logger.error(f"     提示: 请检查路径是否正确（区分大小写）")
+            return None
+    
+    return current_cid
+
+
+def resolve_paths(paths):
+    """
+    批量解析多个路径的目录ID
+    
+    所有路径先查路径缓存；未命中的路径组成前缀树，从根目录逐层向下，
+    每个父目录只列举一次，同一层的不同分支并发列举
+    
+    参数:
+        paths: 目录路径列表，格式如 ["/folder1/folder2", ...]
+    
+    返回:
+        dict: {路径: 目录ID}，找不到的路径不在结果中
+    """
+    results = {}
+    trie = {'cid': 0, 'path': '', 'children': {}}
+    
+    for raw_path in dict.fromkeys(paths):
+        parts = [p for p in raw_path.strip().strip('/').split('/') if p]
+        path = '/' + '/'.join(parts)
+        if not parts:
+            results[raw_path] = 0
+            continue
+        
+        if state_store is not None:
+            cached_cid = state_store.get_path_cid(path)
+            if cached_cid is not None:
+                if validate_cached_cid(path, cached_cid):
+                    logger.info(f"  ⚡ 命中路径缓存: {path} (ID: {cached_cid})")
+                    results[raw_path] = cached_cid
+                    continue
+                logger.info(f"  ♻️  路径缓存已失效: {path}")
+                state_store.invalidate_path(path)
+        
+        # 加入前缀树，共享前缀的路径共用同一个节点
+        node = trie
+        for part in parts:
+            node = node['children'].setdefault(part, {
+                'cid': None,
+                'path': f"{node['path']}/{part}",
+                'children': {},
+                'targets': [],
+            })
+        node['targets'].append(raw_path)
+    
+    frontier = [trie] if trie['children'] else []
+    with ThreadPoolExecutor(max_workers=RESOLVE_WORKERS) as pool:
+        while frontier:
+            futures = [(node, pool.submit(list_child_dirs, node['cid'])) for node in frontier]
+            next_frontier = []
+            
+            for node, future in futures:
+                try:
+                    children = future.result()
+                except Exception as e:
+                    logger.error(f"  ✗ 列举目录 {node['path'] or '/'} 时出错: {e}")
+                    continue
+                
+                for name, child in node['children'].items():
+                    child_cid = children.get(name)
+                    if child_cid is None:
+                        logger.error(f"  ✗ 未找到目录: {child['path']}")
+                        logger.error(f"     提示: 请检查路径是否正确（区分大小写）")
+                        continue
+                    
+                    child['cid'] = child_cid
+                    logger.info(f"  ✓ 找到: {child['path']} (ID: {child_cid})")
+                    if state_store is not None:
+                        state_store.save_path_cid(child['path'], child_cid)
+                    for raw_path in child['targets']:
+                        results[raw_path] = child_cid
+                    if child['children']:
+                        next_frontier.append(child)
+            
+            frontier = next_frontier
+    
+    return results
+
+
+def check_cookie_valid():
+    """
+    检查 Cookie 是否仍然有效
+    
+    返回:
+        bool: True 表示有效，False 表示失效
+    """
+    try:
+        user_info = client.user_info()
+        if user_info and user_info.get('state'):
+            return True
+        else:
+            return False
+    except Exception as e:
+        logger.error(f"检查 Cookie 状态时出错: {e}")
+        return False
+
+
+def move_files(file_ids, target_pid=0, max_retries=None):
+    """
+    移动文件或目录到指定目录（带重试机制）
+    
+    参数:
+        file_ids: 文件或目录ID，单个ID或ID列表
+        target_pid: 目标目录ID，默认为 0（根目录）
+        max_retries: 最大重试次数，None表示使用全局配置
+    
+    返回:
+        dict: API 返回的结果；请求本身异常时包含 'exception': True
+    """
+    @with_retry_and_timeout(max_retries=max_retries, operation_name="移动文件")
+    def do_move():
+        result = client.fs_move(file_ids, pid=target_pid)
+        
+        # 检查是否因为 Cookie 失效导致的错误
+        if not result.get('state'):
+            error_msg = result.get('error', result.get('error_msg', ''))
+            # 常见的认证失败错误码或消息
+            if 'login' in error_msg.lower() or 'auth' in error_msg.lower() or result.get('errno') == 99:
+                logger.error("=" * 80)
+                logger.error("❌ 检测到 Cookie 可能已失效！")
+                logger.error("=" * 80)
+                logger.error("")
+                logger.error("请执行以下步骤更新 Cookie：")
+                logger.error("  1. 访问 https://115.com 重新登录")
+                logger.error("  2. 按 F12 打开开发者工具获取新的 Cookie")
+                logger.error("  3. 更新 docker-compose.yml 中的 COOKIE 环境变量")
+                logger.error("  4. 重启容器: docker-compose restart")
+                logger.error("")
+                logger.error("=" * 80)
+                # 抛出异常以便上层识别为认证错误
+                raise Exception(f"Cookie失效: {error_msg}")
+        
+        return result
+    
+    try:
+        return do_move()
+    except Exception as e:
+        logger.error(f"移动文件时发生错误: {e}")
+        return {'state': False, 'error': str(e), 'exception': True}
+
+
+# 移动时表示目标目录不存在的错误信息（整条信息完全一致才算）
+TARGET_MISSING_MESSAGES = ('目标目录不存在', '目标文件夹不存在', 'target not found')
+# 可能指源文件也可能指目标目录的错误信息，需要列举目标目录确认
+AMBIGUOUS_MISSING_MESSAGES = ('目录不存在', '文件夹不存在')
+
+stale_target_cids = set()  # 移动时发现已不存在的目标目录ID，下一轮重新解析
+
+
+def target_dir_exists(cid):
+    """
+    列举一次目标目录，确认其是否存在
+    
+    参数:
+        cid: 目录ID
+    
+    返回:
+        bool: 请求失败无法确认时返回 True
+    """
+    @with_retry_and_timeout(max_retries=1, operation_name=f"确认目标目录 (ID: {cid})")
+    def fetch():
+        return client.fs_files_app({'cid': cid, 'limit': 1, 'show_dir': 1}, **get_ios_ua_app())
+    
+    try:
+        response = fetch()
+    except Exception as e:
+        logger.warning(f"     ⚠️  确认目标目录失败: {e}")
+        return True
+    if not response.get('state'):
+        return False
+    # 目录不存在时接口可能返回根目录的内容，以祖先路径的末项为准
+    ancestors = response.get('path')
+    if not ancestors:
+        return True
+    last = ancestors[-1]
+    return path_item_cid(last) == str(cid)
+
+
+def is_target_missing_error(error_msg, target_pid):
+    """
+    判断移动失败是否因为目标目录不存在
+    
+    "文件或目录不存在" 等指向源文件的错误不算，含义不明确的
+    "目录不存在" 通过列举目标目录确认。
+    
+    参数:
+        error_msg: 错误信息
+        target_pid: 目标目录ID
+    
+    返回:
+        bool: True 表示目标目录不存在
+    """
+    error_msg = str(error_msg).strip()
+    if error_msg.lower() in TARGET_MISSING_MESSAGES:
+        return True
+    if error_msg in AMBIGUOUS_MISSING_MESSAGES:
+        return not target_dir_exists(target_pid)
+    return False
+
+
+def bisect_move_files(file_ids, target_pid, outcomes, depth=0, result=None):
+    """
+    移动一批文件，失败时递归二分，定位导致整批失败的个别文件
+    
+    限流、登录失效、无权限等与具体文件无关的错误不拆分；第一次拆分后
+    两半都以相同错误失败时，同样视为整批错误，不再继续拆分。
+    
+    参数:
+        file_ids: 文件ID列表
+        target_pid: 目标目录ID
+        outcomes: 结果字典，按文件ID写入 {'state': bool, 'error': str}
+        depth: 当前二分深度，顶层为 0
+        result: 已发出的本批次请求的结果，None 表示需要先发出请求
+    
+    返回:
+        int: 本次共发出的 fs_move 请求数
+    """
+    calls = 0
+    if result is None:
+        # 二分产生的子批次只尝试一次，避免整批重复重试
+        result = move_files(file_ids, target_pid, max_retries=1 if depth > 0 else None)
+        calls += 1
+    
+    if result.get('state'):
+        for file_id in file_ids:
+            outcomes[file_id] = {'state': True}
+        return calls
+    
+    error_msg = result.get('error', result.get('error_msg', '未知错误'))
+    
+    # 目标目录不存在时，使路径缓存失效，下一轮重新解析
+    target_missing = not result.get('exception') and is_target_missing_error(error_msg, target_pid)
+    if target_missing:
+        stale_target_cids.add(target_pid)
+        if state_store is not None:
+            for path in state_store.invalidate_cid(target_pid):
+                logger.warning(f"     ♻️  目标目录不存在，已清除路径缓存: {path}")
+    
+    # 单个文件、请求异常（网络/超时/Cookie失效）、目标目录不存在、整批错误或未开启二分时，直接整批记为失败
+    if (len(file_ids) == 1 or result.get('exception') or not MOVE_BISECT
+            or target_missing or is_batch_wide_error(result)):
+        for file_id in file_ids:
+            outcomes[file_id] = {'state': False, 'error': error_msg}
+        return calls
+    
+    if depth == 0:
+        logger.warning(f"     ⚠️  整批移动失败: {error_msg}，开始二分定位失败文件...")
+    
+    mid = len(file_ids) // 2
+    halves = [file_ids[:mid], file_ids[mid:]]
+    results = []
+    for half in halves:
+        if results and is_batch_wide_error(results[-1]):
+            # 前一半遇到整批错误（如限流），后一半不再尝试
+            results.append(results[-1])
+            continue
+        results.append(move_files(half, target_pid, max_retries=1))
+        calls += 1
+    
+    if depth == 0 and all(not half_result.get('state')
+                          and half_result.get('error', half_result.get('error_msg', '未知错误')) == error_msg
+                          for half_result in results):
+        logger.warning("     ⚠️  拆分后两半均以相同错误失败，视为整批错误，停止二分")
+        for file_id in file_ids:
+            outcomes[file_id] = {'state': False, 'error': error_msg}
+        return calls
+    
+    for half, half_result in zip(halves, results):
+        calls += bisect_move_files(half, target_pid, outcomes, depth + 1, half_result)
+    return calls
+
+
+def move_files_batch(file_ids, target_pid=0, batch_size=None):
+    """
+    批量移动文件（自动分批，每批调用一次 fs_move，失败批次二分定位）
+    
+    参数:
+        file_ids: 文件或目录ID列表
+        target_pid: 目标目录ID
+        batch_size: 每批处理的文件数量，None表示使用全局配置 MOVE_BATCH_SIZE
+    
+    返回:
+        dict: {文件ID: {'state': bool, 'error': str}}，每个文件的移动结果
+    """
+    if not isinstance(file_ids, (list, tuple)):
+        file_ids = [file_ids]
+    
+    size = batch_size if batch_size is not None else MOVE_BATCH_SIZE
+    total = len(file_ids)
+    total_batches = (total + size - 1) // size
+    outcomes = {}
+    
+    # 先在日志中登记全部批次，再逐批发出
+    batches = [list(file_ids[i:i + size]) for i in range(0, total, size)]
+    batch_ids = [move_journal.plan(target_pid, batch) if move_journal is not None else None for batch in batches]
+    
+    for batch_num, (batch, batch_id) in enumerate(zip(batches, batch_ids), 1):
+        logger.info(f"  📦 第 {batch_num}/{total_batches} 批 ({len(batch)} 个文件) ➜ 目标ID: {target_pid}")
+        batch_outcomes = {}
+        if batch_id is not None:
+            move_journal.dispatch(batch_id)
+        calls = bisect_move_files(batch, target_pid, batch_outcomes)
+        if batch_id is not None:
+            move_journal.result(
+                batch_id,
+                [file_id for file_id, outcome in batch_outcomes.items() if outcome['state']],
+                [file_id for file_id, outcome in batch_outcomes.items() if not outcome['state']],
+            )
+        outcomes.update(batch_outcomes)
+        
+        failed = sum(1 for outcome in batch_outcomes.values() if not outcome['state'])
+        if not failed:
+            logger.info(f"     ✅ 第 {batch_num} 批移动成功")
+        elif calls > 1:
+            logger.warning(f"     ⚠️  第 {batch_num} 批二分定位完成: {failed} 个文件失败，共 {calls} 次请求")
+        else:
+            logger.error(f"     ❌ 第 {batch_num} 批移动失败")
+    
+    return outcomes
+
+
+def list_file_ids_in_directory(cid, wanted):
+    """
+    列举单个目录的文件，找出其中属于 wanted 的文件ID（全部找到后提前停止）
+    
+    参数:
+        cid: 目录ID
+        wanted: 要查找的文件ID集合
+    
+    返回:
+        set: 在该目录中找到的文件ID
+    """
+    found = set()
+    offset = 0
+    while found != wanted:
+        payload = {'cid': cid, 'show_dir': 0, 'offset': offset, 'limit': SCAN_PAGE_SIZE}
+        
+        @with_retry_and_timeout(operation_name=f"列举目录 (ID: {cid})")
+        def fetch_page():
+            return fetch_dir_page(payload)
+        
+        response = fetch_page()
+        items = [normalize_attr(item) for item in response.get('data') or []]
+        found.update(info['id'] for info in items if not info.get('is_dir') and info['id'] in wanted)
+        offset += len(items)
+        if not items or offset >= int(response.get('count') or 0):
+            break
+    return found
+
+
+def replay_move_journal():
+    """
+    启动时回放移动日志，核对上次退出时尚未完成的批次
+    
+    - 未发出的批次: 文件仍在源目录，交给下一轮扫描
+    - 已发出但没有结果的批次: 每个目标目录列举一次，已出现在目标目录的文件记为已移动，
+      并在下一轮扫描中跳过（服务器上的移动可能尚未完全生效）
+    """
+    try:
+        planned, in_flight = move_journal.load()
+    except Exception as e:
+        logger.warning(f"⚠️  读取移动日志失败: {e}")
+        return
+    
+    if not planned and not in_flight:
+        move_journal.compact()
+        return
+    
+    logger.info("")
+    logger.info(f"🧾 回放移动日志: {len(in_flight)} 个批次已发出但没有结果，{len(planned)} 个批次未发出")
+    for batch in planned:
+        move_journal.result(batch['batch'], [], batch['ids'])
+    
+    batches_by_target = {}
+    unresolved = []
+    for batch in in_flight:
+        batches_by_target.setdefault(batch['target'], []).append(batch)
+    
+    for target_cid, batches in batches_by_target.items():
+        wanted = {file_id for batch in batches for file_id in batch['ids']}
+        try:
+            found = list_file_ids_in_directory(target_cid, wanted)
+        except Exception as e:
+            logger.warning(f"   ⚠️  列举目标目录 (ID: {target_cid}) 失败: {e}，下次启动时再核对")
+            unresolved.extend(batches)
+            continue
+        move_journal.settled_ids.update(found)
+        logger.info(f"   ├─ 目标ID {target_cid}: {len(found)} 个文件已在目标目录，{len(wanted) - len(found)} 个未移动")
+        for batch in batches:
+            move_journal.result(
+                batch['batch'],
+                [file_id for file_id in batch['ids'] if file_id in found],
+                [file_id for file_id in batch['ids'] if file_id not in found],
+            )
+    
+    # 核对失败的批次保留在日志中，下次启动时再核对
+    for batch in unresolved:
+        move_journal.open_batches[batch['batch']] = [
+            {'op': 'plan', 'batch': batch['batch'], 'target': batch['target'], 'ids': batch['ids'], 'ts': batch['ts']},
+            {'op': 'dispatch', 'batch': batch['batch'], 'ts': batch['ts']},
+        ]
+    move_journal.compact()
+
+
+def drop_moved_away_files(batch):
+    """
+    确认来自目录快照的文件仍在快照记录的目录中，已被移到其他目录的文件不再移动
+    
+    快照可能落后于服务器，而 fs_move 按文件ID移动，文件在哪里都会被移入目标目录。
+    只有来自快照的文件需要确认，每 FILE_INFO_BATCH_SIZE 个文件合并为一次 fs_file 请求。
+    只有接口明确返回了其他父目录的文件才丢弃并使其目录快照失效；
+    请求失败或结果中没有的文件无法确认，本轮跳过，下一轮再处理。
+    
+    参数:
+        batch: 文件信息列表
+    
+    返回:
+        list: 可以移动的文件信息列表
+    """
+    pending = [file_info for file_info in batch if file_info.get('from_snapshot')]
+    if not pending:
+        return batch
+    
+    parents = {}  # 文件ID -> 服务器上的父目录ID
+    for start in range(0, len(pending), FILE_INFO_BATCH_SIZE):
+        chunk = pending[start:start + FILE_INFO_BATCH_SIZE]
+        file_ids = ','.join(str(file_info['id']) for file_info in chunk)
+        
+        @with_retry_and_timeout(operation_name=f"获取文件信息 ({len(chunk)} 个文件)")
+        def fetch_info():
+            return client.fs_file({'file_id': file_ids})
+        
+        try:
+            response = fetch_info()
+        except Exception as e:
+            logger.warning(f"  ⚠️  无法确认 {len(chunk)} 个快照文件的位置，本轮跳过: {e}")
+            continue
+        if not response.get('state'):
+            logger.warning(f"  ⚠️  无法确认 {len(chunk)} 个快照文件的位置，本轮跳过: "
+                           f"{response_error_msg(response) or '未知错误'}")
+            continue
+        data = response.get('data') or []
+        for item in data if isinstance(data, list) else [data]:
+            info = normalize_attr(item)
+            parents[str(info['id'])] = str(info.get('parent_id'))
+    
+    kept = []
+    for file_info in batch:
+        if not file_info.get('from_snapshot'):
+            kept.append(file_info)
+            continue
+        parent_id = parents.get(str(file_info['id']))
+        if parent_id == str(file_info['parent_id']):
+            kept.append(file_info)
+        elif parent_id is not None:
+            logger.info(f"  ♻️  {file_info['display_path']} 已不在源目录（快照过期），跳过")
+            if state_store is not None:
+                state_store.invalidate_dir(file_info['parent_id'])
+    return kept
+
+
+def move_queued_files(batch, stats):
+    """
+    移动一批已排队的文件（按目标目录分组），并统计每个文件的结果
+    
+    参数:
+        batch: 文件信息列表（需包含 'target_cid'）
+        stats: 统计字典，累加 'success' 和 'failed'
+    """
+    batch = drop_moved_away_files(batch)
+    files_by_target = {}
+    for file_info in batch:
+        files_by_target.setdefault(file_info['target_cid'], {})[file_info['id']] = file_info
+    
+    for target_cid, files_by_id in files_by_target.items():
+        try:
+            outcomes = move_files_batch(list(files_by_id), target_cid)
+        except Exception as e:
+            stats['failed'] += len(files_by_id)
+            FILES_FAILED.inc(len(files_by_id))
+            logger.error(f"     ❌ 异常: {e}")
+            continue
+        finally:
+            # 移入和移出的目录列表已变化，使其缓存失效
+            dir_cache.invalidate(target_cid)
+            for file_info in files_by_id.values():
+                dir_cache.invalidate(file_info.get('parent_id'))
+        
+        # 根据每个文件的移动结果进行统计
+        for file_id, file_info in files_by_id.items():
+            outcome = outcomes.get(file_id, {'state': False, 'error': '未执行'})
+            display_info = file_info.get('display_path') or file_info.get('name', '未知文件')
+            size_info = format_file_size(file_info['size'])
+            if outcome['state']:
+                stats['success'] += 1
+                FILES_MOVED.inc()
+                if stability_tracker is not None:
+                    stability_tracker.forget(file_id)
+                BYTES_MOVED.inc(file_info['size'])
+                logger.info(f"  ✅ {display_info} ({size_info})")
+            else:
+                stats['failed'] += 1
+                FILES_FAILED.inc()
+                logger.error(f"  ❌ {display_info} ({size_info}): {outcome.get('error', '未知错误')}")
+
+
+class FairMoveScheduler:
+    """
+    全局公平移动队列
+    
+    每组映射一个有界队列，移动线程按加权赤字轮询（DRR）从各队列取出批次：
+    每轮到一组映射时累加 quantum × 优先级 的额度，按额度取出文件，
+    保证大量新文件的映射不会阻塞其他映射。可设置每轮移动额度上限，
+    额度用尽后丢弃剩余排队文件（下一轮重新扫描到时再移动）。
+    """
+    
+    def __init__(self, batch_size, capacity, budget=0, flush_seconds=MOVE_FLUSH_SECONDS):
+        """
+        参数:
+            batch_size: 每批最多提交的文件数量
+            capacity: 每组映射的队列容量，队列已满时扫描阻塞
+            budget: 每轮最多移动的文件数量，0 表示不限制
+            flush_seconds: 文件排队多久后即使未凑满一批也提交（秒）
+        """
+        self.batch_size = batch_size
+        self.capacity = capacity
+        self.budget = budget
+        self.flush_seconds = flush_seconds
+        self.flows = {}
+        self.order = deque()
+        self.dispatched = 0
+        self.exhausted = False
+        self.cond = threading.Condition()
+    
+    def add_flow(self, key, weight=1):
+        """
+        添加一组映射的队列
+        
+        参数:
+            key: 队列标识（映射序号）
+            weight: 优先级权重
+        """
+        with self.cond:
+            self.flows[key] = {'weight': weight, 'items': deque(), 'deficit': 0,
+                               'closed': False, 'since': None, 'dispatched': 0, 'dropped': 0}
+            self.order.append(key)
+    
+    def put(self, key, item, block=True):
+        """
+        文件入队，队列已满时阻塞
+        
+        参数:
+            key: 队列标识
+            item: 文件信息字典
+            block: 队列已满时是否阻塞，False 时抛出 queue.Full
+        
+        返回:
+            bool: False 表示本轮移动额度已用完，文件未入队
+        """
+        with self.cond:
+            flow = self.flows[key]
+            while not self.exhausted and len(flow['items']) >= self.capacity:
+                if not block:
+                    raise queue.Full
+                self.cond.wait()
+            if self.exhausted:
+                flow['dropped'] += 1
+                return False
+            if not flow['items']:
+                flow['since'] = time.monotonic()
+            flow['items'].append(item)
+            self.cond.notify_all()
+            return True
+    
+    def close(self, key):
+        """标记该映射的扫描已结束"""
+        with self.cond:
+            self.flows[key]['closed'] = True
+            self.cond.notify_all()
+    
+    def depth(self):
+        """当前排队等待移动的文件总数"""
+        with self.cond:
+            return sum(len(flow['items']) for flow in self.flows.values())
+    
+    def dropped(self, key):
+        """本轮因额度用完而未移动的文件数量"""
+        with self.cond:
+            return self.flows[key]['dropped']
+    
+    def _ready(self, flow, now):
+        items = flow['items']
+        if not items:
+            return False
+        return flow['closed'] or len(items) >= self.batch_size or now - flow['since'] >= self.flush_seconds
+    
+    def _next_wait(self, now):
+        waits = [flow['since'] + self.flush_seconds - now for flow in self.flows.values() if flow['items']]
+        return max(min(waits), 0.01) if waits else None
+    
+    def next_batch(self):
+        """
+        取出下一批待移动的文件，没有可提交的批次时阻塞等待
+        
+        返回:
+            tuple: (队列标识, 文件列表)；所有映射扫描结束且队列已空，或额度用完时返回 None
+        """
+        with self.cond:
+            while True:
+                if self.exhausted:
+                    return None
+                if all(flow['closed'] and not flow['items'] for flow in self.flows.values()):
+                    return None
+                now = time.monotonic()
+                if any(self._ready(flow, now) for flow in self.flows.values()):
+                    break
+                self.cond.wait(self._next_wait(now))
+            
+            # 最高优先级的映射每次可取满一批，其余按权重比例分配
+            quantum = max(1, self.batch_size // max(flow['weight'] for flow in self.flows.values()))
+            ready = [key for key in self.order if self._ready(self.flows[key], now)]
+            for _ in range(len(self.order)):
+                key = self.order[0]
+                self.order.rotate(-1)
+                flow = self.flows[key]
+                if self._ready(flow, now):
+                    break
+            
+            items = flow['items']
+            flow['deficit'] += quantum * flow['weight']
+            if len(ready) == 1:
+                # 没有其他映射在等待时不必限制份额
+                flow['deficit'] = max(flow['deficit'], min(len(items), self.batch_size))
+            count = min(flow['deficit'], len(items), self.batch_size)
+            if self.budget:
+                count = min(count, self.budget - self.dispatched)
+            batch = [items.popleft() for _ in range(count)]
+            flow['deficit'] -= count
+            flow['dispatched'] += count
+            self.dispatched += count
+            if items:
+                flow['since'] = now
+            else:
+                flow['deficit'] = 0
+                flow['since'] = None
+            
+            if self.budget and self.dispatched >= self.budget:
+                # 额度用完：丢弃剩余排队文件，唤醒阻塞的扫描
+                self.exhausted = True
+                for other in self.flows.values():
+                    other['dropped'] += len(other['items'])
+                    other['items'].clear()
+            self.cond.notify_all()
+            return key, batch
+
+
+def fair_move_stage(scheduler, stats_by_key):
+    """
+    移动阶段（在独立线程中运行）：按公平队列的调度顺序提交各映射的批次
+    
+    参数:
+        scheduler: FairMoveScheduler 对象
+        stats_by_key: {队列标识: 统计字典}，累加 'success' 和 'failed'
+    """
+    while True:
+        picked = scheduler.next_batch()
+        if picked is None:
+            return
+        key, batch = picked
+        try:
+            move_queued_files(batch, stats_by_key[key])
+        except Exception as e:
+            stats_by_key[key]['failed'] += len(batch)
+            logger.error(f"❌ 移动文件时发生错误: {e}")
+
+
+def new_source_walker(mapping, min_size_bytes, skip_cids=None):
+    """
+    按全局扫描配置为映射创建源目录遍历器
+    
+    参数:
+        mapping: 映射信息字典（需包含 'source_cid'）
+        min_size_bytes: 最小文件大小（字节）
+        skip_cids: 不遍历的子目录ID集合
+    
+    返回:
+        SourceWalker: 遍历器
+    """
+    walker = SourceWalker(
+        mapping['source_cid'],
+        snapshot=state_store if INCREMENTAL_SCAN else None,
+        cursor_store=state_store,
+        min_size=min_size_bytes if SIZE_ORDERED_SCAN else None,
+        file_type=SCAN_FILE_TYPE,
+        skip_cids=skip_cids,
+    )
+    if walker.resumed:
+        logger.info(f"📍 映射 {mapping['index']}: 从上次中断处继续扫描（剩余 {len(walker.pending)} 个目录任务）")
+    return walker
+
+
+def accept_scanned_file(file_info, file_stats, mapping, min_size_bytes, now=None):
+    """
+    过滤扫描到的文件，符合条件时按分流规则标记目标目录
+    
+    参数:
+        file_info: 文件信息字典
+        file_stats: 扫描统计字典
+        mapping: 映射信息字典（'filter' 为该映射的 FileFilter）
+        min_size_bytes: 最小文件大小（字节）
+        now: 当前时间戳，用于 age 规则，None 表示取当前时间
+    
+    返回:
+        bool: True 表示需要移动
+    """
+    file_stats['total'] += 1
+    
+    # 上次退出前已发出、回放时确认已在目标目录的文件，源目录列表可能尚未更新
+    if move_journal is not None and file_info['id'] in move_journal.settled_ids:
+        logger.info(f"  🧾 {file_info['display_path']} 已在目标目录（移动日志确认），跳过")
+        return False
+    
+    # 检查过滤规则
+    file_filter = mapping.get('filter')
+    if file_filter is not None and not file_filter.matches(file_info['path'], file_info['size'],
+                                                           file_info.get('mtime'), now):
+        file_stats['excluded'] += 1
+        return False
+    
+    # 检查文件大小
+    if file_info['size'] < min_size_bytes:
+        file_stats['small'] += 1
+        return False
+    
+    # 检查文件是否仍在写入
+    if stability_tracker is not None and not stability_tracker.is_stable(file_info):
+        file_stats['unstable'] += 1
+        logger.info(f"  ⏳ {file_info['display_path']} ({format_file_size(file_info['size'])}) 等待稳定")
+        return False
+    
+    file_stats['queued'] += 1
+    route = select_route(mapping, file_info, now)
+    file_info['target_cid'] = route['target_cid']
+    if mapping.get('routes'):
+        routed = file_stats.setdefault('routed', {})
+        routed[route['target_path']] = routed.get(route['target_path'], 0) + 1
+        logger.info(f"  ✓ {file_info['display_path']} ({format_file_size(file_info['size'])}) ➜ {route['target_path']}")
+    else:
+        logger.info(f"  ✓ {file_info['display_path']} ({format_file_size(file_info['size'])})")
+    return True
+
+
+def report_mapping_result(mapping, walker, file_stats, move_stats, scan_error, min_size_bytes):
+    """
+    输出单个映射本轮的扫描和移动结果
+    
+    参数:
+        mapping: 映射信息字典
+        walker: 本轮使用的 SourceWalker
+        file_stats: 扫描统计字典
+        move_stats: 移动统计字典
+        scan_error: 扫描时抛出的异常，None 表示扫描完成
+        min_size_bytes: 最小文件大小（字节）
+    
+    返回:
+        bool: False 表示检测到 Cookie 失效，需要停止任务
+    """
+    idx = mapping['index']
+    if scan_error is not None:
+        error_str = str(scan_error).lower()
+        if 'login' in error_str or 'auth' in error_str or 'cookie' in error_str:
+            logger.error("")
+            logger.error("=" * 80)
+            logger.error("❌ 扫描文件时检测到 Cookie 已失效！")
+            logger.error("=" * 80)
+            logger.error("")
+            logger.error("请立即更新 Cookie 并重启容器")
+            logger.error("详细步骤请查看上方日志")
+            logger.error("=" * 80)
+            return False
+        # 其他错误（包括超时）记录后继续处理下一个映射，已入队的文件已正常移动
+        logger.error(f"❌ 映射 {idx}: 扫描目录失败: {scan_error}")
+        if state_store is not None:
+            logger.info(f"📍 已记录扫描断点，下一轮将从中断处继续")
+        if move_stats['success'] or move_stats['failed']:
+            logger.info(f"📈 扫描中断前的移动结果: ✅ 成功 {move_stats['success']} | ❌ 失败 {move_stats['failed']}")
+        logger.warning(f"⚠️  跳过此映射，继续处理下一个...")
+        return True
+    
+    stats = walker.stats
+    logger.info("")
+    logger.info(f"📊 映射 {idx} 扫描完成:")
+    logger.info(f"   ├─ 总文件数: {file_stats['total']}")
+    if file_stats.get('merged_into'):
+        logger.info(f"   ├─ 合并扫描: 与映射 {file_stats['merged_into']} 共用一次遍历")
+    else:
+        logger.info(f"   ├─ 目录数: {stats['dirs']}（未变化跳过 {stats['skipped_dirs']}，请求 {stats['requests']} 次）")
+    if file_stats['small'] > 0:
+        logger.info(f"   ├─ 过小文件: {file_stats['small']} (< {format_file_size(min_size_bytes)})")
+    if file_stats['excluded'] > 0:
+        logger.info(f"   ├─ 排除文件: {file_stats['excluded']} (过滤规则)")
+    if file_stats['unstable'] > 0:
+        logger.info(f"   ├─ 等待稳定: {file_stats['unstable']} (大小或修改时间仍在变化)")
+    if file_stats.get('deferred'):
+        logger.info(f"   ├─ 延后移动: {file_stats['deferred']} (本轮额度已用完)")
+    if file_stats.get('routed'):
+        routed_desc = ' | '.join(f"{path} {count}" for path, count in file_stats['routed'].items())
+        logger.info(f"   ├─ 分流: {routed_desc}")
+    logger.info(f"   └─ 待移动: {file_stats['queued']}")
+    
+    if file_stats['queued']:
+        logger.info("")
+        logger.info(f"📈 移动结果: ✅ 成功 {move_stats['success']} | ❌ 失败 {move_stats['failed']}")
+    else:
+        logger.info("")
+        logger.info("💤 没有符合条件的文件需要移动")
+    return True
+
+
+def log_mapping_header(mapping, total):
+    logger.info("")
+    logger.info(f"📦 处理映射 {mapping['index']}/{total}")
+    logger.info(f"   源: {mapping['source_path']}")
+    logger.info(f"   ➜  {mapping['target_path']}")
+    logger.info("-" * 80)
+
+
+def plan_scan_groups(due_mappings, all_mappings=None):
+    """
+    把本轮到期的映射按源目录合并为扫描组，每组只遍历一次
+    
+    源目录相同或嵌套（如 /下载 和 /下载/电影）且都已到期的映射合并到最外层的映射一起遍历；
+    每个文件归属于源目录最具体（最深）的映射，源目录相同的映射按配置顺序取第一个过滤规则接受该文件的。
+    嵌套在内、但本轮未到期的映射的子树不遍历，留给它自己的检查计划。
+    
+    参数:
+        due_mappings: 本轮到期的映射列表
+        all_mappings: 全部映射列表，None 表示只有 due_mappings
+    
+    返回:
+        list: 扫描组 [{'root': 遍历的映射, 'members': [组内到期的映射],
+                        'levels': [(相对 root 的源目录前缀, [该源目录的映射]), ...]（最深的在前）,
+                        'skip_cids': 不遍历的子目录ID集合}, ...]
+    """
+    all_mappings = sorted(all_mappings or due_mappings, key=lambda mapping: mapping['index'])
+    due = {mapping['index'] for mapping in due_mappings}
+    paths = {mapping['index']: mapping['source_path'].rstrip('/') for mapping in all_mappings}
+    
+    def contains(outer, inner):
+        # outer 的源目录严格包含 inner 的源目录
+        outer_path = paths[outer['index']]
+        return (outer['source_cid'] != inner['source_cid']
+                and (outer_path == '' or paths[inner['index']].startswith(outer_path + '/')))
+    
+    def parent(mapping):
+        same = [other for other in all_mappings if other['source_cid'] == mapping['source_cid']]
+        if same[0] is not mapping:
+            return same[0]
+        ancestors = [other for other in all_mappings if contains(other, mapping)]
+        return max(ancestors, key=lambda other: len(paths[other['index']])) if ancestors else None
+    
+    def scan_root(mapping):
+        outer = parent(mapping)
+        return mapping if outer is None or outer['index'] not in due else scan_root(outer)
+    
+    groups = {}
+    for mapping in sorted(due_mappings, key=lambda mapping: mapping['index']):
+        root = scan_root(mapping)
+        groups.setdefault(root['index'], {'root': root, 'members': []})['members'].append(mapping)
+    
+    for group in groups.values():
+        root = group['root']
+        root_path = paths[root['index']]
+        nested = [other for other in all_mappings
+                  if other['source_cid'] == root['source_cid'] or contains(root, other)]
+        group['skip_cids'] = {
+            other['source_cid'] for other in nested
+            if other['source_cid'] != root['source_cid']
+            and (other['index'] not in due or scan_root(other) is not root)
+        }
+        levels = {}
+        for other in nested:
+            levels.setdefault(paths[other['index']][len(root_path):].strip('/'), []).append(other)
+        group['levels'] = sorted(levels.items(), key=lambda item: -len(item[0]))
+    return [groups[idx] for idx in sorted(groups)]
+
+
+def assign_scanned_file(group, file_info, now=None):
+    """
+    为合并遍历中扫描到的文件找到所属映射，并把路径改写为相对该映射源目录的路径
+    
+    参数:
+        group: plan_scan_groups 返回的扫描组
+        file_info: 文件信息字典（'path' 为相对 root 源目录的路径）
+        now: 当前时间戳，用于 age 规则
+    
+    返回:
+        dict: 所属映射，文件属于本轮不扫描的映射时返回 None
+    """
+    path = file_info['path']
+    for prefix, mappings in group['levels']:
+        if prefix and not path.startswith(prefix + '/'):
+            continue
+        rel_path = path[len(prefix) + 1:] if prefix else path
+        owner = mappings[0]
+        if len(mappings) > 1:
+            owner = next((mapping for mapping in mappings if mapping.get('filter') is None
+                          or mapping['filter'].matches(rel_path, file_info['size'], file_info.get('mtime'), now)),
+                         mappings[0])
+        if not any(owner is member for member in group['members']):
+            return None
+        if prefix:
+            file_info['path'] = file_info['display_path'] = rel_path
+        return owner
+    return None
+
+
+def log_scan_group(group, total):
+    root = group['root']
+    log_mapping_header(root, total)
+    for member in group['members']:
+        if member is not root:
+            logger.info(f"   🔗 合并扫描映射 {member['index']}: {member['source_path']} ➜ {member['target_path']}")
+    logger.info(f"🔍 扫描源目录 (ID: {root['source_cid']})，边扫描边移动（每批最多 {MOVE_BATCH_SIZE} 个）...")
+
+
+def new_file_stats(group, mapping):
+    file_stats = {'total': 0, 'excluded': 0, 'small': 0, 'unstable': 0, 'queued': 0}
+    if mapping is not group['root']:
+        file_stats['merged_into'] = group['root']['index']
+    return file_stats
+
+
+def scan_mapping(group, total, scheduler, min_size_bytes):
+    """
+    遍历一个扫描组的源目录（同步引擎，在线程池中运行），符合条件的文件写入所属映射的公平队列
+    
+    参数:
+        group: plan_scan_groups 返回的扫描组
+        total: 本轮映射总数，用于日志输出
+        scheduler: FairMoveScheduler 对象
+        min_size_bytes: 最小文件大小（字节）
+    
+    返回:
+        tuple: (SourceWalker, {映射序号: 扫描统计字典}, 扫描异常或 None)
+    """
+    root = group['root']
+    log_scan_group(group, total)
+    stats_by_index = {mapping['index']: new_file_stats(group, mapping) for mapping in group['members']}
+    walker = None
+    try:
+        walker = new_source_walker(root, min_size_bytes, group['skip_cids'])
+        now = time.time()
+        # 每页单独重试，失败时断点已保存，下一轮从断点继续
+        files = walk_source_files(walker)
+        for file_info in files:
+            mapping = assign_scanned_file(group, file_info, now)
+            if mapping is None:
+                continue
+            if not accept_scanned_file(file_info, stats_by_index[mapping['index']], mapping, min_size_bytes, now):
+                continue
+            if not scheduler.put(mapping['index'], file_info):
+                stop_deferred_scan(root, files)
+                break
+        return walker, stats_by_index, None
+    except Exception as e:
+        return walker, stats_by_index, e
+    finally:
+        for mapping in group['members']:
+            scheduler.close(mapping['index'])
+
+
+async def scan_mapping_async(group, total, scheduler, min_size_bytes, semaphore):
+    """
+    遍历一个扫描组的源目录（异步引擎），参数和返回值同 scan_mapping
+    
+    参数:
+        semaphore: 限制同时扫描的源目录数量的信号量
+    """
+    async with semaphore:
+        root = group['root']
+        log_scan_group(group, total)
+        stats_by_index = {mapping['index']: new_file_stats(group, mapping) for mapping in group['members']}
+        walker = None
+        try:
+            walker = new_source_walker(root, min_size_bytes, group['skip_cids'])
+            now = time.time()
+            files = walk_source_files_async(walker)
+            async for file_info in files:
+                mapping = assign_scanned_file(group, file_info, now)
+                if mapping is None:
+                    continue
+                if not accept_scanned_file(file_info, stats_by_index[mapping['index']], mapping, min_size_bytes, now):
+                    continue
+                try:
+                    accepted = scheduler.put(mapping['index'], file_info, block=False)
+                except queue.Full:
+                    # 队列已满时在线程中等待，不阻塞事件循环
+                    accepted = await asyncio.to_thread(scheduler.put, mapping['index'], file_info)
+                if not accepted:
+                    await files.aclose()
+                    stop_deferred_scan(root)
+                    break
+            return walker, stats_by_index, None
+        except Exception as e:
+            return walker, stats_by_index, e
+        finally:
+            for mapping in group['members']:
+                scheduler.close(mapping['index'])
+
+
+def stop_deferred_scan(mapping, files=None):
+    """
+    本轮移动额度用完时停止扫描，并清除扫描断点
+    
+    已列举但未移动的文件不在断点之后，下一轮需要从头扫描（未变化的目录仍使用快照）
+    
+    参数:
+        mapping: 映射信息字典
+        files: 扫描使用的文件生成器，非空时先关闭
+    """
+    if files is not None:
+        files.close()
+    if state_store is not None:
+        state_store.clear_cursor(mapping['source_cid'])
+
+
+async def scan_mappings_async(groups, total, scheduler, min_size_bytes):
+    """在同一个事件循环中并发遍历所有扫描组，同时遍历的源目录数不超过 MAPPING_CONCURRENCY"""
+    semaphore = asyncio.Semaphore(MAPPING_CONCURRENCY)
+    return await asyncio.gather(*(
+        scan_mapping_async(group, total, scheduler, min_size_bytes, semaphore)
+        for group in groups
+    ))
+
+
+def run_mapping_round(mapping_cids, min_size_bytes, event_loop=None, all_mappings=None):
+    """
+    执行一轮扫描和移动：源目录相同或嵌套的映射合并为一次遍历，并发遍历所有源目录，
+    由一个移动线程通过公平队列提交
+    
+    参数:
+        mapping_cids: 本轮需要处理的映射信息字典列表
+        min_size_bytes: 最小文件大小（字节）
+        event_loop: 异步引擎使用的事件循环，None 表示使用同步引擎（线程池）
+        all_mappings: 全部映射列表，用于避开本轮未到期的嵌套映射，None 表示只有 mapping_cids
+    
+    返回:
+        list: 每个映射的 (移动统计字典, 是否可以继续运行)
+    """
+    scheduler = FairMoveScheduler(MOVE_BATCH_SIZE, SCAN_QUEUE_SIZE, budget=MOVE_ROUND_BUDGET)
+    move_stats = {}
+    for mapping in mapping_cids:
+        scheduler.add_flow(mapping['index'], mapping.get('priority', 1))
+        move_stats[mapping['index']] = {'success': 0, 'failed': 0}
+    
+    if stability_tracker is not None:
+        stability_tracker.begin_round()
+    
+    groups = plan_scan_groups(mapping_cids, all_mappings)
+    total = len(mapping_cids)
+    
+    mover = threading.Thread(target=fair_move_stage, args=(scheduler, move_stats), daemon=True)
+    mover.start()
+    control.scheduler = scheduler
+    try:
+        if event_loop is not None:
+            scans = event_loop.run_until_complete(
+                scan_mappings_async(groups, total, scheduler, min_size_bytes)
+            )
+        else:
+            with ThreadPoolExecutor(max_workers=MAPPING_CONCURRENCY) as executor:
+                scans = list(executor.map(
+                    lambda group: scan_mapping(group, total, scheduler, min_size_bytes),
+                    groups,
+                ))
+    finally:
+        # 确保移动线程在所有队列清空后退出
+        for mapping in mapping_cids:
+            scheduler.close(mapping['index'])
+        mover.join()
+        control.scheduler = None
+    
+    scans_by_index = {
+        mapping['index']: (walker, stats_by_index[mapping['index']], scan_error)
+        for group, (walker, stats_by_index, scan_error) in zip(groups, scans)
+        for mapping in group['members']
+    }
+    results = []
+    for mapping in mapping_cids:
+        walker, file_stats, scan_error = scans_by_index[mapping['index']]
+        file_stats['deferred'] = scheduler.dropped(mapping['index'])
+        stats = move_stats[mapping['index']]
+        ok = report_mapping_result(mapping, walker, file_stats, stats, scan_error, min_size_bytes)
+        results.append((stats, ok))
+    
+    if scheduler.exhausted:
+        logger.info("")
+        logger.info(f"⏸️  本轮移动额度 ({MOVE_ROUND_BUDGET} 个) 已用完，剩余文件下一轮继续移动")
+    
+    if stability_tracker is not None:
+        try:
+            stability_tracker.flush()
+        except Exception as e:
+            logger.warning(f"⚠️  保存文件稳定性记录失败: {e}")
+    
+    # 一轮结束后源目录列表已反映上次的移动，压缩日志
+    if move_journal is not None:
+        move_journal.settled_ids.clear()
+        try:
+            move_journal.compact()
+        except Exception as e:
+            logger.warning(f"⚠️  压缩移动日志失败: {e}")
+    return results
+
+
+def make_target_file_info(info, mapping, rel_dir=''):
+    """
+    将接口返回的文件信息转换为与扫描结果相同格式的字典
+    
+    参数:
+        info: normalize_attr 处理后的文件信息
+        mapping: 映射信息字典
+        rel_dir: 文件所在目录相对源目录的路径
+    
+    返回:
+        dict: 文件信息字典
+    """
+    name = info.get('name', '')
+    rel_path = f"{rel_dir}/{name}" if rel_dir else name
+    return {
+        'id': info['id'],
+        'parent_id': info.get('parent_id'),
+        'name': name,
+        'size': info.get('size', 0),
+        'mtime': info.get('mtime', 0),
+        'sha1': info.get('sha1'),
+        'path': rel_path,
+        'display_path': rel_path,
+    }
+
+
+def relative_dir_in_source(parent_cid, source_cid):
+    """
+    检查目录是否位于源目录之内，并返回相对路径（只请求一次目录的祖先信息）
+    
+    参数:
+        parent_cid: 待检查的目录ID
+        source_cid: 源目录ID
+    
+    返回:
+        str: 相对源目录的路径（源目录本身为空字符串）；不在源目录内时返回 None
+    """
+    if int(parent_cid) == int(source_cid):
+        return ''
+    
+    @with_retry_and_timeout(operation_name=f"查询目录位置 (ID: {parent_cid})")
+    def fetch():
+        return fetch_dir_page({'cid': parent_cid, 'show_dir': 1, 'offset': 0, 'limit': 1})
+    
+    ancestors = fetch().get('path') or []
+    ids = [path_item_cid(item) for item in ancestors]
+    if str(source_cid) not in ids:
+        return None
+    names = [path_item_name(item) for item in ancestors[ids.index(str(source_cid)) + 1:]]
+    return '/'.join(names)
+
+
+def find_file_in_directory(cid, name):
+    """
+    只列举单个目录（不遍历子目录），按名称查找文件
+    
+    参数:
+        cid: 目录ID
+        name: 文件名
+    
+    返回:
+        dict: normalize_attr 处理后的文件信息，找不到时返回 None
+    """
+    offset = 0
+    while True:
+        payload = {'cid': cid, 'show_dir': 0, 'offset': offset, 'limit': SCAN_PAGE_SIZE}
+        
+        @with_retry_and_timeout(operation_name=f"列举目录 (ID: {cid})")
+        def fetch_page():
+            return fetch_dir_page(payload)
+        
+        response = fetch_page()
+        items = [normalize_attr(item) for item in response.get('data') or []]
+        for info in items:
+            if not info.get('is_dir') and info.get('name') == name:
+                return info
+        offset += len(items)
+        if not items or offset >= int(response.get('count') or 0):
+            return None
+
+
+def find_target_files(mapping, name=None, path=None, sha1=None):
+    """
+    在映射的源目录中精确查找文件，不遍历整个目录树
+    
+    - path: 解析所在目录（使用路径缓存）后只列举该目录
+    - name: 使用 fs_search 在源目录中搜索同名文件
+    - sha1: 使用 fs_shasearch 按 SHA1 查找文件
+    name 和 sha1 的结果会校验是否位于源目录之内
+    
+    参数:
+        mapping: 映射信息字典
+        name: 文件名
+        path: 文件路径（相对源目录，或以源目录开头的完整路径）
+        sha1: 文件 SHA1
+    
+    返回:
+        list: 文件信息字典列表
+    """
+    source_cid = mapping['source_cid']
+    
+    if path:
+        source_prefix = mapping['source_path'].rstrip('/') + '/'
+        rel_path = path[len(source_prefix):] if path.startswith(source_prefix) else path.lstrip('/')
+        rel_dir, _, file_name = rel_path.rpartition('/')
+        parent_cid = source_cid
+        if rel_dir:
+            parent_cid = find_directory_by_path(source_prefix + rel_dir)
+            if parent_cid is None:
+                return []
+        info = find_file_in_directory(parent_cid, file_name)
+        return [make_target_file_info(info, mapping, rel_dir)] if info else []
+    
+    if sha1:
+        @with_retry_and_timeout(operation_name=f"按SHA1查找文件 {sha1}")
+        def search():
+            return client.fs_shasearch(sha1.upper())
+        
+        response = search()
+        candidates = [response['data']] if response.get('state') and response.get('data') else []
+    elif name:
+        @with_retry_and_timeout(operation_name=f"搜索文件 {name}")
+        def search():
+            return client.fs_search({'search_value': name, 'cid': source_cid, 'offset': 0, 'limit': 100})
+        
+        response = search()
+        candidates = (response.get('data') or []) if response.get('state') else []
+    else:
+        return []
+    
+    files = []
+    rel_dirs = {}
+    for item in candidates:
+        info = normalize_attr(item)
+        if info.get('is_dir') or (name and info.get('name') != name):
+            continue
+        parent_cid = info.get('parent_id')
+        if parent_cid not in rel_dirs:
+            rel_dirs[parent_cid] = relative_dir_in_source(parent_cid, source_cid)
+        if rel_dirs[parent_cid] is not None:
+            files.append(make_target_file_info(info, mapping, rel_dirs[parent_cid]))
+    return files
 
 
-def find_directory_by_path(path, start_cid=0):
+def move_target_files(mapping, min_size_bytes, name=None, path=None, sha1=None, force=False):
     """
-    根据路径查找目录ID（带超时和重试）
+    精确查找并立即移动指定文件
     
     参数:
-        path: 目录路径，格式如 "/folder1/folder2/folder3"
-        start_cid: 起始目录ID，默认为 0（根目录）
+        mapping: 映射信息字典
+        min_size_bytes: 最小文件大小（字节），force 为真时忽略
+        （映射的过滤规则 'filter' 同样在 force 为真时忽略）
+        name: 文件名
+        path: 文件路径
+        sha1: 文件 SHA1
+        force: 是否忽略大小和过滤规则
     
     返回:
-        int: 目录ID，如果找不到则返回 None
+        dict: {'matched': 匹配数量, 'moved': [...], 'skipped': [...], 'failed': [...]}
     """
-    # 处理路径
-    path = path.strip()
+    files = find_target_files(mapping, name=name, path=path, sha1=sha1)
+    summary = {'matched': len(files), 'moved': [], 'skipped': [], 'failed': []}
     
-    # 如果是空路径或只有 /，返回根目录
-    if not path or path == '/':
-        return 0
+    to_move = []
+    file_filter = mapping.get('filter')
+    for file_info in files:
+        if not force and (file_info['size'] < min_size_bytes or (
+                file_filter is not None
+                and not file_filter.matches(file_info['path'], file_info['size'], file_info.get('mtime')))):
+            summary['skipped'].append(file_info['display_path'])
+            continue
+        to_move.append(file_info)
     
-    # 移除开头和结尾的斜杠
-    path = path.strip('/')
+    if to_move:
+        stats = {'success': 0, 'failed': 0}
+        files_by_target = {}
+        for file_info in to_move:
+            route = select_route(mapping, file_info)
+            file_info['target_cid'] = route['target_cid']
+            files_by_target.setdefault((route['target_cid'], route['target_path']), []).append(file_info['id'])
+        outcomes = {}
+        for (target_cid, target_path), file_ids in files_by_target.items():
+            logger.info(f"🎯 映射 {mapping['index']}: 精确移动 {len(file_ids)} 个文件 ➜ {target_path}")
+            outcomes.update(move_files_batch(file_ids, target_cid))
+            dir_cache.invalidate(target_cid)
+        for file_info in to_move:
+            dir_cache.invalidate(file_info.get('parent_id'))
+            outcome = outcomes.get(file_info['id'], {'state': False, 'error': '未执行'})
+            if outcome['state']:
+                stats['success'] += 1
+                FILES_MOVED.inc()
+                if stability_tracker is not None:
+                    stability_tracker.forget(file_info['id'])
+                BYTES_MOVED.inc(file_info['size'])
+                summary['moved'].append(file_info['display_path'])
+                logger.info(f"  ✅ {file_info['display_path']} ({format_file_size(file_info['size'])})")
+            else:
+                stats['failed'] += 1
+                FILES_FAILED.inc()
+                summary['failed'].append({'path': file_info['display_path'], 'error': outcome.get('error', '未知错误')})
+                logger.error(f"  ❌ {file_info['display_path']}: {outcome.get('error', '未知错误')}")
+        if stats['success']:
+            trigger_callback()
+    return summary
+
+
+class ControlState:
+    """
+    控制接口与自动任务之间共享的状态
     
-    # 分割路径
-    path_parts = [p for p in path.split('/') if p]
+    记录映射的下次检查时间、最近几轮的结果和接口请求的立即扫描。
+    立即扫描带防抖：同一映射在防抖时间内的重复请求合并为一次，
+    但最迟在第一次请求后 4 倍防抖时间内开始
+    """
     
-    if not path_parts:
-        return start_cid
+    def __init__(self, debounce=DEFAULT_SCAN_DEBOUNCE, history=50):
+        """
+        参数:
+            debounce: 立即扫描的防抖时间（秒）
+            history: 保留的最近轮次数量
+        """
+        self.debounce = debounce
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.mappings = {}
+        self.next_runs = {}
+        self.last_results = {}
+        self.triggers = {}
+        self.rounds = deque(maxlen=history)
+        self.current_round = None
+        self.scheduler = None
+        self.server_thread = None
+        self.min_size_bytes = 0
     
-    current_cid = start_cid
+    def register_mappings(self, mapping_cids, min_size_bytes=0):
+        with self.lock:
+            self.mappings = {mapping['index']: mapping for mapping in mapping_cids}
+            self.min_size_bytes = min_size_bytes
     
-    # 逐层查找
-    for i, folder_name in enumerate(path_parts):
-        current_path = '/' + '/'.join(path_parts[:i+1])
-        logger.info(f"  🔍 查找: {current_path}")
+    def set_next_runs(self, schedule_heap):
+        with self.lock:
+            self.next_runs = {idx: run_at for run_at, idx in schedule_heap}
+    
+    def request_scan(self, indexes):
+        """
+        请求立即扫描
         
-        # 获取当前目录下的所有子目录（带超时和重试）
-        found = False
-        try:
-            @with_retry_and_timeout(operation_name=f"扫描目录 {current_path}")
-            def scan_subdirs():
-                for dir_info in iter_dirs(
-                    client=client, cid=current_cid, max_workers=0, **get_ios_ua_app()
-                ):
-                    if dir_info.get('name') == folder_name:
-                        return dir_info.get('id')
-                return None
-            
-            result_cid = scan_subdirs()
-            if result_cid:
-                current_cid = result_cid
-                found = True
-                logger.info(f"     ✓ 找到 (ID: {current_cid})")
-                
-        except Exception as e:
-            logger.error(f"     ✗ 查询目录时出错: {e}")
-            return None
+        参数:
+            indexes: 映射序号列表
         
-        if not found:
-            logger.error(f"     ✗ 未找到目录: {folder_name}")
-            logger.error(f"     提示: 请检查路径是否正确（区分大小写）")
-            return None
+        返回:
+            float: 预计开始扫描的时间戳
+        """
+        now = time.time()
+        with self.lock:
+            for idx in indexes:
+                first, _ = self.triggers.get(idx, (now, now))
+                self.triggers[idx] = (first, min(now + self.debounce, first + self.debounce * 4))
+            due = max(self.triggers[idx][1] for idx in indexes)
+        self.wake.set()
+        return due
     
-    return current_cid
+    def pop_due_triggers(self, now):
+        """取出已到防抖时间的立即扫描请求，返回映射序号列表"""
+        with self.lock:
+            due = [idx for idx, (_, run_at) in self.triggers.items() if run_at <= now]
+            for idx in due:
+                del self.triggers[idx]
+            return due
+    
+    def next_trigger_time(self):
+        with self.lock:
+            return min((run_at for _, run_at in self.triggers.values()), default=None)
+    
+    def wait(self, timeout):
+        """
+        等待到下一次检查；控制接口开启时可被立即扫描请求提前唤醒
+        
+        参数:
+            timeout: 最长等待秒数
+        """
+        timeout = max(timeout, 0)
+        if self.server_thread is None:
+            time.sleep(timeout)
+            return
+        self.wake.wait(timeout)
+        self.wake.clear()
+    
+    def round_started(self, run_count, indexes, reason):
+        with self.lock:
+            self.current_round = {'round': run_count, 'mappings': indexes, 'reason': reason,
+                                  'started': time.time()}
+    
+    def round_finished(self, due_mappings, results):
+        with self.lock:
+            info = self.current_round or {}
+            self.current_round = None
+            finished = time.time()
+            info.update({
+                'finished': finished,
+                'duration': round(finished - info.get('started', finished), 3),
+                'moved': sum(stats['success'] for stats, _ in results),
+                'failed': sum(stats['failed'] for stats, _ in results),
+            })
+            self.rounds.append(info)
+            ROUNDS.inc(reason=info.get('reason', 'schedule'))
+            ROUND_DURATION.observe(info['duration'])
+            for mapping, (stats, _) in zip(due_mappings, results):
+                self.last_results[mapping['index']] = {'finished': finished, **stats}
+    
+    def status(self):
+        """返回当前运行状态"""
+        scheduler = self.scheduler
+        with self.lock:
+            return {
+                'state': 'running' if self.current_round else 'idle',
+                'current_round': self.current_round,
+                'queue_depth': scheduler.depth() if scheduler is not None else 0,
+                'mappings': [
+                    {
+                        'index': idx,
+                        'source': mapping['source_path'],
+                        'target': mapping['target_path'],
+                        'schedule': mapping['schedule'].describe(),
+                        'next_run': self.next_runs.get(idx),
+                        'scan_requested_at': self.triggers[idx][1] if idx in self.triggers else None,
+                        'last_result': self.last_results.get(idx),
+                    }
+                    for idx, mapping in sorted(self.mappings.items())
+                ],
+            }
+    
+    def recent_rounds(self, limit):
+        with self.lock:
+            return list(self.rounds)[-limit:][::-1]
 
 
-def check_cookie_valid():
+control = ControlState()
+
+metrics.add('p115_move_queue_depth', 'Files waiting in the fair move queue', 'gauge',
+            fn=lambda: control.scheduler.depth() if control.scheduler is not None else 0)
+metrics.add('p115_round_running', 'Whether a check round is in progress', 'gauge',
+            fn=lambda: 1 if control.current_round else 0)
+metrics.add('p115_rate_limiter_rate', 'Current adaptive request rate (requests/second)', 'gauge',
+            fn=lambda: rate_limiter.rate)
+metrics.add('p115_rate_limiter_tokens', 'Tokens currently available in the limiter bucket', 'gauge',
+            fn=lambda: rate_limiter.tokens)
+metrics.add('p115_rate_limiter_throttle_events', 'Throttle events seen by the limiter since start', 'gauge',
+            fn=lambda: rate_limiter.throttle_events)
+metrics.add('p115_dir_cache_entries', 'Directory listings held in the cache', 'gauge',
+            fn=lambda: dir_cache.stats()[2])
+
+
+def create_control_app():
     """
-    检查 Cookie 是否仍然有效
+    创建控制接口应用（blacksheep）
+    
+    接口:
+        POST /scan            立即扫描所有映射
+        POST /scan/{index}    立即扫描指定映射
+        GET  /status          运行状态、队列深度和各映射的下次检查时间
+        GET  /rounds?limit=N  最近几轮的结果
+        GET  /metrics         Prometheus 格式的监控指标
+        POST /move            按文件名、路径或SHA1精确移动文件，
+                              请求体: {"mapping": 1, "name"|"path"|"sha1": "...", "force": false}
     
     返回:
-        bool: True 表示有效，False 表示失效
+        Application: blacksheep 应用
     """
-    try:
-        user_info = client.user_info()
-        if user_info and user_info.get('state'):
-            return True
-        else:
-            return False
-    except Exception as e:
-        logger.error(f"检查 Cookie 状态时出错: {e}")
-        return False
+    from blacksheep import Application, Content, Request, Response, json as json_response
+    
+    app = Application()
+    
+    @app.middlewares.append
+    async def check_token(request, handler):
+        if CONTROL_TOKEN:
+            auth = request.get_first_header(b'Authorization') or b''
+            token = request.query.get('token', [''])[0]
+            if auth.decode() != f"Bearer {CONTROL_TOKEN}" and token != CONTROL_TOKEN:
+                return json_response({'error': 'unauthorized'}, status=401)
+        return await handler(request)
+    
+    def accepted(indexes):
+        due = control.request_scan(indexes)
+        return json_response({'accepted': indexes, 'scan_at': due}, status=202)
+    
+    @app.router.post('/scan')
+    async def scan_all(request: Request):
+        return accepted(sorted(control.mappings))
+    
+    @app.router.post('/scan/{index}')
+    async def scan_one(request: Request, index: int):
+        if index not in control.mappings:
+            return json_response({'error': f'映射 {index} 不存在'}, status=404)
+        return accepted([index])
+    
+    @app.router.post('/move')
+    async def move(request: Request):
+        try:
+            body = await request.json() or {}
+        except Exception:
+            return json_response({'error': '请求体必须是 JSON'}, status=400)
+        if not isinstance(body, dict):
+            return json_response({'error': '请求体必须是 JSON 对象'}, status=400)
+        try:
+            index = int(body.get('mapping', 1))
+        except (TypeError, ValueError):
+            return json_response({'error': f"mapping 必须是映射序号: {body.get('mapping')}"}, status=400)
+        mapping = control.mappings.get(index)
+        if mapping is None:
+            return json_response({'error': f"映射 {index} 不存在"}, status=404)
+        if any(body.get(key) is not None and not isinstance(body[key], str) for key in ('name', 'path', 'sha1')):
+            return json_response({'error': 'name、path 和 sha1 必须是字符串'}, status=400)
+        if not any(body.get(key) for key in ('name', 'path', 'sha1')):
+            return json_response({'error': '需要 name、path 或 sha1 之一'}, status=400)
+        try:
+            summary = await asyncio.to_thread(
+                move_target_files, mapping, control.min_size_bytes,
+                name=body.get('name'), path=body.get('path'), sha1=body.get('sha1'),
+                force=bool(body.get('force')),
+            )
+        except Exception as e:
+            logger.error(f"❌ 精确移动失败: {e}")
+            return json_response({'error': str(e)}, status=502)
+        return json_response(summary, status=200 if summary['matched'] else 404)
+    
+    @app.router.get('/metrics')
+    async def metrics_endpoint(request: Request):
+        return Response(200, [(b'Content-Type', b'text/plain; version=0.0.4; charset=utf-8')],
+                        Content(b'text/plain', metrics.render().encode()))
+    
+    @app.router.get('/status')
+    async def status(request: Request):
+        return json_response(control.status())
+    
+    @app.router.get('/rounds')
+    async def rounds(request: Request):
+        try:
+            limit = int(request.query.get('limit', ['20'])[0])
+        except ValueError:
+            limit = 20
+        return json_response({'rounds': control.recent_rounds(max(1, min(limit, 50)))})
+    
+    return app
 
 
-def move_files(file_ids, target_pid=0):
+def start_control_server():
     """
-    移动文件或目录到指定目录（带重试机制）
-    
-    参数:
-        file_ids: 文件或目录ID
-        target_pid: 目标目录ID，默认为 0（根目录）
+    在后台线程中启动控制接口（uvicorn）
     
     返回:
-        dict: API 返回的结果
+        bool: 是否启动成功
     """
-    @with_retry_and_timeout(operation_name="移动文件")
-    def do_move():
-        result = client.fs_move(file_ids, pid=target_pid)
-        
-        # 检查是否因为 Cookie 失效导致的错误
-        if not result.get('state'):
-            error_msg = result.get('error', result.get('error_msg', ''))
-            # 常见的认证失败错误码或消息
-            if 'login' in error_msg.lower() or 'auth' in error_msg.lower() or result.get('errno') == 99:
-                logger.error("=" * 80)
-                logger.error("❌ 检测到 Cookie 可能已失效！")
-                logger.error("=" * 80)
-                logger.error("")
-                logger.error("请执行以下步骤更新 Cookie：")
-                logger.error("  1. 访问 https://115.com 重新登录")
-                logger.error("  2. 按 F12 打开开发者工具获取新的 Cookie")
-                logger.error("  3. 更新 docker-compose.yml 中的 COOKIE 环境变量")
-                logger.error("  4. 重启容器: docker-compose restart")
-                logger.error("")
-                logger.error("=" * 80)
-                # 抛出异常以便上层识别为认证错误
-                raise Exception(f"Cookie失效: {error_msg}")
-        
-        return result
-    
     try:
-        return do_move()
-    except Exception as e:
-        logger.error(f"移动文件时发生错误: {e}")
-        return {'state': False, 'error': str(e)}
+        import uvicorn
+        app = create_control_app()
+    except ImportError as e:
+        logger.error(f"❌ 无法启动控制接口，缺少依赖: {e}")
+        return False
+    
+    server = uvicorn.Server(uvicorn.Config(app, host=CONTROL_HOST, port=CONTROL_PORT, log_level='warning'))
+    control.server_thread = threading.Thread(target=server.run, name='control-api', daemon=True)
+    control.server_thread.start()
+    logger.info(f"🛰️  控制接口已启动: http://{CONTROL_HOST}:{CONTROL_PORT}"
+                f"{'（需要令牌）' if CONTROL_TOKEN else ''}")
+    return True
 
 
 def init_client_from_env():
@@ -582,7 +4406,7 @@ def init_client_from_env():
     # 验证cookie
     try:
         logger.info("🔄 正在验证Cookie...")
-        client = P115Client(cookie_env)
+        client = instrument_client(P115Client(cookie_env))
         
         # 测试连接 - 尝试获取用户信息（更快更可靠）
         try:
@@ -657,64 +4481,88 @@ def init_client_from_env():
         return None
 
 
-def auto_move_files_task(path_mappings, interval_minutes, min_size_bytes, exclude_extensions):
+def auto_move_files_task(path_mappings, interval_minutes, min_size_bytes, file_filters, route_tables=None):
     """
     自动移动文件任务（支持多组路径映射）
     
     参数:
-        path_mappings: 路径映射列表 [(源路径, 目标路径), ...]
+        path_mappings: 路径映射列表 [(源路径, 目标路径, 选项字典), ...]
         interval_minutes: 检查间隔（分钟）
         min_size_bytes: 最小文件大小（字节）
-        exclude_extensions: 排除的文件后缀集合
+        file_filters: 过滤规则 {规则名称: FileFilter}，见 load_filter_rules
+        route_tables: 分流规则，见 load_route_tables
     """
+    route_tables = route_tables or {}
     logger.info("=" * 80)
     logger.info("🚀 自动移动文件任务启动")
     logger.info("=" * 80)
     logger.info(f"📊 配置信息:")
     logger.info(f"   ├─ 映射数量: {len(path_mappings)} 组")
-    logger.info(f"   ├─ 检查间隔: {interval_minutes} 分钟")
+    logger.info(f"   ├─ 检查间隔: {interval_minutes} 分钟（未单独设置检查计划的映射）")
     logger.info(f"   ├─ 最小文件: {format_file_size(min_size_bytes)}")
-    if exclude_extensions:
-        logger.info(f"   └─ 排除后缀: {', '.join(sorted(exclude_extensions))}")
-    else:
-        logger.info(f"   └─ 排除后缀: 无")
+    engine_name = '异步' if ENGINE == 'async' else '同步'
+    logger.info(f"   ├─ 执行引擎: {engine_name}（最多同时扫描 {MAPPING_CONCURRENCY} 组映射）")
+    if MOVE_ROUND_BUDGET:
+        logger.info(f"   ├─ 每轮移动额度: {MOVE_ROUND_BUDGET} 个文件")
+    logger.info(f"   └─ 过滤规则: {file_filters['default'].describe()}")
     logger.info("")
     
-    for idx, (src, tgt) in enumerate(path_mappings, 1):
+    for idx, (src, tgt, _) in enumerate(path_mappings, 1):
         logger.info(f"📁 映射 {idx}: {src} ➜ {tgt}")
     logger.info("=" * 80)
     
-    # 解析所有路径映射
+    # 解析所有路径映射（共享前缀的路径只列举一次）
     mapping_cids = []
     failed_mappings = []
     
-    for idx, (source_path, target_path) in enumerate(path_mappings, 1):
-        logger.info(f"\n🔄 正在解析映射 {idx}/{len(path_mappings)}: {source_path} ➜ {target_path}")
-        
-        logger.info(f"📂 解析源目录: {source_path}")
-        source_cid = find_directory_by_path(source_path)
+    logger.info(f"\n🔄 正在解析 {len(path_mappings)} 组映射涉及的目录...")
+    all_paths = [path for source, target, _ in path_mappings for path in (source, target)]
+    all_paths += [route['target_path'] for _, _, options in path_mappings
+                  for route in route_tables.get(options.get('routes'), [])]
+    resolved = resolve_paths(all_paths)
+    
+    for idx, (source_path, target_path, options) in enumerate(path_mappings, 1):
+        source_cid = resolved.get(source_path)
+        target_cid = resolved.get(target_path)
         
         if source_cid is None:
-            logger.error(f"❌ 无法找到源目录，跳过此映射")
+            logger.error(f"❌ 映射 {idx}: 无法找到源目录 {source_path}，跳过此映射")
             failed_mappings.append((source_path, target_path, "源目录不存在"))
             continue
         
-        logger.info(f"📂 解析目标目录: {target_path}")
-        target_cid = find_directory_by_path(target_path)
-        
         if target_cid is None:
-            logger.error(f"❌ 无法找到目标目录，跳过此映射")
+            logger.error(f"❌ 映射 {idx}: 无法找到目标目录 {target_path}，跳过此映射")
             failed_mappings.append((source_path, target_path, "目标目录不存在"))
             continue
         
+        routes = build_mapping_routes(options, route_tables, resolved, idx)
+        if routes is None:
+            logger.error(f"❌ 映射 {idx}: 分流目标目录不存在，跳过此映射")
+            failed_mappings.append((source_path, target_path, "分流目标目录不存在"))
+            continue
+        
         mapping_cids.append({
             'index': idx,
             'source_path': source_path,
             'target_path': target_path,
             'source_cid': source_cid,
-            'target_cid': target_cid
+            'target_cid': target_cid,
+            'priority': options.get('priority', 1),
+            'filter': file_filters.get(options.get('rules', 'default'), file_filters['default']),
+            'routes': routes,
+            'schedule': MappingSchedule(
+                interval=options.get('interval', interval_minutes * 60),
+                cron=options.get('cron'),
+                jitter=options.get('jitter', 0),
+                adaptive_range=ADAPTIVE_INTERVAL_RANGE,
+            ),
         })
-        logger.info(f"✅ 映射解析成功")
+        logger.info(f"✅ 映射 {idx}: {source_path} (ID: {source_cid}) ➜ {target_path} (ID: {target_cid})")
+        logger.info(f"   ⏱️  检查计划: {mapping_cids[-1]['schedule'].describe()}")
+        if 'rules' in options:
+            logger.info(f"   🧮 过滤规则 [{mapping_cids[-1]['filter'].name}]: {mapping_cids[-1]['filter'].describe()}")
+        for route in routes:
+            logger.info(f"   🔀 分流: {route['rule']} ➜ {route['target_path']} (ID: {route['target_cid']})")
     
     logger.info("")
     logger.info("=" * 80)
@@ -737,15 +4585,42 @@ def auto_move_files_task(path_mappings, interval_minutes, min_size_bytes, exclud
     
     logger.info("=" * 80)
     
-    # 开始循环检查
+    # 开始循环检查：按各映射的检查计划，从优先队列中取出到期的映射
     run_count = 0
-    interval_seconds = interval_minutes * 60
     total_moved = 0
     total_failed = 0
     cookie_check_interval = 10  # 每10轮检查一次 Cookie
+    # 异步引擎在整个任务期间复用同一个事件循环
+    event_loop = asyncio.new_event_loop() if ENGINE == 'async' else None
+    mappings_by_index = {mapping['index']: mapping for mapping in mapping_cids}
+    start_time = time.time()
+    schedule_bases = {mapping['index']: start_time for mapping in mapping_cids}
+    schedule_heap = [(start_time, mapping['index']) for mapping in mapping_cids]
+    heapq.heapify(schedule_heap)
+    control.register_mappings(mapping_cids, min_size_bytes)
+    control.set_next_runs(schedule_heap)
     
     try:
         while True:
+            # 取出所有到期的映射和接口请求立即扫描的映射，都没有时等待
+            now = time.time()
+            triggered = set(control.pop_due_triggers(now))
+            due_indexes = set(triggered)
+            reason = 'api' if triggered else 'schedule'
+            while schedule_heap and schedule_heap[0][0] <= now:
+                due_indexes.add(heapq.heappop(schedule_heap)[1])
+            if not due_indexes:
+                next_trigger = control.next_trigger_time()
+                wake_at = min(schedule_heap[0][0], next_trigger or schedule_heap[0][0])
+                control.wait(wake_at - now)
+                continue
+            # 立即扫描的映射从计划中移除，扫描后按本次开始时间重新计划
+            schedule_heap = [entry for entry in schedule_heap if entry[1] not in due_indexes]
+            heapq.heapify(schedule_heap)
+            for idx in triggered:
+                schedule_bases[idx] = now
+            due_mappings = [mappings_by_index[idx] for idx in sorted(due_indexes)]
+            
             run_count += 1
             
             # 定期检查 Cookie 是否有效
@@ -777,151 +4652,43 @@ def auto_move_files_task(path_mappings, interval_minutes, min_size_bytes, exclud
             logger.info("=" * 80)
             logger.info(f"🔄 第 {run_count} 次检查开始")
             logger.info(f"⏰ 时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            logger.info(f"📋 到期映射: {', '.join(str(mapping['index']) for mapping in due_mappings)}"
+                        f"{'（接口请求立即扫描）' if reason == 'api' else ''}")
+            control.round_started(run_count, sorted(due_indexes), reason)
             logger.info("=" * 80)
             
             round_moved = 0
             round_failed = 0
             
-            # 处理每个映射
-            for mapping in mapping_cids:
-                idx = mapping['index']
-                source_path = mapping['source_path']
-                target_path = mapping['target_path']
-                source_cid = mapping['source_cid']
-                target_cid = mapping['target_cid']
-                
-                logger.info("")
-                logger.info(f"📦 处理映射 {idx}/{len(mapping_cids)}")
-                logger.info(f"   源: {source_path}")
-                logger.info(f"   ➜  {target_path}")
-                logger.info("-" * 80)
-                
-                try:
-                    # 获取源目录中的文件（带超时和重试）
-                    logger.info(f"🔍 扫描源目录 (ID: {source_cid})...")
-                    files_to_move = []
-                    total_files = 0
-                    excluded_files = 0
-                    small_files = 0
-                    
-                    @with_retry_and_timeout(operation_name=f"扫描文件列表 {source_path}")
-                    def scan_source_files():
-                        result = []
-                        stats = {'total': 0, 'excluded': 0, 'small': 0}
-                        
-                        for file_info in iter_files(
-                            client=client,
-                            cid=source_cid,
-                            cur=0,  # 遍历子目录树
-                            page_size=1000,
-                            **get_ios_ua_app(),
-                        ):
-                            stats['total'] += 1
-                            file_size = file_info.get('size', 0)
-                            file_name = file_info.get('name', '')
-                            file_id = file_info.get('id', '')
-                            file_path = file_info.get('path', '')
-                            
-                            # 如果path为空，使用name作为显示
-                            display_path = file_path if file_path else file_name
-                            
-                            # 检查是否应该排除该文件
-                            if should_exclude_file(file_name, exclude_extensions):
-                                stats['excluded'] += 1
-                                continue
-                            
-                            # 检查文件大小
-                            if file_size >= min_size_bytes:
-                                result.append({
-                                    'id': file_id,
-                                    'name': file_name,
-                                    'size': file_size,
-                                    'path': file_path,
-                                    'display_path': display_path
-                                })
-                                logger.info(f"  ✓ {display_path} ({format_file_size(file_size)})")
-                            else:
-                                stats['small'] += 1
-                        
-                        return result, stats
-                    
-                    try:
-                        files_to_move, file_stats = scan_source_files()
-                        total_files = file_stats['total']
-                        excluded_files = file_stats['excluded']
-                        small_files = file_stats['small']
-                    except Exception as e:
-                        error_str = str(e).lower()
-                        if 'login' in error_str or 'auth' in error_str or 'cookie' in error_str:
-                            logger.error("")
-                            logger.error("=" * 80)
-                            logger.error("❌ 扫描文件时检测到 Cookie 已失效！")
-                            logger.error("=" * 80)
-                            logger.error("")
-                            logger.error("请立即更新 Cookie 并重启容器")
-                            logger.error("详细步骤请查看上方日志")
-                            logger.error("=" * 80)
-                            return False
-                        else:
-                            # 其他错误（包括超时）记录后继续处理下一个映射
-                            logger.error(f"❌ 扫描目录失败: {e}")
-                            logger.warning(f"⚠️  跳过此映射，继续处理下一个...")
-                            continue
-                    
-                    logger.info("")
-                    logger.info(f"📊 扫描完成:")
-                    logger.info(f"   ├─ 总文件数: {total_files}")
-                    if small_files > 0:
-                        logger.info(f"   ├─ 过小文件: {small_files} (< {format_file_size(min_size_bytes)})")
-                    if excluded_files > 0:
-                        logger.info(f"   ├─ 排除文件: {excluded_files} (后缀过滤)")
-                    logger.info(f"   └─ 待移动: {len(files_to_move)}")
-                    
-                    # 移动文件
-                    if files_to_move:
-                        logger.info("")
-                        logger.info(f"📤 开始移动 {len(files_to_move)} 个文件...")
-                        logger.info("-" * 80)
-                        
-                        success_count = 0
-                        fail_count = 0
-                        
-                        for file_info in files_to_move:
-                            try:
-                                display_info = file_info.get('display_path') or file_info.get('name', '未知文件')
-                                size_info = format_file_size(file_info['size'])
-                                logger.info(f"  ➜ {display_info}")
-                                logger.info(f"     大小: {size_info}, ID: {file_info['id']}")
-                                
-                                result = move_files(file_info['id'], target_cid)
-                                
-                                if result.get('state'):
-                                    success_count += 1
-                                    logger.info(f"     ✅ 成功")
-                                else:
-                                    fail_count += 1
-                                    error_msg = result.get('error', result.get('error_msg', '未知错误'))
-                                    logger.error(f"     ❌ 失败: {error_msg}")
-                                
-                                # 添加小延迟，避免请求过快
-                                time.sleep(0.5)
-                                
-                            except Exception as e:
-                                fail_count += 1
-                                logger.error(f"     ❌ 异常: {e}")
-                        
-                        logger.info("")
-                        logger.info(f"📈 移动结果: ✅ 成功 {success_count} | ❌ 失败 {fail_count}")
-                        round_moved += success_count
-                        round_failed += fail_count
-                    else:
-                        logger.info("")
-                        logger.info("💤 没有符合条件的文件需要移动")
-                    
-                except Exception as e:
-                    logger.error(f"❌ 处理映射时发生错误: {e}")
-                    import traceback
-                    logger.error(f"详细错误:\n{traceback.format_exc()}")
+            # 重新解析上一轮移动时发现已不存在的目标目录（包括分流目标）
+            for target in (target for mapping in mapping_cids for target in [mapping, *mapping['routes']]):
+                if target['target_cid'] not in stale_target_cids:
+                    continue
+                logger.info(f"📂 重新解析目标目录: {target['target_path']}")
+                new_target_cid = find_directory_by_path(target['target_path'])
+                if new_target_cid is None:
+                    logger.error(f"❌ 目标目录仍不存在: {target['target_path']}")
+                else:
+                    target['target_cid'] = new_target_cid
+                    logger.info(f"✅ 目标目录已更新 (ID: {new_target_cid})")
+            stale_target_cids.clear()
+            
+            # 并发扫描所有映射，通过公平队列交替移动各映射的文件
+            results = run_mapping_round(due_mappings, min_size_bytes, event_loop, mapping_cids)
+            control.round_finished(due_mappings, results)
+            
+            for move_stats, ok in results:
+                round_moved += move_stats['success']
+                round_failed += move_stats['failed']
+            if not all(ok for _, ok in results):
+                return False
+            
+            # 自适应间隔：有文件移动时缩短间隔，没有文件时指数退避
+            for mapping, (move_stats, _) in zip(due_mappings, results):
+                schedule = mapping['schedule']
+                if schedule.observe(move_stats['success']):
+                    logger.info(f"📐 映射 {mapping['index']}: 本轮移动 {move_stats['success']} 个，"
+                                f"下次间隔 {schedule.interval / 60:g} 分钟")
             
             # 本轮统计
             total_moved += round_moved
@@ -931,20 +4698,34 @@ def auto_move_files_task(path_mappings, interval_minutes, min_size_bytes, exclud
             logger.info("=" * 80)
             logger.info(f"📊 本轮统计: ✅ 移动 {round_moved} 个 | ❌ 失败 {round_failed} 个")
             logger.info(f"📊 总计统计: ✅ 已移动 {total_moved} 个 | ❌ 失败 {total_failed} 个")
+            current_rate, round_throttles, total_throttles = rate_limiter.pop_round_stats()
+            logger.info(f"🚦 请求速率: {current_rate:.2f} 次/秒 | 本轮限流 {round_throttles} 次 | 累计限流 {total_throttles} 次")
+            cache_hits, cache_misses, cache_size = dir_cache.stats()
+            logger.info(f"🗃️  目录缓存: 命中 {cache_hits} 次 | 未命中 {cache_misses} 次 | 缓存 {cache_size} 个目录")
             
             # 如果本轮有文件移动，触发回调
             if round_moved > 0:
                 trigger_callback()
             
+            # 按开始时间计算各映射的下一次检查
+            now = time.time()
+            for mapping in due_mappings:
+                idx = mapping['index']
+                schedule = mapping['schedule']
+                schedule_bases[idx] = schedule.next_base(schedule_bases[idx], now)
+                heapq.heappush(schedule_heap, (schedule.jittered(schedule_bases[idx]), idx))
+            control.set_next_runs(schedule_heap)
+            
             # 等待下一次检查
-            next_check_time = datetime.now().timestamp() + interval_seconds
+            next_check_time = schedule_heap[0][0]
             next_check_str = datetime.fromtimestamp(next_check_time).strftime('%Y-%m-%d %H:%M:%S')
+            next_indexes = sorted(idx for run_at, idx in schedule_heap if run_at <= next_check_time + 1)
             
-            logger.info(f"⏰ 下次检查: {next_check_str}")
-            logger.info(f"😴 等待 {interval_minutes} 分钟...")
+            logger.info(f"⏰ 下次检查: {next_check_str}（映射 {', '.join(map(str, next_indexes))}）")
+            logger.info(f"😴 等待 {max(next_check_time - now, 0) / 60:.1f} 分钟...")
             logger.info("=" * 80)
             
-            time.sleep(interval_seconds)
+            control.wait(next_check_time - time.time())
             
     except KeyboardInterrupt:
         logger.info("")
@@ -965,12 +4746,81 @@ def auto_move_files_task(path_mappings, interval_minutes, min_size_bytes, exclud
         import traceback
         logger.error(f"详细错误:\n{traceback.format_exc()}")
         return False
+    finally:
+        if event_loop is not None:
+            event_loop.close()
+
+
+def parse_cli_args(argv):
+    """
+    解析命令行参数（不带参数时运行自动模式）
+    
+    精确移动示例:
+        python move_items_docker.py move --mapping 1 --name "电影.mkv"
+        python move_items_docker.py move --mapping 2 --sha1 0123ABCD...
+    """
+    parser = argparse.ArgumentParser(description="115网盘文件移动工具 - Docker版本")
+    subparsers = parser.add_subparsers(dest='command')
+    move_parser = subparsers.add_parser('move', help="按文件名、路径或SHA1精确移动文件")
+    move_parser.add_argument('--mapping', type=int, default=1, help="映射序号（默认 1）")
+    target = move_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--name', help="文件名（在源目录中搜索）")
+    target.add_argument('--path', help="文件路径（相对源目录）")
+    target.add_argument('--sha1', help="文件 SHA1")
+    move_parser.add_argument('--force', action='store_true', help="忽略大小和后缀过滤")
+    return parser.parse_args(argv)
+
+
+def run_move_command(args, path_mappings, min_size_bytes, file_filters, route_tables=None):
+    """
+    执行命令行精确移动
+    
+    返回:
+        int: 退出码
+    """
+    if not 1 <= args.mapping <= len(path_mappings):
+        logger.error(f"❌ 映射 {args.mapping} 不存在（共 {len(path_mappings)} 组）")
+        return 1
+    source_path, target_path, options = path_mappings[args.mapping - 1]
+    route_tables = route_tables or {}
+    route_paths = [route['target_path'] for route in route_tables.get(options.get('routes'), [])]
+    resolved = resolve_paths([source_path, target_path] + route_paths)
+    if source_path not in resolved or target_path not in resolved:
+        logger.error(f"❌ 无法解析映射 {args.mapping}: {source_path} ➜ {target_path}")
+        return 1
+    routes = build_mapping_routes(options, route_tables, resolved, args.mapping)
+    if routes is None:
+        return 1
+    mapping = {
+        'index': args.mapping,
+        'source_path': source_path,
+        'target_path': target_path,
+        'source_cid': resolved[source_path],
+        'target_cid': resolved[target_path],
+        'filter': file_filters.get(options.get('rules', 'default'), file_filters['default']),
+        'routes': routes,
+    }
+    summary = move_target_files(mapping, min_size_bytes,
+                                name=args.name, path=args.path, sha1=args.sha1, force=args.force)
+    if not summary['matched']:
+        logger.error("❌ 没有找到匹配的文件")
+        return 1
+    for display_path in summary['skipped']:
+        logger.warning(f"⚠️  已跳过（不符合大小或过滤规则，可使用 --force）: {display_path}")
+    logger.info(f"📈 精确移动: ✅ 成功 {len(summary['moved'])} | ❌ 失败 {len(summary['failed'])}")
+    return 1 if summary['failed'] else 0
 
 
-def main():
+def main(argv=None):
     """主函数 - Docker版本"""
     
-    global DEFAULT_API_TIMEOUT, DEFAULT_API_RETRY_TIMES, BARK_URL, CALLBACK_URL
+    global DEFAULT_API_TIMEOUT, DEFAULT_API_RETRY_TIMES, BARK_URL, CALLBACK_URL, MOVE_BATCH_SIZE, MOVE_BISECT
+    global API_CONNECT_TIMEOUT, API_READ_TIMEOUT
+    global rate_limiter, state_store, move_journal, stability_tracker, INCREMENTAL_SCAN, SCAN_QUEUE_SIZE, dir_cache
+    global SIZE_ORDERED_SCAN, SCAN_FILE_TYPE, ENGINE, MAPPING_CONCURRENCY, SCAN_WORKERS, MOVE_ROUND_BUDGET
+    global ADAPTIVE_INTERVAL_RANGE, CONTROL_HOST, CONTROL_PORT, CONTROL_TOKEN
+    
+    args = parse_cli_args(sys.argv[1:] if argv is None else argv)
     
     # 读取环境变量
     source_path = os.environ.get('SOURCE_PATH', '').strip()
@@ -980,11 +4830,48 @@ def main():
     check_interval = os.environ.get('CHECK_INTERVAL', '5').strip()
     min_file_size = os.environ.get('MIN_FILE_SIZE', '200MB').strip()
     log_retention_days = os.environ.get('LOG_RETENTION_DAYS', '7').strip()
+    adaptive_interval = os.environ.get('ADAPTIVE_INTERVAL', 'false').strip().lower()
+    adaptive_interval_min = os.environ.get('ADAPTIVE_INTERVAL_MIN', '2').strip()
+    adaptive_interval_max = os.environ.get('ADAPTIVE_INTERVAL_MAX', '60').strip()
+    control_port = os.environ.get('CONTROL_PORT', '').strip()
+    control_host = os.environ.get('CONTROL_HOST', CONTROL_HOST).strip()
+    control_token = os.environ.get('CONTROL_TOKEN', '').strip()
+    scan_debounce = os.environ.get('SCAN_DEBOUNCE', str(DEFAULT_SCAN_DEBOUNCE)).strip()
     mode = os.environ.get('MODE', 'auto').strip().lower()
+    if args.command == 'move':
+        mode = 'move'
     
     # 读取超时和重试配置
     api_timeout = os.environ.get('API_TIMEOUT', str(DEFAULT_API_TIMEOUT)).strip()
     api_retry_times = os.environ.get('API_RETRY_TIMES', str(DEFAULT_API_RETRY_TIMES)).strip()
+    api_connect_timeout = os.environ.get('API_CONNECT_TIMEOUT', str(DEFAULT_API_CONNECT_TIMEOUT)).strip()
+    api_read_timeout = os.environ.get('API_READ_TIMEOUT', str(DEFAULT_API_READ_TIMEOUT)).strip()
+    
+    # 读取批量移动配置
+    move_batch_size = os.environ.get('MOVE_BATCH_SIZE', str(DEFAULT_MOVE_BATCH_SIZE)).strip()
+    move_bisect = os.environ.get('MOVE_BISECT', 'true').strip().lower()
+    move_round_budget = os.environ.get('MOVE_ROUND_BUDGET', '0').strip()
+    
+    # 读取限流配置
+    api_rate = os.environ.get('API_RATE', str(DEFAULT_API_RATE)).strip()
+    api_rate_min = os.environ.get('API_RATE_MIN', str(DEFAULT_API_RATE_MIN)).strip()
+    api_rate_max = os.environ.get('API_RATE_MAX', str(DEFAULT_API_RATE_MAX)).strip()
+    
+    # 读取增量扫描配置
+    incremental_scan = os.environ.get('INCREMENTAL_SCAN', 'true').strip().lower()
+    move_journal_enabled = os.environ.get('MOVE_JOURNAL', 'true').strip().lower()
+    stable_scans = os.environ.get('STABLE_SCANS', str(DEFAULT_STABLE_SCANS)).strip()
+    stable_seconds = os.environ.get('STABLE_SECONDS', str(DEFAULT_STABLE_SECONDS)).strip()
+    scan_queue_size = os.environ.get('SCAN_QUEUE_SIZE', str(DEFAULT_SCAN_QUEUE_SIZE)).strip()
+    size_ordered_scan = os.environ.get('SIZE_ORDERED_SCAN', 'false').strip().lower()
+    engine = os.environ.get('ENGINE', 'sync').strip().lower()
+    mapping_concurrency = os.environ.get('MAPPING_CONCURRENCY', str(DEFAULT_MAPPING_CONCURRENCY)).strip()
+    scan_workers = os.environ.get('SCAN_WORKERS', str(DEFAULT_SCAN_WORKERS)).strip()
+    scan_file_type = os.environ.get('SCAN_FILE_TYPE', '').strip()
+    
+    # 读取目录列表缓存配置
+    dir_cache_size = os.environ.get('DIR_CACHE_SIZE', str(DEFAULT_DIR_CACHE_SIZE)).strip()
+    dir_cache_ttl = os.environ.get('DIR_CACHE_TTL', str(DEFAULT_DIR_CACHE_TTL)).strip()
     
     # 读取Bark通知配置
     bark_url = os.environ.get('BARK_URL', '').strip()
@@ -992,6 +4879,10 @@ def main():
     # 读取回调URL配置
     callback_url = os.environ.get('CALLBACK_URL', '').strip()
     
+    # 读取通知发送配置
+    notify_queue_size = os.environ.get('NOTIFY_QUEUE_SIZE', str(DEFAULT_NOTIFY_QUEUE_SIZE)).strip()
+    notify_coalesce_window = os.environ.get('NOTIFY_COALESCE_WINDOW', str(DEFAULT_NOTIFY_COALESCE_WINDOW)).strip()
+    
     # 设置日志
     try:
         log_days = int(log_retention_days)
@@ -1011,6 +4902,17 @@ def main():
         CALLBACK_URL = callback_url
         logger.info(f"🔔 文件移动回调已启用: {CALLBACK_URL}")
     
+    if bark_url or callback_url:
+        try:
+            notifier.queue = queue.Queue(maxsize=max(1, int(notify_queue_size)))
+        except:
+            logger.warning(f"⚠️  NOTIFY_QUEUE_SIZE 值无效: {notify_queue_size}，使用默认值 {DEFAULT_NOTIFY_QUEUE_SIZE}")
+        try:
+            notifier.coalesce_window = max(0.0, float(notify_coalesce_window))
+        except:
+            logger.warning(f"⚠️  NOTIFY_COALESCE_WINDOW 值无效: {notify_coalesce_window}，"
+                           f"使用默认值 {DEFAULT_NOTIFY_COALESCE_WINDOW} 秒")
+    
     logger.info("")
     logger.info("=" * 80)
     logger.info("🚀 115网盘文件移动工具 - Docker版本")
@@ -1030,6 +4932,23 @@ def main():
     except:
         logger.warning(f"⚠️  API_TIMEOUT 值无效: {api_timeout}，使用默认值 {DEFAULT_API_TIMEOUT} 秒")
     
+    # 解析和设置连接/读取超时
+    try:
+        connect_val = float(api_connect_timeout)
+        if connect_val <= 0:
+            raise ValueError("超时必须为正数")
+        API_CONNECT_TIMEOUT = connect_val
+    except:
+        logger.warning(f"⚠️  API_CONNECT_TIMEOUT 值无效: {api_connect_timeout}，使用默认值 {DEFAULT_API_CONNECT_TIMEOUT} 秒")
+    try:
+        read_val = float(api_read_timeout)
+        if read_val <= 0:
+            raise ValueError("超时必须为正数")
+        API_READ_TIMEOUT = read_val
+    except:
+        logger.warning(f"⚠️  API_READ_TIMEOUT 值无效: {api_read_timeout}，使用默认值 {DEFAULT_API_READ_TIMEOUT} 秒")
+    logger.info(f"⏱️  请求超时: 连接 {API_CONNECT_TIMEOUT:g} 秒 | 读取 {API_READ_TIMEOUT:g} 秒")
+    
     # 解析和设置重试配置
     try:
         retry_val = int(api_retry_times)
@@ -1044,6 +4963,156 @@ def main():
     except:
         logger.warning(f"⚠️  API_RETRY_TIMES 值无效: {api_retry_times}，使用默认值 {DEFAULT_API_RETRY_TIMES} 次")
     
+    # 解析和设置批量移动配置（115 单次移动上限为 5 万个）
+    try:
+        batch_val = int(move_batch_size)
+        if batch_val < 1:
+            logger.warning(f"⚠️  MOVE_BATCH_SIZE 值 {batch_val} 过小，已调整为最小值 1")
+            batch_val = 1
+        elif batch_val > 50000:
+            logger.warning(f"⚠️  MOVE_BATCH_SIZE 值 {batch_val} 过大，已调整为最大值 50000")
+            batch_val = 50000
+        MOVE_BATCH_SIZE = batch_val
+        logger.info(f"📦 批量移动: 每批 {MOVE_BATCH_SIZE} 个文件")
+    except:
+        logger.warning(f"⚠️  MOVE_BATCH_SIZE 值无效: {move_batch_size}，使用默认值 {DEFAULT_MOVE_BATCH_SIZE} 个")
+    
+    MOVE_BISECT = move_bisect not in ('0', 'false', 'no', 'off')
+    logger.info(f"🔪 失败批次二分定位: {'开启' if MOVE_BISECT else '关闭'}")
+    
+    # 解析和设置限流配置
+    try:
+        rate_val = float(api_rate)
+        rate_min_val = float(api_rate_min)
+        rate_max_val = float(api_rate_max)
+        if rate_min_val <= 0 or rate_max_val < rate_min_val:
+            raise ValueError("速率范围无效")
+        rate_limiter = AdaptiveRateLimiter(rate_val, rate_min_val, rate_max_val)
+    except:
+        logger.warning(f"⚠️  API_RATE/API_RATE_MIN/API_RATE_MAX 值无效，使用默认值")
+        rate_limiter = AdaptiveRateLimiter()
+    logger.info(f"🚦 请求限流: 初始 {rate_limiter.rate:.2f} 次/秒（范围 {rate_limiter.min_rate:.2f}-{rate_limiter.max_rate:.2f}）")
+    
+    # 打开持久化状态库（扫描快照等）
+    try:
+        state_store = StateStore(STATE_DB_FILE)
+    except Exception as e:
+        logger.warning(f"⚠️  打开状态库失败（增量扫描不可用）: {e}")
+        state_store = None
+    INCREMENTAL_SCAN = incremental_scan not in ('0', 'false', 'no', 'off') and state_store is not None
+    logger.info(f"🗂️  增量扫描: {'开启' if INCREMENTAL_SCAN else '关闭'}")
+    
+    # 设置文件稳定性判断
+    try:
+        scans_val = max(0, int(stable_scans))
+        seconds_val = max(0, int(parse_duration(stable_seconds)))
+    except:
+        logger.warning(f"⚠️  STABLE_SCANS/STABLE_SECONDS 值无效: {stable_scans}/{stable_seconds}，使用默认值")
+        scans_val, seconds_val = DEFAULT_STABLE_SCANS, DEFAULT_STABLE_SECONDS
+    if scans_val or seconds_val:
+        stability_tracker = FileStabilityTracker(scans_val, seconds_val, state_store)
+        rules = []
+        if scans_val:
+            rules.append(f"连续 {scans_val} 次扫描不变")
+        if seconds_val:
+            rules.append(f"{seconds_val} 秒内未变化")
+        logger.info(f"⏳ 稳定性检查: {' 或 '.join(rules)}后才移动（已跟踪 {len(stability_tracker.entries)} 个文件）")
+    else:
+        logger.info("⏳ 稳定性检查: 关闭")
+    
+    # 打开移动日志
+    if move_journal_enabled not in ('0', 'false', 'no', 'off'):
+        try:
+            move_journal = MoveJournal(MOVE_JOURNAL_FILE)
+            logger.info(f"🧾 移动日志: 开启（{MOVE_JOURNAL_FILE}）")
+        except Exception as e:
+            logger.warning(f"⚠️  打开移动日志失败（重启后无法核对未完成的移动）: {e}")
+            move_journal = None
+    else:
+        logger.info("🧾 移动日志: 关闭")
+    
+    # 解析和设置扫描队列容量
+    try:
+        queue_val = int(scan_queue_size)
+        if queue_val < 1:
+            logger.warning(f"⚠️  SCAN_QUEUE_SIZE 值 {queue_val} 过小，已调整为最小值 1")
+            queue_val = 1
+        SCAN_QUEUE_SIZE = queue_val
+        logger.info(f"🧵 扫描队列: 最多缓存 {SCAN_QUEUE_SIZE} 个待移动文件")
+    except:
+        logger.warning(f"⚠️  SCAN_QUEUE_SIZE 值无效: {scan_queue_size}，使用默认值 {DEFAULT_SCAN_QUEUE_SIZE} 个")
+    
+    # 解析和设置执行引擎
+    if engine in ('sync', 'async'):
+        ENGINE = engine
+    else:
+        logger.warning(f"⚠️  ENGINE 值无效: {engine}，使用同步引擎")
+    try:
+        concurrency_val = int(mapping_concurrency)
+        if concurrency_val < 1:
+            logger.warning(f"⚠️  MAPPING_CONCURRENCY 值 {concurrency_val} 过小，已调整为最小值 1")
+            concurrency_val = 1
+        elif concurrency_val > 32:
+            logger.warning(f"⚠️  MAPPING_CONCURRENCY 值 {concurrency_val} 过大，已调整为最大值 32")
+            concurrency_val = 32
+        MAPPING_CONCURRENCY = concurrency_val
+    except:
+        logger.warning(f"⚠️  MAPPING_CONCURRENCY 值无效: {mapping_concurrency}，使用默认值 {DEFAULT_MAPPING_CONCURRENCY}")
+    if ENGINE == 'async':
+        logger.info(f"⚡ 执行引擎: 异步（最多同时扫描 {MAPPING_CONCURRENCY} 组映射）")
+    else:
+        logger.info(f"⚙️  执行引擎: 同步（最多同时扫描 {MAPPING_CONCURRENCY} 组映射）")
+    
+    # 解析和设置每轮移动额度
+    try:
+        budget_val = int(move_round_budget)
+        if budget_val < 0:
+            raise ValueError("额度不能为负数")
+        MOVE_ROUND_BUDGET = budget_val
+        if MOVE_ROUND_BUDGET:
+            logger.info(f"🎫 每轮移动额度: {MOVE_ROUND_BUDGET} 个文件（各映射按优先级公平分配）")
+    except:
+        logger.warning(f"⚠️  MOVE_ROUND_BUDGET 值无效: {move_round_budget}，不限制每轮移动数量")
+    
+    # 解析和设置扫描并发数
+    try:
+        workers_val = int(scan_workers)
+        if workers_val < 1:
+            logger.warning(f"⚠️  SCAN_WORKERS 值 {workers_val} 过小，已调整为最小值 1")
+            workers_val = 1
+        elif workers_val > 32:
+            logger.warning(f"⚠️  SCAN_WORKERS 值 {workers_val} 过大，已调整为最大值 32")
+            workers_val = 32
+        SCAN_WORKERS = workers_val
+    except:
+        logger.warning(f"⚠️  SCAN_WORKERS 值无效: {scan_workers}，使用默认值 {DEFAULT_SCAN_WORKERS}")
+    logger.info(f"🌲 扫描并发: 每组映射最多同时列举 {SCAN_WORKERS} 个目录")
+    
+    # 解析和设置按大小排序扫描及文件类型过滤
+    SIZE_ORDERED_SCAN = size_ordered_scan in ('1', 'true', 'yes', 'on')
+    logger.info(f"📉 按大小降序扫描: {'开启（遇到小文件即停止翻页）' if SIZE_ORDERED_SCAN else '关闭'}")
+    if scan_file_type:
+        try:
+            type_val = int(scan_file_type)
+            if type_val < 1 or type_val > 7:
+                raise ValueError("文件类型超出范围")
+            SCAN_FILE_TYPE = type_val
+            logger.info(f"🎞️  文件类型过滤: {SCAN_FILE_TYPE}（由115接口过滤）")
+        except:
+            logger.warning(f"⚠️  SCAN_FILE_TYPE 值无效: {scan_file_type}，不进行类型过滤")
+    
+    # 解析和设置目录列表缓存
+    try:
+        cache_size_val = int(dir_cache_size)
+        cache_ttl_val = int(dir_cache_ttl)
+        if cache_size_val < 1 or cache_ttl_val < 0:
+            raise ValueError("缓存配置无效")
+        dir_cache = DirListingCache(cache_size_val, cache_ttl_val)
+    except:
+        logger.warning(f"⚠️  DIR_CACHE_SIZE/DIR_CACHE_TTL 值无效，使用默认值")
+        dir_cache = DirListingCache()
+    logger.info(f"🗃️  目录缓存: 最多 {dir_cache.max_size} 个目录，有效期 {dir_cache.ttl} 秒")
+    
     logger.info("=" * 80)
     
     # 解析路径映射
@@ -1072,12 +5141,13 @@ def main():
             logger.error("  - 路径必须以 '/' 开头")
             logger.error("  - 使用 '->' 分隔源和目标")
             logger.error("  - 使用 ',' 分隔多组映射")
+            logger.error("  - 可用 '|' 附加选项，如 /下载->/视频|priority=3")
             logger.error("=" * 80)
             return 1
     elif source_path and target_path:
         # 使用旧的 SOURCE_PATH 和 TARGET_PATH 配置（兼容）
         logger.info("📋 检测到 SOURCE_PATH/TARGET_PATH 配置（单组映射模式）")
-        path_mappings = [(source_path, target_path)]
+        path_mappings = [(source_path, target_path, {})]
         logger.info(f"✓ 映射 1: {source_path} -> {target_path}")
     else:
         logger.error("")
@@ -1101,11 +5171,26 @@ def main():
     
     logger.info(f"✅ 成功解析 {len(path_mappings)} 组路径映射")
     
-    # 解析排除的文件后缀
+    # 解析排除的文件后缀和过滤规则
     exclude_extensions = parse_exclude_extensions(exclude_extensions_str)
+    file_filters = load_filter_rules(exclude_extensions)
+    if file_filters is None:
+        return 1
+    route_tables = load_route_tables(file_filters)
+    if route_tables is None:
+        return 1
+    for idx, (_, _, options) in enumerate(path_mappings, 1):
+        if options.get('rules', 'default') not in file_filters:
+            logger.error(f"❌ 错误: 映射 {idx} 使用的过滤规则 {options['rules']} 未定义"
+                         f"（需设置环境变量 FILTER_RULES_{options['rules'].upper()}）")
+            return 1
+        if 'routes' in options and options['routes'] not in route_tables:
+            logger.error(f"❌ 错误: 映射 {idx} 使用的分流规则 {options['routes']} 未定义"
+                         f"（需设置环境变量 ROUTES_{options['routes'].upper()}）")
+            return 1
     
     # 验证环境变量
-    if mode == 'auto':
+    if mode in ('auto', 'move'):
         # 解析检查间隔
         try:
             interval_minutes = int(check_interval)
@@ -1118,6 +5203,16 @@ def main():
             logger.error("   必须是数字，单位为分钟")
             return 1
         
+        # 解析自适应检查间隔
+        if adaptive_interval in ('1', 'true', 'yes', 'on'):
+            try:
+                low = max(1, int(adaptive_interval_min))
+                high = max(low, int(adaptive_interval_max))
+                ADAPTIVE_INTERVAL_RANGE = (low * 60, high * 60)
+                logger.info(f"📐 自适应间隔: 开启（有文件时缩短到 {low} 分钟，空闲时逐步延长到 {high} 分钟）")
+            except:
+                logger.warning(f"⚠️  ADAPTIVE_INTERVAL_MIN/MAX 值无效: {adaptive_interval_min}/{adaptive_interval_max}，使用固定间隔")
+        
         # 解析文件大小
         min_size_bytes = parse_file_size(min_file_size)
         if min_size_bytes is None:
@@ -1126,28 +5221,60 @@ def main():
             return 1
         
         logger.info(f"📏 最小文件: {format_file_size(min_size_bytes)}")
+        
+        # 解析控制接口配置
+        if control_port:
+            try:
+                port_val = int(control_port)
+                if port_val < 1 or port_val > 65535:
+                    raise ValueError("端口超出范围")
+                CONTROL_PORT = port_val
+                CONTROL_HOST = control_host or CONTROL_HOST
+                CONTROL_TOKEN = control_token or None
+            except:
+                logger.warning(f"⚠️  CONTROL_PORT 值无效: {control_port}，不启动控制接口")
+            try:
+                control.debounce = max(0.0, float(scan_debounce))
+            except:
+                logger.warning(f"⚠️  SCAN_DEBOUNCE 值无效: {scan_debounce}，使用默认值 {DEFAULT_SCAN_DEBOUNCE} 秒")
     
-    # 初始化客户端
-    logger.info("")
-    if not init_client_from_env():
-        logger.error("")
-        logger.error("=" * 80)
-        logger.error("❌ 程序退出: 客户端初始化失败")
-        logger.error("=" * 80)
-        return 1
-    
-    # 运行自动模式
-    logger.info("")
-    if mode == 'auto':
-        auto_move_files_task(path_mappings, interval_minutes, min_size_bytes, exclude_extensions)
-    else:
-        logger.error("=" * 80)
-        logger.error(f"❌ 错误: 不支持的模式: {mode}")
-        logger.error("=" * 80)
-        logger.error("当前Docker版本仅支持 auto 模式")
-        return 1
-    
-    return 0
+    try:
+        # 初始化客户端
+        logger.info("")
+        if not init_client_from_env():
+            logger.error("")
+            logger.error("=" * 80)
+            logger.error("❌ 程序退出: 客户端初始化失败")
+            logger.error("=" * 80)
+            return 1
+        
+        # 核对上次退出时未完成的移动
+        if move_journal is not None:
+            replay_move_journal()
+        
+        # 启动控制接口
+        if mode == 'auto' and CONTROL_PORT:
+            start_control_server()
+        
+        # 命令行精确移动
+        if mode == 'move':
+            return run_move_command(args, path_mappings, min_size_bytes, file_filters, route_tables)
+        
+        # 运行自动模式
+        logger.info("")
+        if mode == 'auto':
+            auto_move_files_task(path_mappings, interval_minutes, min_size_bytes, file_filters, route_tables)
+        else:
+            logger.error("=" * 80)
+            logger.error(f"❌ 错误: 不支持的模式: {mode}")
+            logger.error("=" * 80)
+            logger.error("当前Docker版本仅支持 auto 模式")
+            return 1
+        
+        return 0
+    finally:
+        # 退出前把已排队的通知发送出去
+        notifier.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,20 @@
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """主模块（日志写入 pytest 捕获，client 等全局状态在用例结束后还原）"""
+    pytest.importorskip('p115client')
+    import move_items_docker
+
+    monkeypatch.setattr(move_items_docker, 'logger', logging.getLogger('move_items_test'))
+    monkeypatch.setattr(move_items_docker, 'client', None)
+    monkeypatch.setattr(move_items_docker, 'state_store', None)
+    monkeypatch.setattr(move_items_docker, 'stability_tracker', None)
+    return move_items_docker
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+
+def post_move(app, monkeypatch, body):
+    pytest.importorskip('blacksheep')
+    from blacksheep.contents import Content
+    from blacksheep.testing import TestClient
+
+    monkeypatch.setattr(app, 'CONTROL_TOKEN', '')
+    monkeypatch.setattr(app.control, 'mappings', {1: {'index': 1}})
+    monkeypatch.setattr(app, 'move_target_files',
+                        lambda mapping, min_size, **kwargs: {'matched': 1, 'moved': 1, 'kwargs': kwargs})
+
+    async def run():
+        control_app = app.create_control_app()
+        await control_app.start()
+        response = await TestClient(control_app).post(
+            '/move', content=Content(b'application/json', body.encode()))
+        return response.status, await response.json()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('body', ['[1, 2]', '"name"', '{"mapping": "x", "name": "a"}',
+                                  '{"name": ["a"]}', '{}', 'not json'])
+def test_move_rejects_bad_bodies(app, monkeypatch, body):
+    status, _ = post_move(app, monkeypatch, body)
+
+    assert status == 400
+
+
+def test_move_accepts_mapping_as_string(app, monkeypatch):
+    status, payload = post_move(app, monkeypatch, '{"mapping": "1", "name": "a.mkv"}')
+
+    assert status == 200
+    assert payload['kwargs']['name'] == 'a.mkv'
+
+
+def test_move_unknown_mapping(app, monkeypatch):
+    status, _ = post_move(app, monkeypatch, '{"mapping": 3, "name": "a.mkv"}')
+
+    assert status == 404
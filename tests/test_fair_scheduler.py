@@ -0,0 +1,64 @@
+import queue
+
+import pytest
+
+
+def drain(scheduler):
+    batches = []
+    while True:
+        picked = scheduler.next_batch()
+        if picked is None:
+            return batches
+        key, batch = picked
+        batches.append((key, len(batch)))
+
+
+def test_batches_are_shared_by_weight(app):
+    scheduler = app.FairMoveScheduler(batch_size=4, capacity=100)
+    scheduler.add_flow('a', weight=3)
+    scheduler.add_flow('b', weight=1)
+    for i in range(12):
+        scheduler.put('a', {'id': i})
+        scheduler.put('b', {'id': 100 + i})
+    scheduler.close('a')
+    scheduler.close('b')
+
+    batches = drain(scheduler)
+
+    # 按 3:1 交替取出；a 取完后只剩 b 在等待，每次取满一批
+    assert batches == [('a', 3), ('b', 1)] * 3 + [('a', 3), ('b', 4), ('b', 4), ('b', 1)]
+
+
+def test_budget_drops_remaining_files(app):
+    scheduler = app.FairMoveScheduler(batch_size=4, capacity=100, budget=5)
+    scheduler.add_flow('a')
+    for i in range(10):
+        scheduler.put('a', {'id': i})
+    scheduler.close('a')
+
+    assert drain(scheduler) == [('a', 4), ('a', 1)]
+    assert scheduler.dropped('a') == 5
+    assert scheduler.put('a', {'id': 99}) is False
+    assert scheduler.depth() == 0
+
+
+def test_partial_batch_is_flushed_after_waiting(app):
+    scheduler = app.FairMoveScheduler(batch_size=4, capacity=100, flush_seconds=0)
+    scheduler.add_flow('a')
+    scheduler.put('a', {'id': 1})
+    scheduler.put('a', {'id': 2})
+
+    key, batch = scheduler.next_batch()
+
+    assert key == 'a'
+    assert [item['id'] for item in batch] == [1, 2]
+
+
+def test_full_queue_blocks_or_raises(app):
+    scheduler = app.FairMoveScheduler(batch_size=4, capacity=2)
+    scheduler.add_flow('a')
+    scheduler.put('a', {'id': 1})
+    scheduler.put('a', {'id': 2})
+
+    with pytest.raises(queue.Full):
+        scheduler.put('a', {'id': 3}, block=False)
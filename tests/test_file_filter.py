@@ -0,0 +1,85 @@
+import pytest
+
+GB = 1024 ** 3
+
+
+def test_empty_rules_accept_everything(app):
+    file_filter = app.FileFilter('')
+
+    assert file_filter.regex is None
+    assert file_filter.matches('a/b.txt', 0, 0)
+    assert file_filter.describe() == '无'
+
+
+def test_glob_matches_name_or_relative_path(app):
+    by_name = app.FileFilter('glob:*.MKV')
+    by_path = app.FileFilter('glob:电影/**/*.mkv')
+
+    assert by_name.matches('电影/2024/a.mkv', 1, 0)
+    assert not by_name.matches('a.mkv.part', 1, 0)
+    assert by_path.matches('电影/2024/a.mkv', 1, 0)
+    assert not by_path.matches('剧集/a.mkv', 1, 0)
+
+
+def test_includes_of_same_kind_are_alternatives_and_kinds_combine(app):
+    file_filter = app.FileFilter('ext:mkv;ext:.mp4;path:电影')
+
+    assert file_filter.matches('电影/a.mp4', 1, 0)
+    assert not file_filter.matches('电影/a.srt', 1, 0)
+    assert not file_filter.matches('剧集/a.mkv', 1, 0)
+
+
+def test_excludes_win_over_includes(app):
+    file_filter = app.FileFilter('type:video;!glob:*sample*;!path:tmp', exclude_extensions={'.part'})
+
+    assert file_filter.matches('a/movie.mkv', 1, 0)
+    assert not file_filter.matches('a/movie.sample.mkv', 1, 0)
+    assert not file_filter.matches('tmp/movie.mkv', 1, 0)
+    assert not file_filter.matches('a/movie.mkv.part', 1, 0)
+
+
+def test_size_and_age_ranges(app):
+    file_filter = app.FileFilter('size:1GB-4GB;age:>=10m')
+    now = 100_000
+
+    assert file_filter.matches('a.mkv', 2 * GB, now - 3600, now)
+    assert not file_filter.matches('a.mkv', 5 * GB, now - 3600, now)
+    assert not file_filter.matches('a.mkv', 2 * GB, now - 60, now)
+
+
+def test_regex_searches_path_with_leading_flags(app):
+    file_filter = app.FileFilter(r'regex:(?i)s\d{2}e\d{2}')
+
+    assert file_filter.matches('剧集/Show.S01E02.mkv', 1, 0)
+    assert not file_filter.matches('电影/Movie.2024.mkv', 1, 0)
+
+
+def test_regex_backreferences_stay_within_their_clause(app):
+    file_filter = app.FileFilter(r'regex:(a)\1;!regex:(b)\1')
+
+    assert file_filter.matches('aa', 1, 0)
+    assert not file_filter.matches('aabb', 1, 0)
+    assert not file_filter.matches('ab', 1, 0)
+
+
+def test_regex_named_groups_and_conditionals_are_isolated(app):
+    file_filter = app.FileFilter(r'regex:(?P<q>[\'"]).+(?P=q);!regex:(x)?y(?(1)z|w)$')
+
+    assert file_filter.matches('"name".mkv', 1, 0)
+    assert not file_filter.matches('"name\'.mkv', 1, 0)
+    assert not file_filter.matches('"name"xyz', 1, 0)
+    assert not file_filter.matches("'name'yw", 1, 0)
+    assert file_filter.matches("'name'yz", 1, 0)
+
+
+def test_isolate_regex_groups_leaves_escapes_and_classes_alone(app):
+    isolate = app.isolate_regex_groups
+
+    assert isolate(r'(a)[(\1]\101\1', 'p_') == r'(?P<p_1>a)[(\1]\101(?P=p_1)'
+    assert isolate(r'(?:a)(?=b)(?#(c)(b)', 'p_') == r'(?:a)(?=b)(?#(c)(?P<p_1>b)'
+
+
+@pytest.mark.parametrize('rules', ['glob', 'foo:bar', 'type:nope', 'regex:(', '!size:>1GB', 'size:2GB-1GB'])
+def test_invalid_rules_raise(app, rules):
+    with pytest.raises(ValueError):
+        app.FileFilter(rules)
@@ -0,0 +1,89 @@
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingStore:
+    def __init__(self):
+        self.rows = {}
+        self.writes = []
+
+    def load_stability(self):
+        return dict(self.rows)
+
+    def save_stability(self, entries, removed=()):
+        self.writes.append((dict(entries), list(removed)))
+        self.rows.update(entries)
+        for file_id in removed:
+            self.rows.pop(file_id, None)
+
+
+def scan(tracker, clock, files, advance=60):
+    clock.now += advance
+    tracker.begin_round()
+    clock.now += 1
+    return [tracker.is_stable(file_info) for file_info in files]
+
+
+def test_stable_after_consecutive_unchanged_scans(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, 'time', clock)
+    tracker = app.FileStabilityTracker(scans=2, quiet_seconds=0)
+    file_info = {'id': 1, 'size': 100, 'mtime': 10}
+
+    assert scan(tracker, clock, [file_info]) == [False]
+    # 同一轮内重复扫描到不计次数
+    assert tracker.is_stable(file_info) is False
+    assert scan(tracker, clock, [file_info]) == [True]
+
+
+def test_size_change_restarts_quiet_period(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, 'time', clock)
+    tracker = app.FileStabilityTracker(scans=0, quiet_seconds=600)
+
+    # 修改时间很早的文件仍在写入：只从观察到当前大小起计时
+    assert scan(tracker, clock, [{'id': 1, 'size': 100, 'mtime': 10}]) == [False]
+    assert scan(tracker, clock, [{'id': 1, 'size': 200, 'mtime': 10}], advance=700) == [False]
+    assert scan(tracker, clock, [{'id': 1, 'size': 200, 'mtime': 10}], advance=300) == [False]
+    assert scan(tracker, clock, [{'id': 1, 'size': 200, 'mtime': 10}], advance=300) == [True]
+
+
+def test_unchanged_entries_are_not_rewritten(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, 'time', clock)
+    store = RecordingStore()
+    tracker = app.FileStabilityTracker(scans=2, quiet_seconds=0, store=store)
+    files = [{'id': i, 'size': 100, 'mtime': 10} for i in range(3)]
+
+    scan(tracker, clock, files)
+    tracker.flush()
+    scan(tracker, clock, files)
+    tracker.flush()
+    assert [len(entries) for entries, _ in store.writes] == [3, 3]
+
+    # 已达到稳定次数且未变化的文件不再写入
+    assert scan(tracker, clock, files) == [True, True, True]
+    tracker.flush()
+    assert len(store.writes) == 2
+
+    # 记录恢复后判断结果一致
+    restored = app.FileStabilityTracker(scans=2, quiet_seconds=0, store=store)
+    assert scan(restored, clock, files) == [True, True, True]
+
+
+def test_forget_removes_entry(app, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, 'time', clock)
+    store = RecordingStore()
+    tracker = app.FileStabilityTracker(scans=2, quiet_seconds=0, store=store)
+    scan(tracker, clock, [{'id': 1, 'size': 100, 'mtime': 10}])
+    tracker.flush()
+
+    tracker.forget(1)
+    tracker.flush()
+
+    assert store.rows == {}
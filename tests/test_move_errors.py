@@ -0,0 +1,102 @@
+class FakeClient:
+    def __init__(self, existing):
+        self.existing = existing
+        self.listed = []
+
+    def fs_files_app(self, payload, **kwargs):
+        cid = payload['cid']
+        self.listed.append(cid)
+        tail = cid if cid in self.existing else 0
+        return {'state': True, 'count': 0, 'data': [], 'path': [{'cid': 0, 'name': ''}, {'cid': tail, 'name': 'x'}]}
+
+
+def test_source_missing_message_is_not_target_missing(app, monkeypatch):
+    fake = FakeClient(existing={5})
+    monkeypatch.setattr(app, 'client', fake)
+
+    assert app.is_target_missing_error('文件或目录不存在', 5) is False
+    assert fake.listed == []
+
+
+def test_exact_target_message_is_target_missing(app, monkeypatch):
+    fake = FakeClient(existing={5})
+    monkeypatch.setattr(app, 'client', fake)
+
+    assert app.is_target_missing_error('目标目录不存在', 5) is True
+    assert app.is_target_missing_error('Target not found', 5) is True
+    assert fake.listed == []
+
+
+def test_ambiguous_message_is_confirmed_by_listing_target(app, monkeypatch):
+    fake = FakeClient(existing={5})
+    monkeypatch.setattr(app, 'client', fake)
+
+    assert app.is_target_missing_error('目录不存在', 5) is False
+    assert app.is_target_missing_error('目录不存在', 6) is True
+    assert fake.listed == [5, 6]
+
+
+class FakeMoveClient:
+    """fs_move 按 respond(文件ID列表) 返回结果，并记录每次请求的文件数"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    def fs_move(self, file_ids, pid=0):
+        self.calls.append(len(file_ids))
+        return self.respond(file_ids)
+
+
+def test_batch_wide_error_is_not_bisected(app, monkeypatch):
+    fake = FakeMoveClient(lambda ids: {'state': False, 'errno': 990009, 'error': '操作过于频繁'})
+    monkeypatch.setattr(app, 'client', fake)
+    outcomes = {}
+
+    calls = app.bisect_move_files(list(range(500)), 5, outcomes)
+
+    assert calls == 1
+    assert fake.calls == [500]
+    assert len(outcomes) == 500 and not any(o['state'] for o in outcomes.values())
+
+
+def test_bisect_stops_when_both_halves_fail_alike(app, monkeypatch):
+    fake = FakeMoveClient(lambda ids: {'state': False, 'error': '未知错误 X'})
+    monkeypatch.setattr(app, 'client', fake)
+    outcomes = {}
+
+    calls = app.bisect_move_files(list(range(500)), 5, outcomes)
+
+    assert fake.calls == [500, 250, 250]
+    assert calls == 3
+    assert not any(o['state'] for o in outcomes.values())
+
+
+def test_bisect_isolates_bad_file(app, monkeypatch):
+    def respond(ids):
+        if 7 in ids:
+            return {'state': False, 'error': '文件不存在'}
+        return {'state': True}
+
+    fake = FakeMoveClient(respond)
+    monkeypatch.setattr(app, 'client', fake)
+    outcomes = {}
+
+    calls = app.bisect_move_files(list(range(16)), 5, outcomes)
+
+    assert calls == len(fake.calls) == 9
+    assert [file_id for file_id, o in outcomes.items() if not o['state']] == [7]
+    assert len(outcomes) == 16
+
+
+def test_throttle_during_bisect_stops_remaining_halves(app, monkeypatch):
+    responses = iter([{'state': False, 'error': '文件不存在'},
+                      {'state': False, 'errno': 990009, 'error': '操作过于频繁'}])
+    fake = FakeMoveClient(lambda ids: next(responses))
+    monkeypatch.setattr(app, 'client', fake)
+    outcomes = {}
+
+    calls = app.bisect_move_files(list(range(8)), 5, outcomes)
+
+    assert calls == 2
+    assert len(outcomes) == 8 and not any(o['state'] for o in outcomes.values())
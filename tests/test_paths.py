@@ -0,0 +1,38 @@
+import pytest
+
+
+class FakeClient:
+    """fs_files_app 的祖先路径按 key 指定的字段名返回"""
+
+    def __init__(self, ancestors, id_key='cid', name_key='name'):
+        self.ancestors = ancestors
+        self.id_key = id_key
+        self.name_key = name_key
+
+    def fs_files_app(self, payload, **kwargs):
+        path = [{self.id_key: cid, self.name_key: name} for cid, name in self.ancestors[int(payload['cid'])]]
+        return {'state': True, 'count': 0, 'data': [], 'path': path}
+
+
+ANCESTORS = {
+    30: [(0, ''), (10, '下载'), (20, '电影'), (30, '2024')],
+    40: [(0, ''), (11, '其他'), (40, 'x')],
+}
+
+
+@pytest.mark.parametrize('id_key, name_key', [('cid', 'name'), ('file_id', 'file_name')])
+def test_relative_dir_in_source(app, monkeypatch, id_key, name_key):
+    monkeypatch.setattr(app, 'client', FakeClient(ANCESTORS, id_key, name_key))
+
+    assert app.relative_dir_in_source(30, 10) == '电影/2024'
+    assert app.relative_dir_in_source('30', '20') == '2024'
+    assert app.relative_dir_in_source(10, 10) == ''
+    assert app.relative_dir_in_source(40, 10) is None
+
+
+@pytest.mark.parametrize('id_key, name_key', [('cid', 'name'), ('file_id', 'file_name')])
+def test_validate_cached_cid(app, monkeypatch, id_key, name_key):
+    monkeypatch.setattr(app, 'client', FakeClient(ANCESTORS, id_key, name_key))
+
+    assert app.validate_cached_cid('/下载/电影/2024', 30) is True
+    assert app.validate_cached_cid('/下载/电影/2025', 30) is False
@@ -0,0 +1,59 @@
+import httpx
+import pytest
+
+
+class FakeClient:
+    def __init__(self, responses):
+        self.responses = iter(responses)
+
+    def fs_move(self, file_ids, pid=0, timeout=None):
+        response = next(self.responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def limiter(app, monkeypatch):
+    limiter = app.AdaptiveRateLimiter(rate=4, min_rate=0.5, max_rate=10)
+    monkeypatch.setattr(app, 'rate_limiter', limiter)
+    return limiter
+
+
+def call(app, response):
+    client = app.instrument_client(FakeClient([response]))
+    return client.fs_move([1])
+
+
+def test_item_errors_do_not_change_rate(app, limiter):
+    call(app, {'state': False, 'error': '文件不存在'})
+    call(app, {'state': False, 'error': '目标目录不存在'})
+
+    assert limiter.rate == 4
+    assert limiter.throttle_events == 0
+
+
+def test_rate_limited_responses_halve_rate(app, limiter):
+    call(app, {'state': False, 'errno': 990009})
+    call(app, {'state': False, 'error': '操作过于频繁，请稍后再试'})
+
+    assert limiter.rate == 1
+    assert limiter.throttle_events == 2
+
+
+def test_success_increases_rate(app, limiter):
+    call(app, {'state': True})
+
+    assert limiter.rate == pytest.approx(4.1)
+
+
+def test_transport_errors_throttle_and_other_exceptions_do_not(app, limiter):
+    with pytest.raises(app.TimeoutError):
+        call(app, httpx.ReadTimeout('slow'))
+    with pytest.raises(httpx.ConnectError):
+        call(app, httpx.ConnectError('refused'))
+    assert limiter.throttle_events == 2
+
+    with pytest.raises(ValueError):
+        call(app, ValueError('bad payload'))
+    assert limiter.throttle_events == 2
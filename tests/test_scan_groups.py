@@ -0,0 +1,78 @@
+def mapping(app, index, source_cid, source_path, rules=None):
+    return {
+        'index': index,
+        'source_cid': source_cid,
+        'source_path': source_path,
+        'filter': app.FileFilter(rules) if rules else None,
+    }
+
+
+def file_info(path):
+    return {'id': 1, 'path': path, 'display_path': path, 'size': 1, 'mtime': 0}
+
+
+def test_nested_and_duplicate_sources_share_one_traversal(app):
+    downloads = mapping(app, 1, 10, '/下载', 'ext:mkv')
+    movies = mapping(app, 2, 20, '/下载/电影/')
+    subtitles = mapping(app, 3, 10, '/下载')
+    other = mapping(app, 4, 40, '/其他')
+    mappings = [downloads, movies, subtitles, other]
+
+    groups = app.plan_scan_groups(mappings, mappings)
+
+    assert [group['root']['index'] for group in groups] == [1, 4]
+    assert [member['index'] for member in groups[0]['members']] == [1, 2, 3]
+    assert groups[0]['skip_cids'] == set()
+    assert [prefix for prefix, _ in groups[0]['levels']] == ['电影', '']
+
+
+def test_files_go_to_the_deepest_matching_mapping(app):
+    downloads = mapping(app, 1, 10, '/下载', 'ext:mkv')
+    movies = mapping(app, 2, 20, '/下载/电影')
+    subtitles = mapping(app, 3, 10, '/下载')
+    group = app.plan_scan_groups([downloads, movies, subtitles])[0]
+
+    nested = file_info('电影/2024/a.mkv')
+    assert app.assign_scanned_file(group, nested) is movies
+    assert nested['path'] == nested['display_path'] == '2024/a.mkv'
+
+    # 源目录相同的映射按配置顺序取第一个接受该文件的
+    assert app.assign_scanned_file(group, file_info('a.mkv')) is downloads
+    assert app.assign_scanned_file(group, file_info('a.srt')) is subtitles
+    # 名称以子目录名开头但不在子目录中
+    assert app.assign_scanned_file(group, file_info('电影.mkv')) is downloads
+
+
+def test_nested_mapping_not_due_is_skipped(app):
+    downloads = mapping(app, 1, 10, '/下载')
+    movies = mapping(app, 2, 20, '/下载/电影')
+    all_mappings = [downloads, movies]
+
+    groups = app.plan_scan_groups([downloads], all_mappings)
+
+    assert len(groups) == 1
+    assert groups[0]['skip_cids'] == {20}
+    assert app.assign_scanned_file(groups[0], file_info('电影/a.mkv')) is None
+
+    # 只有内层映射到期时单独遍历它自己的源目录
+    groups = app.plan_scan_groups([movies], all_mappings)
+    assert [group['root']['index'] for group in groups] == [2]
+    assert groups[0]['skip_cids'] == set()
+    assert app.assign_scanned_file(groups[0], file_info('a.mkv')) is movies
+
+
+def test_walker_does_not_enter_skipped_subtrees(app):
+    walker = app.SourceWalker(10, skip_cids={20})
+    responses = {
+        10: {'count': 2, 'data': [{'cid': 20, 'pid': 10, 'n': '电影', 'te': 1},
+                                  {'fid': 1, 'cid': 10, 'n': 'a.mkv', 's': 1, 'te': 1}]},
+    }
+    files = []
+    requested = []
+    while walker.has_request():
+        task, payload = walker.next_request()
+        requested.append(payload['cid'])
+        files.extend(walker.feed(task, responses[payload['cid']]))
+
+    assert requested == [10]
+    assert [f['name'] for f in files] == ['a.mkv']
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+
+def ts(*args):
+    return datetime(*args).timestamp()
+
+
+def test_cron_next_after(app):
+    cron = app.CronSchedule('30 2 * * *')
+
+    assert cron.next_after(ts(2026, 3, 1, 1, 0)) == ts(2026, 3, 1, 2, 30)
+    assert cron.next_after(ts(2026, 3, 1, 2, 30)) == ts(2026, 3, 2, 2, 30)
+
+
+def test_cron_steps_ranges_and_weekdays(app):
+    # 工作日 9-17 点每 15 分钟；2026-03-06 是周五
+    cron = app.CronSchedule('*/15 9-17 * * 1-5')
+
+    assert cron.next_after(ts(2026, 3, 6, 17, 50)) == ts(2026, 3, 9, 9, 0)
+    assert cron.next_after(ts(2026, 3, 9, 9, 1)) == ts(2026, 3, 9, 9, 15)
+
+
+def test_cron_day_or_weekday(app):
+    # 日和周都指定时满足其一即可：每月 1 日或周日
+    cron = app.CronSchedule('0 0 1 * 0')
+
+    assert cron.next_after(ts(2026, 3, 2, 0, 0)) == ts(2026, 3, 8, 0, 0)
+    assert cron.next_after(ts(2026, 3, 29, 0, 0)) == ts(2026, 4, 1, 0, 0)
+
+
+@pytest.mark.parametrize('expr', ['* * * *', '60 * * * *', '0 0 0 * *', '*/0 * * * *', 'a * * * *'])
+def test_cron_rejects_invalid_expression(app, expr):
+    with pytest.raises(ValueError):
+        app.CronSchedule(expr)
+
+
+def test_cron_without_trigger_time_is_rejected_when_parsing_options(app):
+    with pytest.raises(ValueError):
+        app.CronSchedule('0 0 31 2 *').next_after(ts(2026, 1, 1))
+
+    assert 'cron' not in app.parse_mapping_options('cron=0 0 31 2 *', 1)
+    assert app.parse_mapping_options('cron=0 3 * * *', 1)['cron'] == '0 3 * * *'
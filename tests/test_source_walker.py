@@ -0,0 +1,182 @@
+def listing(cid, items, dir_mtime=None):
+    """构造一页 fs_files_app 返回结果，items 为 (id, 名称, 是否目录, 修改时间)"""
+    tail = {'cid': cid, 'name': str(cid)}
+    if dir_mtime is not None:
+        tail['mtime'] = dir_mtime
+    return {
+        'state': True,
+        'count': len(items),
+        'path': [{'cid': 0, 'name': ''}, tail],
+        'data': [
+            {'cid': item_id, 'pid': cid, 'n': name, 'te': mtime} if is_dir
+            else {'fid': item_id, 'cid': cid, 'n': name, 's': 1024, 'te': mtime}
+            for item_id, name, is_dir, mtime in items
+        ],
+    }
+
+
+def walk(walker, tree):
+    """按 tree（{cid: 完整列表返回结果}）驱动遍历器，返回产出的文件"""
+    files = []
+    while walker.has_request():
+        task, payload = walker.next_request()
+        response = dict(tree[payload['cid']])
+        if payload.get('limit') == 1:
+            # 探测请求：只返回修改时间最新的一项
+            data = sorted(response['data'], key=lambda item: item['te'], reverse=True)[:1]
+            response['data'] = data
+        files.extend(walker.feed(task, response))
+    return files
+
+
+def test_unchanged_directory_is_served_from_snapshot(app, tmp_path):
+    store = app.StateStore(str(tmp_path / 'state.db'))
+    tree = {10: listing(10, [(200, 'a.mkv', False, 1000)], dir_mtime=1000)}
+
+    first = walk(app.SourceWalker(10, snapshot=store), tree)
+    second = walk(app.SourceWalker(10, snapshot=store), tree)
+
+    assert [str(f['id']) for f in first] == ['200']
+    assert [str(f['id']) for f in second] == ['200']
+    assert not first[0].get('from_snapshot')
+    assert second[0]['from_snapshot']
+
+
+def test_replaced_file_with_older_mtime_is_relisted(app, tmp_path):
+    store = app.StateStore(str(tmp_path / 'state.db'))
+    tree = {
+        10: listing(10, [(200, 'a.mkv', False, 1000), (201, 'b.mkv', False, 1500)], dir_mtime=1500),
+    }
+    walk(app.SourceWalker(10, snapshot=store), tree)
+
+    # 同名文件被替换为修改时间更早的文件：数量和最新一项都不变，只有目录自身的修改时间变化
+    tree[10] = listing(10, [(299, 'a.mkv', False, 900), (201, 'b.mkv', False, 1500)], dir_mtime=1600)
+    files = walk(app.SourceWalker(10, snapshot=store), tree)
+
+    assert sorted(str(f['id']) for f in files) == ['201', '299']
+
+
+def test_subdirectory_signature_ignores_snapshot_mtime(app, tmp_path):
+    store = app.StateStore(str(tmp_path / 'state.db'))
+    tree = {
+        10: listing(10, [(20, 'sub', True, 1000)], dir_mtime=1000),
+        20: listing(20, [(200, 'a.mkv', False, 900), (201, 'b.mkv', False, 1000)], dir_mtime=1000),
+    }
+    walk(app.SourceWalker(10, snapshot=store), tree)
+
+    tree[20] = listing(20, [(299, 'a.mkv', False, 800), (201, 'b.mkv', False, 1000)], dir_mtime=1100)
+    files = walk(app.SourceWalker(10, snapshot=store), tree)
+
+    assert sorted(str(f['id']) for f in files) == ['201', '299']
+
+
+class FakeClient:
+    """fs_file 接受逗号分隔的文件ID，只返回存在的文件"""
+
+    def __init__(self, parents, fail=False):
+        self.parents = parents
+        self.fail = fail
+        self.calls = []
+
+    def fs_file(self, payload):
+        file_ids = payload['file_id'].split(',')
+        self.calls.append(file_ids)
+        if self.fail:
+            return {'state': False, 'errno': 990009, 'error': '操作过于频繁'}
+        return {'state': True, 'data': [{'fid': file_id, 'cid': self.parents[file_id], 'n': 'x', 'te': 0}
+                                        for file_id in file_ids if file_id in self.parents]}
+
+
+def snapshot_batch():
+    return [
+        {'id': '200', 'parent_id': '10', 'display_path': 'a.mkv', 'from_snapshot': True},
+        {'id': '201', 'parent_id': '10', 'display_path': 'b.mkv', 'from_snapshot': True},
+        {'id': '202', 'parent_id': '10', 'display_path': 'c.mkv'},
+        {'id': '203', 'parent_id': '10', 'display_path': 'd.mkv', 'from_snapshot': True},
+    ]
+
+
+def test_snapshot_files_moved_away_are_dropped(app, tmp_path, monkeypatch):
+    store = app.StateStore(str(tmp_path / 'state.db'))
+    store.save_dir('10', 'sig', [], [])
+    fake = FakeClient({'200': '99', '201': '10'})
+    monkeypatch.setattr(app, 'state_store', store)
+    monkeypatch.setattr(app, 'client', fake)
+
+    kept = app.drop_moved_away_files(snapshot_batch())
+
+    # 一次请求确认全部快照文件；203 未返回，无法确认，本轮跳过
+    assert fake.calls == [['200', '201', '203']]
+    assert [f['id'] for f in kept] == ['201', '202']
+    assert store.load_dir('10') is None
+
+
+def test_snapshot_check_errors_keep_files_for_next_round(app, tmp_path, monkeypatch):
+    store = app.StateStore(str(tmp_path / 'state.db'))
+    store.save_dir('10', 'sig', [], [])
+    monkeypatch.setattr(app, 'state_store', store)
+    monkeypatch.setattr(app, 'client', FakeClient({}, fail=True))
+
+    kept = app.drop_moved_away_files(snapshot_batch())
+
+    assert [f['id'] for f in kept] == ['202']
+    assert store.load_dir('10') is not None
+
+
+class RecordingCursorStore:
+    def __init__(self):
+        self.saved = []
+        self.cleared = 0
+
+    def load_cursor(self, root_cid, max_age=None):
+        return None
+
+    def save_cursor(self, root_cid, tasks):
+        self.saved.append(tasks)
+
+    def clear_cursor(self, root_cid):
+        self.cleared += 1
+
+
+def test_checkpoint_is_throttled(app):
+    cursor_store = RecordingCursorStore()
+    tree = {10: listing(10, [(100 + i, f'd{i}', True, 1000) for i in range(50)])}
+    tree.update({100 + i: listing(100 + i, [(1000 + i, 'a.mkv', False, 1000)]) for i in range(50)})
+    walker = app.SourceWalker(10, cursor_store=cursor_store)
+
+    task, payload = walker.next_request()
+    walker.feed(task, tree[payload['cid']])
+    walker.checkpoint()
+    assert cursor_store.saved == []
+
+    # 中止时强制记录，进行中的任务排在最前
+    task, payload = walker.next_request()
+    walker.checkpoint(force=True)
+    assert len(cursor_store.saved) == 1
+    assert cursor_store.saved[0][0]['cid'] == task['cid']
+    assert len(cursor_store.saved[0]) == 50
+
+    walker.feed(task, tree[payload['cid']])
+    files = walk(walker, tree)
+    walker.checkpoint()
+    assert len(files) == 49
+    assert cursor_store.cleared == 1
+
+
+def test_files_moved_between_pages_do_not_shift_later_entries(app):
+    # 2500 个文件分 3 页列举；产出的文件立即被"移走"，模拟并行的移动线程
+    remaining = [(1000 + i, f'{i:04}.mkv', False, 1000) for i in range(2500)]
+    walker = app.SourceWalker(10, page_size=1000)
+    files = []
+    while walker.has_request():
+        task, payload = walker.next_request()
+        page = remaining[payload['offset']:payload['offset'] + payload['limit']]
+        response = listing(10, page)
+        response['count'] = len(remaining)
+        produced = walker.feed(task, response)
+        moved = {f['id'] for f in produced}
+        remaining = [item for item in remaining if item[0] not in moved]
+        files.extend(produced)
+
+    assert len(files) == 2500
+    assert remaining == []